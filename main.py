@@ -1,12 +1,26 @@
 """Main script for running the simulation of an M/M/k queue system."""
+from dataclasses import replace
+import sys
 import time
+from typing import Union
+
+import numpy as np
 
 import spe.utils.argument_parser as arg
 import spe.server.gunicorn_manager as manager
-from spe.generator.simulation import run_load_simulation
+import spe.utils.file as file
+from spe.generator.benchmark import compare_benchmarks, load_benchmarks, run_benchmarks
+from spe.generator.discrete_event import ENGINE_DES
+from spe.generator.exposition import MetricsExporter
+from spe.generator.orchestrator import load_experiments, run_experiments
+from spe.generator.simulation import plot_stored_run, run_load_simulation
+from spe.utils.metric import compute_theoretical_grid
+from spe.utils.plot import save_trace_plot
+from spe.utils.results import ResultStore
+from spe.utils.trace import compute_trace_metrics, read_trace
 
 PROTOCOL = "http://"
-TARGET_HOST = "127.0.0.1:5000"
+HOST = "127.0.0.1"
 ACCESS_LOG = "access.log"
 ERROR_LOG = "error.log"
 
@@ -17,23 +31,147 @@ def main() -> None:
 
     This function:
     1. Parses command line arguments to configure the simulation
-    2. Starts a Gunicorn server with the specified configuration
-    3. Configures the service rate for request processing
-    4. Launches the load simulation against the target endpoint
+    2. Starts a Gunicorn server with the specified configuration (none with the discrete-event engine)
+    3. Configures the service rate, the service-time distribution and the workload for request processing
+    4. Launches the load simulation against the target endpoint, once per number of servers,
+       resizing the same warm server in between, and serves its live metrics if requested
     5. Ensures the Gunicorn server is properly terminated after simulation
     """
-    print("[INFO] Simulation launched at:", time.strftime("%H:%M:%S", time.localtime()))
     parser = arg.create_parser()
     system_config = arg.parse_arguments(parser)
+    if isinstance(system_config, arg.ModelConfig):
+        run_model(system_config)
+        return
+    if isinstance(system_config, arg.ExperimentsConfig):
+        run_experiments(load_experiments(system_config.spec_path), system_config.output_folder,
+                        system_config.cpus, system_config.base_port, system_config.generator_cores)
+        return
+    if isinstance(system_config, arg.TraceConfig):
+        analyse_traces(system_config)
+        return
+    if isinstance(system_config, arg.ResultsConfig):
+        show_results(system_config)
+        return
+    if isinstance(system_config, (arg.BenchmarkConfig, arg.CompareConfig)):
+        if not run_benchmark_comparison(system_config):
+            sys.exit(1)
+        return
+    print("[INFO] Simulation launched at:", time.strftime("%H:%M:%S", time.localtime()))
+    target_host = f"{HOST}:{system_config.port}"
+    gunicorn_process = None
+    exporter = None
+    if system_config.metrics_port is not None:
+        exporter = MetricsExporter(system_config.metrics_port, HOST).start()
     # the try-finally block is used to ensure that the Gunicorn processes are terminated even if an error occurs
     try:
-        gunicorn_process = manager.start_gunicorn(TARGET_HOST, ACCESS_LOG, ERROR_LOG, system_config)
-        manager.configure_service_rate(PROTOCOL + TARGET_HOST, system_config.service_rate)
-        run_load_simulation(PROTOCOL + TARGET_HOST, system_config)
+        current_servers = 0
+        for number_of_servers in system_config.server_counts:
+            simulation_config = replace(system_config, number_of_servers=number_of_servers)
+            if system_config.engine == ENGINE_DES:
+                run_load_simulation(PROTOCOL + target_host, simulation_config)  # simulated: no server needed
+                continue
+            if gunicorn_process is not None and system_config.backend == manager.BACKEND_ASGI:
+                # the process pool of the asgi back-end has a fixed size
+                manager.end_gunicorn(gunicorn_process)
+                gunicorn_process = None
+            if gunicorn_process is None:
+                gunicorn_process = manager.start_gunicorn(target_host, ACCESS_LOG, ERROR_LOG, simulation_config)
+                manager.configure_service_rate(PROTOCOL + target_host, system_config.service_rate)
+                manager.configure_workload(PROTOCOL + target_host, system_config)
+            else:
+                manager.resize_gunicorn(gunicorn_process, target_host, current_servers, simulation_config)
+            current_servers = number_of_servers
+            run_load_simulation(PROTOCOL + target_host, simulation_config, exporter)
     finally:
         manager.end_gunicorn(gunicorn_process)
+        if exporter is not None:
+            exporter.stop()
     print("[INFO] Simulation ended at:", time.strftime("%H:%M:%S", time.localtime()))
 
 
+def run_model(model_config: arg.ModelConfig) -> None:
+    """
+    Evaluate the theoretical model on many configurations and store the results column by column.
+
+    With --grid every combination of service rate, arrival rate and number of servers is used,
+    otherwise the values are paired position by position (a single value is reused for every pair).
+    Each configuration is evaluated for every number of clients in the user range.
+    """
+    users = np.array(model_config.user_range)
+    if model_config.grid:
+        parameters = np.meshgrid(model_config.service_rates, model_config.arrival_rates,
+                                 model_config.numbers_of_servers, users, indexing='ij')
+    else:
+        service_rates, arrival_rates, numbers_of_servers = np.broadcast_arrays(
+            model_config.service_rates, model_config.arrival_rates, model_config.numbers_of_servers)
+        parameters = (service_rates[:, None], arrival_rates[:, None], numbers_of_servers[:, None], users[None, :])
+    results = compute_theoretical_grid(*parameters)
+    file.write_columns_to_npz(model_config.output_path, results)
+    configuration_count = results.size // len(users)
+    print(f"[INFO] Theoretical metrics of {configuration_count} configurations ({results.size} points) written to "
+          f"{model_config.output_path}")
+
+
+def analyse_traces(trace_config: arg.TraceConfig) -> None:
+    """Recompute the client-side metrics of recorded load tests from their traces, optionally plotting them."""
+    for trace_path in trace_config.trace_paths:
+        header, records = read_trace(trace_path)
+        metrics = compute_trace_metrics(header, records)
+        failed_count = int(np.count_nonzero(records['status'] != 200))
+        print(f"[INFO] {trace_path}: {header['number_of_users']} clients, {len(records)} requests "
+              f"({failed_count} failed), mean response time {metrics.avg_response_time:.6f}s "
+              f"[{metrics.lower_bound:.6f}, {metrics.upper_bound:.6f}], p50 {metrics.p50:.6f}s, "
+              f"p95 {metrics.p95:.6f}s, p99 {metrics.p99:.6f}s, max {metrics.max_response_time:.6f}s, "
+              f"scheduling lateness {metrics.scheduling_lateness * 1e3:.3f}ms")
+        if trace_config.plot:
+            print(f"[INFO] Trace plot saved to {save_trace_plot(trace_path, header, records)}")
+
+
+def show_results(results_config: arg.ResultsConfig) -> None:
+    """List the stored runs matching the filters, then export their metrics or regenerate their plots."""
+    filters = dict(service_rate=results_config.service_rate, arrival_rate=results_config.arrival_rate,
+                   number_of_servers=results_config.number_of_servers,
+                   user_request_time=results_config.user_request_time, label=results_config.label,
+                   since=results_config.since)
+    store = ResultStore()
+    try:
+        runs = store.find_runs(**filters)
+        for run in runs:
+            config = run.system_config
+            print(f"[INFO] Run {run.run_id} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started_at))}"
+                  f"{f' {run.label}' if run.label else ''}: s={config.service_rate} a={config.arrival_rate} "
+                  f"k={config.number_of_servers} t={config.user_request_time} "
+                  f"u={config.user_range.start}-{config.user_range.stop - 1} engine={config.engine} "
+                  f"backend={config.backend}")
+        print(f"[INFO] {len(runs)} runs in {store.path}")
+        if results_config.export_path is not None:
+            metrics = store.query_metrics(**filters)
+            file.write_columns_to_npz(results_config.export_path, metrics)
+            print(f"[INFO] {len(metrics)} rows written to {results_config.export_path}")
+        if results_config.plot:
+            for run in runs:
+                plot_stored_run(store, run)
+            print(f"[INFO] Plots of {len(runs)} runs regenerated")
+    finally:
+        store.close()
+
+
+def run_benchmark_comparison(config: Union[arg.BenchmarkConfig, arg.CompareConfig]) -> bool:
+    """
+    Run the benchmarks (benchmark mode) or read saved results (compare mode), and compare them with a baseline.
+
+    Returns:
+        False if a benchmark regressed beyond the threshold of the configuration
+    """
+    if isinstance(config, arg.BenchmarkConfig):
+        current = run_benchmarks(config.output_path, config.groups, config.repeats, config.port)
+        if config.baseline_path is None:
+            return True
+    else:
+        current = load_benchmarks(config.current_path)
+    comparisons = compare_benchmarks(load_benchmarks(config.baseline_path), current, config.threshold)
+    return not any(comparison.regressed for comparison in comparisons)
+
+
 if __name__ == '__main__':
     main()
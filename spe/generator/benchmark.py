@@ -0,0 +1,369 @@
+"""This module benchmarks the hot paths of the project offline and compares the results with a saved baseline.
+
+The benchmarks are grouped by the part of the code they cover:
+- "theoretical": compute_theoretical_metrics for every solver, against the number of clients N and of servers k
+- "busy-time": per-request cost of the busy-time records of the workers, and reading them for the utilization
+- "cpu-task": accuracy of CPUBoundTask.run for several target durations
+- "generator": requests per second of the load generator engines against a local no-op endpoint
+- "server": per-request overhead of the Flask app served by Gunicorn, compared with the no-op endpoint
+
+Every benchmark is repeated and its median is kept, with the samples. The results are written as JSON, so that
+two files (e.g. before and after a change) can be compared, a change beyond a threshold being a regression.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import math
+from multiprocessing import Process, get_context
+import os
+import platform
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+import spe.server.gunicorn_manager as manager
+from spe.generator.load_generator import ENGINE_ASYNCIO, ENGINE_PROCESS, LoadGenerator
+from spe.server.busy_time import (BusyTimeRecorder, ServiceTimeAccuracy, read_service_time_accuracy,
+                                  read_worker_busy_times)
+from spe.server.cpubound_task import CPUBoundTask
+from spe.utils.argument_parser import BENCHMARK_GROUPS, Config
+from spe.utils.metric import (SOLVER_INCREMENTAL, SOLVER_LINEAR, SOLVER_PRODUCT_FORM, SOLVER_TRANSIENT,
+                              compute_theoretical_metrics)
+
+BENCHMARK_VERSION = 1  # of the JSON format
+GROUPS = BENCHMARK_GROUPS
+THEORETICAL_CASES = {  # solver: (values of N, values of k); the transient solver integrates ODEs, hence fewer cases
+    SOLVER_PRODUCT_FORM: ((15, 100, 1000), (1, 4, 16)),
+    SOLVER_LINEAR: ((15, 100, 1000), (1, 4, 16)),
+    SOLVER_INCREMENTAL: ((15, 100, 1000), (1, 4, 16)),
+    SOLVER_TRANSIENT: ((15,), (1, 4)),
+}
+BUSY_TIME_RECORDS = 100_000  # requests recorded per repetition
+BUSY_TIME_WORKERS = (1, 4, 16)  # workers whose records are read
+BUSY_TIME_READ_DURATION = 600  # seconds of records read, i.e. a load test of 10 minutes
+CPU_TASK_DURATIONS = (0.001, 0.01, 0.05)  # seconds
+CPU_TASK_RUNS = 20  # tasks per repetition
+GENERATOR_CASES = ((ENGINE_PROCESS, 4), (ENGINE_ASYNCIO, 4), (ENGINE_ASYNCIO, 64))  # (engine, clients)
+LOAD_DURATION = 3  # seconds of each load test of the generator and server benchmarks
+SATURATING_ARRIVAL_RATE = 1e6  # think times of about a microsecond: the clients send as fast as they can
+NO_OP_SERVICE_RATE = 1e6  # mu of the Flask app, whose tasks then take about a microsecond
+NO_OP_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+SERVER_RESULTS_NAME = "server.json"  # written by the process of the server benchmark
+DEFAULT_THRESHOLD = 0.1  # relative change beyond which a benchmark has regressed
+
+
+@dataclass
+class BenchmarkResult:
+    value: float  # median of the samples
+    unit: str
+    higher_is_better: bool
+    samples: List[float]
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+    change: float  # relative, positive when the current value is worse
+    regressed: bool
+
+
+def run_benchmarks(output_path: str, groups: Tuple[str, ...] = GROUPS, repeats: int = 3,
+                   port: int = 5100) -> Dict[str, BenchmarkResult]:
+    """
+    Run the benchmarks of the given groups and write their results to a JSON file.
+
+    Args:
+        output_path: JSON file receiving the results and a description of the environment
+        groups: Groups of benchmarks to run (see GROUPS)
+        repeats: Repetitions of each benchmark, whose median is kept
+        port: First of the two local ports used by the no-op endpoint and by Gunicorn
+
+    Returns:
+        The result of each benchmark, by name
+    """
+    results: Dict[str, BenchmarkResult] = {}
+    start_time = time.perf_counter()
+    if "theoretical" in groups:
+        results.update(_benchmark_theoretical_metrics(repeats))
+    if "busy-time" in groups:
+        results.update(_benchmark_busy_time(repeats))
+    if "cpu-task" in groups:
+        results.update(_benchmark_cpu_task(repeats))
+    if "generator" in groups or "server" in groups:
+        no_op_server = _start_no_op_server(port)
+        try:
+            no_op_url = f"http://127.0.0.1:{port}/"
+            if "generator" in groups:
+                results.update(_benchmark_generator(no_op_url, repeats))
+            if "server" in groups:
+                results.update(_benchmark_server(no_op_url, port + 1, repeats))
+        finally:
+            no_op_server.terminate()
+            no_op_server.join()
+
+    for name, result in results.items():
+        print(f"[INFO] {name}: {result.value:.6g} {result.unit}")
+    _write_results(output_path, results)
+    print(f"[INFO] {len(results)} benchmarks run in {time.perf_counter() - start_time:.1f}s, written to {output_path}")
+    return results
+
+
+def load_benchmarks(path: str) -> Dict[str, BenchmarkResult]:
+    """
+    Read the results written by run_benchmarks.
+
+    Raises:
+        ValueError: If the file has another version of the format
+    """
+    with open(path, 'r') as benchmark_file:
+        content = json.load(benchmark_file)
+    if content.get("version") != BENCHMARK_VERSION:
+        raise ValueError(f"{path} has benchmark format {content.get('version')}, expected {BENCHMARK_VERSION}")
+    return {name: BenchmarkResult(**result) for name, result in content["benchmarks"].items()}
+
+
+def compare_benchmarks(baseline: Dict[str, BenchmarkResult], current: Dict[str, BenchmarkResult],
+                       threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    """
+    Compare the benchmarks present in both results and print one line per benchmark.
+
+    Args:
+        baseline: Reference results
+        current: Results to check
+        threshold: Relative change in the worse direction beyond which a benchmark has regressed
+
+    Returns:
+        The comparison of every common benchmark
+    """
+    comparisons = []
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name], current[name]
+        if before.value == 0 or not np.isfinite(before.value) or not np.isfinite(after.value):
+            change = 0.0
+        else:
+            change = (after.value - before.value) / abs(before.value)
+            if before.higher_is_better:
+                change = -change
+        comparison = Comparison(name, before.value, after.value, change, change > threshold)
+        comparisons.append(comparison)
+        status = "[WARN] Regression" if comparison.regressed else "[INFO]"
+        direction = "unchanged" if change == 0 else f"{'worse' if change > 0 else 'better'} by {abs(change):.1%}"
+        print(f"{status} {name}: {before.value:.6g} -> {after.value:.6g} {after.unit} ({direction})")
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"[INFO] {name}: only in the {'baseline' if name in baseline else 'current results'}")
+    regressions = sum(comparison.regressed for comparison in comparisons)
+    print(f"[INFO] {regressions} regressions among {len(comparisons)} benchmarks (threshold {threshold:.0%})")
+    return comparisons
+
+
+def _benchmark_theoretical_metrics(repeats: int) -> Dict[str, BenchmarkResult]:
+    """Seconds to compute the metrics of every number of clients from 1 to N, without cache."""
+    results = {}
+    for solver, (client_counts, server_counts) in THEORETICAL_CASES.items():
+        for number_of_clients in client_counts:
+            for number_of_servers in server_counts:
+                config = Config(service_rate=10, arrival_rate=5, user_range=range(1, number_of_clients + 1),
+                                user_request_time=LOAD_DURATION, number_of_servers=number_of_servers)
+                results[f"theoretical/{solver}/N{number_of_clients}_k{number_of_servers}"] = _time(
+                    lambda: compute_theoretical_metrics(config, solver), repeats)
+    return results
+
+
+def _benchmark_busy_time(repeats: int) -> Dict[str, BenchmarkResult]:
+    """
+    Seconds per request a worker spends recording its busy time, and seconds to read the busy windows of the
+    workers over a load test of BUSY_TIME_READ_DURATION, as done for the utilization of every test.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="spe_benchmark_") as folder:
+        recorder = BusyTimeRecorder(folder)
+
+        def record_requests() -> None:
+            for _ in range(BUSY_TIME_RECORDS):
+                recorder.begin()
+                recorder.end()
+
+        record_time = _time(record_requests, repeats)
+        record_time.samples = [sample / BUSY_TIME_RECORDS for sample in record_time.samples]
+        record_time.value /= BUSY_TIME_RECORDS
+        results["busy-time/record_request"] = record_time
+
+        worker_path = os.path.join(folder, f"worker_{recorder.pid}.bin")
+        end_time = time.time()
+        recorder.record(end_time - BUSY_TIME_READ_DURATION, end_time)  # every window of the read is valid
+        for number_of_workers in BUSY_TIME_WORKERS:
+            workers_folder = os.path.join(folder, f"k{number_of_workers}")
+            os.makedirs(workers_folder)
+            for worker in range(number_of_workers):
+                shutil.copyfile(worker_path, os.path.join(workers_folder, f"worker_{worker + 1}.bin"))
+            results[f"busy-time/read_{number_of_workers}_workers"] = _time(
+                lambda: read_worker_busy_times(end_time - BUSY_TIME_READ_DURATION, end_time, workers_folder), repeats)
+    return results
+
+
+def _benchmark_cpu_task(repeats: int) -> Dict[str, BenchmarkResult]:
+    """Mean absolute error, in seconds, of CPUBoundTask.run for each target duration."""
+    CPUBoundTask.calibrate()
+    results = {}
+    for duration in CPU_TASK_DURATIONS:
+        samples = [float(np.mean([abs(CPUBoundTask.run(duration) - duration) for _ in range(CPU_TASK_RUNS)]))
+                   for _ in range(repeats)]
+        results[f"cpu-task/{duration * 1e3:g}ms_absolute_error"] = BenchmarkResult(
+            statistics.median(samples), "s", False, samples)
+    return results
+
+
+def _benchmark_generator(no_op_url: str, repeats: int) -> Dict[str, BenchmarkResult]:
+    """Responses per second the load generator obtains from the no-op endpoint, with clients that never think."""
+    results = {}
+    for engine, number_of_clients in GENERATOR_CASES:
+        samples = []
+        for _ in range(repeats):
+            load_generator = LoadGenerator(number_of_clients, SATURATING_ARRIVAL_RATE, no_op_url, LOAD_DURATION,
+                                           engine)
+            load_generator.generate_load()
+            samples.append(load_generator.statistics.response_times.count / LOAD_DURATION)
+        results[f"generator/{engine}_{number_of_clients}_clients"] = BenchmarkResult(
+            statistics.median(samples), "requests/s", True, samples)
+    return results
+
+
+def _benchmark_server(no_op_url: str, port: int, repeats: int) -> Dict[str, BenchmarkResult]:
+    """
+    Per-request overhead of the Flask app on one sync Gunicorn worker, with tasks of about a microsecond: the
+    mean response time of a single client beyond that of the no-op endpoint, and the overhead the worker
+    measures itself (time spent on a request besides its task).
+
+    The server keeps its busy-time records and its control file in a temporary folder, so that it neither
+    disturbs nor reads the state of a real run on the same host. Those paths are read when spe.server.busy_time
+    and spe.server.control are imported, hence the measurement runs in a spawned process that imports them anew.
+    """
+    with tempfile.TemporaryDirectory(prefix="spe_benchmark_") as folder:
+        environment = {"SPE_BUSY_TIME_FOLDER": os.path.join(folder, "busy_time"),
+                       "SPE_CONTROL_FILE": os.path.join(folder, "control.bin")}
+        previous_environment = {name: os.environ.get(name) for name in environment}
+        os.environ.update(environment)
+        try:
+            process = get_context("spawn").Process(target=_measure_server_overheads,
+                                                   args=[no_op_url, port, repeats, folder])
+            process.start()
+            process.join()
+        finally:
+            for name, value in previous_environment.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        if process.exitcode != 0:
+            raise RuntimeError(f"The server benchmark failed with exit code {process.exitcode}")
+        with open(os.path.join(folder, SERVER_RESULTS_NAME), 'r') as results_file:
+            response_overheads, worker_overheads = json.load(results_file)
+    return {"server/flask_sync_response_overhead": BenchmarkResult(
+                statistics.median(response_overheads), "s", False, response_overheads),
+            "server/flask_sync_worker_overhead": BenchmarkResult(
+                statistics.median(worker_overheads), "s", False, worker_overheads)}
+
+
+def _measure_server_overheads(no_op_url: str, port: int, repeats: int, folder: str) -> None:
+    """Body of the server benchmark, run in its own process; writes both series of overheads to the folder."""
+    target_host = f"127.0.0.1:{port}"
+    config = Config(service_rate=NO_OP_SERVICE_RATE, arrival_rate=SATURATING_ARRIVAL_RATE, user_range=range(1, 2),
+                    user_request_time=LOAD_DURATION, number_of_servers=1)
+    gunicorn_process = manager.start_gunicorn(target_host, os.path.join(folder, "access.log"),
+                                              os.path.join(folder, "error.log"), config)
+    try:
+        manager.configure_service_rate(f"http://{target_host}", NO_OP_SERVICE_RATE)
+        response_overheads, worker_overheads = [], []
+        for _ in range(repeats):
+            baseline_time = _mean_response_time(no_op_url)
+            accuracy_before = read_service_time_accuracy()
+            server_time = _mean_response_time(f"http://{target_host}/")
+            accuracy_after = read_service_time_accuracy()
+            response_overheads.append(server_time - baseline_time)
+            worker_overheads.append(_mean_overhead_between(accuracy_before, accuracy_after))
+    finally:
+        manager.end_gunicorn(gunicorn_process)
+    with open(os.path.join(folder, SERVER_RESULTS_NAME), 'w') as results_file:
+        json.dump([response_overheads, worker_overheads], results_file)
+
+
+def _mean_response_time(url: str) -> float:
+    """Mean response time of a single client that never thinks, on a keep-alive connection."""
+    load_generator = LoadGenerator(1, SATURATING_ARRIVAL_RATE, url, LOAD_DURATION, ENGINE_PROCESS)
+    return load_generator.generate_load()[0]
+
+
+def _mean_overhead_between(before: ServiceTimeAccuracy, after: ServiceTimeAccuracy) -> float:
+    """Mean overhead of the requests recorded between two readings of the service-time accuracy."""
+    overhead_before = before.overhead * before.count if before.count > 0 else 0.0  # the mean is NaN without requests
+    count = after.count - before.count
+    return (after.overhead * after.count - overhead_before) / count if count > 0 else math.nan
+
+
+def _time(function: Callable[[], object], repeats: int) -> BenchmarkResult:
+    samples = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start_time)
+    return BenchmarkResult(statistics.median(samples), "s", False, samples)
+
+
+def _start_no_op_server(port: int) -> Process:
+    """Start, in its own process, an HTTP endpoint answering every request at once, and wait until it listens."""
+    process = Process(target=_serve_no_op, args=[port], daemon=True)
+    process.start()
+    deadline = time.perf_counter() + manager.READY_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=manager.PROBE_REQUEST_TIMEOUT).close()
+            return process
+        except OSError:
+            time.sleep(manager.PROBE_INITIAL_DELAY)
+    process.terminate()
+    raise RuntimeError(f"The no-op endpoint did not start on port {port}")
+
+
+def _serve_no_op(port: int) -> None:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):  # requests without a body
+                writer.write(NO_OP_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def serve() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def _write_results(path: str, results: Dict[str, BenchmarkResult]) -> None:
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    content = {
+        "version": BENCHMARK_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(),
+                        "processor": platform.processor(), "cpu_count": os.cpu_count(),
+                        "numpy": np.__version__},
+        "benchmarks": {name: {"value": result.value, "unit": result.unit,
+                              "higher_is_better": result.higher_is_better, "samples": result.samples}
+                       for name, result in results.items()},
+    }
+    with open(path, 'w') as benchmark_file:
+        json.dump(content, benchmark_file, indent=2)
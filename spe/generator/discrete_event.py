@@ -0,0 +1,147 @@
+"""This module simulates the closed M/M/k system of the testbed with discrete events, without any server.
+
+N clients alternate between an exponential think time (rate lambda) and a request served in FCFS order by one
+of k servers, with service times drawn from the configured distribution (exponential by default). Requests are
+served in the order they are issued, so each one starts as soon as it arrives or the earliest server is free:
+two heaps of floats (the next request of every client, the time every server becomes free) are the whole state,
+and each request costs two heap replacements. Think and service times are drawn in blocks with NumPy.
+
+The results have the shape of the live measurements (MeasuredMetric), with the confidence interval computed
+across independent replications run in a pool of processes.
+"""
+import heapq
+from multiprocessing import Pool
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+from spe.utils.argument_parser import Config
+from spe.utils.distribution import create_distribution
+from spe.utils.metric import (MeasuredMetric, compute_batch_means_interval, compute_confidence_intervals,
+                              compute_mser_truncation, compute_percentiles)
+from spe.utils.streaming import MSER_BATCH_SIZE, LatencyHistogram
+
+ENGINE_DES = "des"
+VARIATE_BLOCK_SIZE = 1 << 16  # think and service times drawn at once
+CONFIDENCE_BATCH_COUNT = 20  # batches of the interval of a single replication
+SEED = 42
+
+
+def simulate_measured_metrics(system_config: Config) -> List[MeasuredMetric]:
+    """
+    Simulate the system for every number of clients in the user range.
+
+    Each number of clients is simulated system_config.des_replications times with independent random streams,
+    for system_config.des_requests requests each, and all the replications run in one pool of processes.
+
+    Returns:
+        A list of MeasuredMetric objects, one for each client count in the user_range
+    """
+    replication_count = system_config.des_replications
+    seeds = np.random.SeedSequence(SEED).spawn(len(system_config.user_range) * replication_count)
+    tasks = [(number_of_users, system_config, seeds[index * replication_count + replication])
+             for index, number_of_users in enumerate(system_config.user_range)
+             for replication in range(replication_count)]
+    with Pool(processes=min(len(tasks), os.cpu_count() or 1)) as pool:
+        replications = pool.starmap(simulate_replication, tasks)
+
+    return [_combine_replications(replications[index * replication_count:(index + 1) * replication_count])
+            for index in range(len(system_config.user_range))]
+
+
+def simulate_replication(number_of_users: int, system_config: Config,
+                         seed: np.random.SeedSequence) -> Tuple[np.ndarray, float, LatencyHistogram]:
+    """
+    Simulate one run of system_config.des_requests requests, starting with every client thinking.
+    The warm-up is detected with MSER-5 and left out of the results.
+
+    Args:
+        number_of_users: Number of clients (N)
+        system_config: Configuration with the rates, the number of servers and the service-time distribution
+        seed: Seed of the random stream of this replication
+
+    Returns:
+        Tuple containing:
+        - The means of consecutive batches of MSER_BATCH_SIZE response times after the warm-up
+        - The utilization of the servers after the warm-up
+        - The histogram of the response times after the warm-up
+    """
+    rng = np.random.default_rng(seed)
+    distribution = create_distribution(system_config.service_distribution, system_config.distribution_parameter)
+    mean_service_time = 1 / system_config.service_rate
+    mean_think_time = 1 / system_config.arrival_rate
+    request_count = system_config.des_requests
+
+    request_times = np.sort(rng.exponential(mean_think_time, number_of_users)).tolist()  # a sorted list is a heap
+    server_free_times = [0.0] * system_config.number_of_servers
+    arrival_times = np.empty(request_count)
+    departure_times = np.empty(request_count)
+    service_times = np.empty(request_count)
+    for block_start in range(0, request_count, VARIATE_BLOCK_SIZE):
+        block = slice(block_start, min(block_start + VARIATE_BLOCK_SIZE, request_count))
+        block_size = block.stop - block.start
+        service_times[block] = distribution.sample_block(rng, mean_service_time, block_size)
+        think_times = rng.exponential(mean_think_time, block_size)
+        arrival_times[block], departure_times[block] = _simulate_block(
+            request_times, server_free_times, service_times[block].tolist(), think_times.tolist())
+
+    response_times = departure_times - arrival_times
+    batch_count = request_count // MSER_BATCH_SIZE
+    batch_means = response_times[:batch_count * MSER_BATCH_SIZE].reshape(batch_count, MSER_BATCH_SIZE).mean(axis=1)
+    truncation = compute_mser_truncation(batch_means)
+    warm_up_requests = truncation * MSER_BATCH_SIZE
+
+    busy_time = float(service_times[warm_up_requests:].sum())
+    elapsed_time = float(departure_times[warm_up_requests:].max() - arrival_times[warm_up_requests])
+    utilization = min(1.0, busy_time / (system_config.number_of_servers * elapsed_time))
+    histogram = LatencyHistogram()
+    histogram.add_batch(response_times[warm_up_requests:])
+    return batch_means[truncation:], utilization, histogram
+
+
+def _simulate_block(request_times: List[float], server_free_times: List[float], service_times: List[float],
+                    think_times: List[float]) -> Tuple[List[float], List[float]]:
+    """
+    Serve the next len(service_times) requests in the order they are issued.
+
+    Args:
+        request_times: Heap of the times at which the clients issue their next request, updated in place
+        server_free_times: Heap of the times at which the servers become free, updated in place
+        service_times: Service time of each request
+        think_times: Think time of the client of each request after its response
+
+    Returns:
+        The arrival and the departure time of each request
+    """
+    arrival_times = [0.0] * len(service_times)
+    departure_times = [0.0] * len(service_times)
+    heapreplace = heapq.heapreplace
+    for index, (service_time, think_time) in enumerate(zip(service_times, think_times)):
+        arrival_time = request_times[0]
+        free_time = server_free_times[0]
+        departure_time = (arrival_time if arrival_time > free_time else free_time) + service_time
+        heapreplace(server_free_times, departure_time)
+        heapreplace(request_times, departure_time + think_time)
+        arrival_times[index] = arrival_time
+        departure_times[index] = departure_time
+    return arrival_times, departure_times
+
+
+def _combine_replications(replications: List[Tuple[np.ndarray, float, LatencyHistogram]]) -> MeasuredMetric:
+    """
+    Aggregate the replications of one configuration: the interval is computed across the replication means,
+    or with batch means when there is a single replication.
+    """
+    histogram = LatencyHistogram()
+    for _, _, replication_histogram in replications:
+        histogram.merge(replication_histogram)
+    if len(replications) > 1:
+        replication_means = [float(batch_means.mean()) for batch_means, _, _ in replications]
+        avg_response_time = float(np.mean(replication_means))
+        ci_lower, ci_upper = compute_confidence_intervals(replication_means)
+    else:
+        avg_response_time, ci_lower, ci_upper = compute_batch_means_interval(replications[0][0],
+                                                                             CONFIDENCE_BATCH_COUNT)
+    utilization = float(np.mean([replication_utilization for _, replication_utilization, _ in replications]))
+    return MeasuredMetric(avg_response_time, ci_lower, ci_upper, utilization, 0.0, *compute_percentiles(histogram))
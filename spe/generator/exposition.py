@@ -0,0 +1,148 @@
+"""This module serves the live metrics of a run over HTTP, in the Prometheus text exposition format.
+
+A single endpoint, /metrics, describes both sides of the running load test:
+- the load generator: throughput, requests in flight, failures, response-time quantiles and scheduling lateness,
+  from the lock-free counters its clients update (LoadGenerator.read_live_metrics)
+- the server: current mu, ready workers, busy fraction of each worker and requests served, from the files the
+  workers already update on every request (spe.server.busy_time, spe.server.control)
+
+It runs in a background thread of the process driving the run, not in the Gunicorn workers: a scrape is never
+queued behind the tasks of the M/M/k queue, nor counted in their busy time, and it only reads shared memory.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import math
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from spe.generator.load_generator import LoadGenerator
+from spe.server.busy_time import SERVICE_TIME_FIELDS, count_ready_servers, read_busy_windows, read_service_time_totals
+from spe.server.control import SharedControl
+from spe.utils.metric import PERCENTILES
+
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+BUSY_FRACTION_WINDOW = 10  # seconds over which the busy fraction of each worker is measured
+
+Sample = Tuple[str, float]  # (labels, e.g. 'worker="123"' or '', value)
+
+
+class MetricsExporter:
+    """
+    HTTP server exposing the metrics of the current load test and of the server on METRICS_PATH.
+    The load test being measured is set in load_generator (None between two tests).
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1") -> None:
+        self.load_generator: Optional[LoadGenerator] = None
+        self._control = SharedControl()
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                content = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # one line per scrape would flood the output of the run
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'MetricsExporter':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        print(f"[INFO] Live metrics served on http://{host}:{port}{METRICS_PATH}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def render(self) -> str:
+        """Current metrics in the Prometheus text format."""
+        lines: List[str] = []
+        if self.load_generator is not None:
+            lines += _generator_metrics(self.load_generator)
+        lines += self._server_metrics()
+        return "\n".join(lines) + "\n"
+
+    def _server_metrics(self) -> List[str]:
+        now = time.time()
+        pids, busy_times = read_busy_windows(now - BUSY_FRACTION_WINDOW, now)
+        totals = dict(zip(SERVICE_TIME_FIELDS, read_service_time_totals().tolist()))
+        state = self._control.read()
+        service_rate = math.nan if state is None else state[1]  # None while a configuration is being written
+        return [
+            *_format("spe_server_service_rate", "gauge", "Current service rate mu of the workers", [("", service_rate)]),
+            *_format("spe_server_workers", "gauge", "Workers ready to serve", [("", count_ready_servers())]),
+            *_format("spe_server_busy_fraction", "gauge",
+                     f"Fraction of the last {BUSY_FRACTION_WINDOW}s each worker spent serving requests",
+                     [(f'worker="{pid}"', busy_time / BUSY_FRACTION_WINDOW)
+                      for pid, busy_time in zip(pids.tolist(), busy_times.sum(axis=1).tolist())]),
+            *_format("spe_server_requests_total", "counter", "Requests served by the workers",
+                     [("", totals['count'])]),
+            *_format("spe_server_service_time_seconds_total", "counter", "Time spent by the workers on their tasks",
+                     [("", totals['actual_time'])]),
+            *_format("spe_server_overhead_seconds_total", "counter",
+                     "Time spent by the workers on requests besides their tasks", [("", totals['overhead'])]),
+        ]
+
+
+def _generator_metrics(load_generator: LoadGenerator) -> List[str]:
+    counters = load_generator.read_live_metrics()
+    if not counters:
+        return []
+    requests = counters['completed'] + counters['failed']
+    statistics = load_generator.live_statistics  # not available in the parent of the hybrid engine
+    histogram = statistics.response_time_histogram if statistics is not None else None
+    quantiles = [(f'quantile="{percentile / 100}"', histogram.quantile(percentile / 100)
+                  if histogram is not None and histogram.total > 0 else math.nan) for percentile in PERCENTILES]
+    return [
+        *_format("spe_generator_users", "gauge", "Clients of the running load test", [("", load_generator.client_count)]),
+        *_format("spe_generator_requests_total", "counter", "Requests sent", [("", counters['sent'])]),
+        *_format("spe_generator_failures_total", "counter", "Requests without a successful response",
+                 [("", counters['failed'])]),
+        *_format("spe_generator_in_flight_requests", "gauge", "Requests sent and not yet answered",
+                 [("", counters['in_flight'])]),
+        *_format("spe_generator_throughput", "gauge", "Successful responses per second since the start of the test",
+                 [("", counters['completed'] / counters['elapsed'] if counters['elapsed'] > 0 else 0.0)]),
+        *_format("spe_generator_response_time_seconds", "summary",
+                 "Response times of the successful requests of the test",
+                 [*quantiles, ("sum", counters['response_time_sum']), ("count", counters['completed'])]),
+        *_format("spe_generator_scheduling_lateness_seconds", "gauge",
+                 "Mean delay of the requests after their scheduled send time",
+                 [("", counters['lateness_sum'] / requests if requests > 0 else 0.0)]),
+    ]
+
+
+def _format(name: str, metric_type: str, description: str, samples: Iterable[Sample]) -> List[str]:
+    """
+    Lines of one metric family. For a summary, the labels "sum" and "count" denote its _sum and _count series.
+    """
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if metric_type == "summary" and labels in ("sum", "count"):
+            lines.append(f"{name}_{labels} {_format_value(value)}")
+        else:
+            lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+    return lines
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
@@ -1,12 +1,83 @@
 """Module for generating HTTP load on a target server using parallel clients."""
+import asyncio
+import http.client
+import math
+import os
 import time
-from multiprocessing import Process, Queue
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from multiprocessing import Event, Pool, Process
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-import requests
+import aiohttp
 import numpy as np
 
-from spe.utils.metric import compute_mean, compute_confidence_intervals
+from spe.utils.metric import (compute_batch_means_interval, compute_mser_truncation,
+                              compute_streaming_confidence_intervals)
+from spe.server.busy_time import SERVER_END_HEADER, SERVER_START_HEADER
+from spe.utils.streaming import (BatchMeansAccumulator, LatencyHistogram, SharedCounters, SharedRingBuffer,
+                                 StreamingStatistics)
+from spe.utils.trace import TRACE_DTYPE, TraceWriter, read_trace
+
+
+ENGINE_PROCESS = "process"
+ENGINE_ASYNCIO = "asyncio"
+ENGINE_HYBRID = "hybrid"
+ENGINES = (ENGINE_PROCESS, ENGINE_ASYNCIO, ENGINE_HYBRID)
+CONNECTION_KEEP_ALIVE = "keep-alive"
+CONNECTION_NEW = "new"
+CONNECTION_MODES = (CONNECTION_KEEP_ALIVE, CONNECTION_NEW)
+LOAD_CLOSED = "closed"
+LOAD_OPEN_POISSON = "open-poisson"
+LOAD_OPEN_CONSTANT = "open-constant"
+LOAD_MODELS = (LOAD_CLOSED, LOAD_OPEN_POISSON, LOAD_OPEN_CONSTANT)
+REQUEST_TIMEOUT = 60
+RING_CAPACITY = 1024  # records buffered per client process between two drains
+DRAIN_INTERVAL = 0.1  # seconds between two drains of the client rings
+RESPONSE_TIME_FIELD = 0
+CONNECTION_TIME_FIELD = 1
+LATENESS_FIELD = 2
+TRACE_FIELDS = slice(3, 10)  # the fields of a trace record (TRACE_DTYPE), times in perf_counter seconds
+RECORD_WIDTH = 10  # (response time, connection time, scheduling lateness, *trace record), NaN when not measured
+THINK_TIME_BLOCK_SIZE = 1024  # think times drawn at once by each client
+CONVERGENCE_CHECK_INTERVAL = 1  # seconds between two checks of the precision of an adaptive run
+CONFIDENCE_BATCH_COUNT = 20  # batches of the batch means confidence interval
+MIN_BATCH_MEANS = 4 * CONFIDENCE_BATCH_COUNT  # MSER-5 batch means (of 5 observations) before the first check
+LIVE_FIELDS = ('sent', 'completed', 'failed', 'in_flight', 'response_time_sum', 'lateness_sum')  # per client
+LIVE_SENT, LIVE_COMPLETED, LIVE_FAILED, LIVE_IN_FLIGHT, LIVE_RESPONSE_TIME_SUM, LIVE_LATENESS_SUM = range(len(LIVE_FIELDS))
+
+_inherited_live_counters: Optional[SharedCounters] = None  # in the shards of the hybrid engine
+
+
+@dataclass
+class ClientStatistics:
+    """Running aggregates of the measurements of one or more clients, in seconds, in constant memory."""
+    response_times: StreamingStatistics = field(default_factory=StreamingStatistics)
+    response_time_histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    connection_times: StreamingStatistics = field(default_factory=StreamingStatistics)
+    scheduling_lateness: StreamingStatistics = field(default_factory=StreamingStatistics)
+
+    def add_response_time(self, response_time: float) -> None:
+        self.response_times.add(response_time)
+        self.response_time_histogram.add(response_time)
+
+    def add_records(self, records: np.ndarray) -> None:
+        """Add a batch of records (see RECORD_WIDTH) drained from a client ring."""
+        response_times = records[:, RESPONSE_TIME_FIELD]
+        response_times = response_times[~np.isnan(response_times)]
+        connection_times = records[:, CONNECTION_TIME_FIELD]
+        self.response_times.add_batch(response_times)
+        self.response_time_histogram.add_batch(response_times)
+        self.connection_times.add_batch(connection_times[~np.isnan(connection_times)])
+        lateness = records[:, LATENESS_FIELD]
+        self.scheduling_lateness.add_batch(lateness[~np.isnan(lateness)])
+
+    def merge(self, other: 'ClientStatistics') -> None:
+        self.response_times.merge(other.response_times)
+        self.response_time_histogram.merge(other.response_time_histogram)
+        self.connection_times.merge(other.connection_times)
+        self.scheduling_lateness.merge(other.scheduling_lateness)
 
 
 class LoadGenerator:
@@ -16,92 +87,346 @@ class LoadGenerator:
     This class simulates multiple independent clients making requests to a server with
     exponentially distributed inter-arrival times, collects response times,
     and calculates statistics.
+
+    Three engines are available:
+    - "process": one OS process per client, each using blocking HTTP requests
+    - "asyncio": every client is a coroutine of a single event loop, all sharing a
+      pool of keep-alive connections, so tens of thousands of clients fit in one process
+    - "hybrid": the clients are split into shards, each shard being a worker process that runs
+      its clients as coroutines, so the offered load scales with the cores of the generator host
+
+    Connections are handled in one of two modes:
+    - "keep-alive": each client (or the whole coroutine pool) reuses its connections, the time
+      spent opening a new one is not part of the response time
+    - "new": a new connection is opened for every request and its setup time is part of the response time
+    In both modes the connection setup times are collected separately (avg_connection_time).
+
+    Every client has its own random stream, spawned from seed, so runs are reproducible and clients do not
+    draw the same think times. Think times are drawn in blocks and each client sleeps until absolute
+    perf_counter deadlines, so that sleep jitter does not accumulate; how late each request is sent with respect
+    to its deadline is collected as the scheduling lateness (avg_scheduling_lateness), which reveals an
+    overloaded generator.
+
+    The load model is either closed ("closed": each client waits for its response before thinking
+    again) or open ("open-poisson", "open-constant": each client issues requests at rate arrival_rate
+    on a fixed schedule, whether or not the previous ones completed, for a total rate of
+    client_count * arrival_rate). In open mode response times are measured from the scheduled send
+    time, so delays of the generator itself are not hidden (coordinated omission).
+    Open modes need a coroutine engine ("asyncio" or "hybrid").
+
+    Response times are never stored one by one: client processes stream them through shared-memory
+    rings and coroutines update the aggregates directly, so memory does not grow with the run length.
+    The aggregates of the last run are kept in statistics.
+
+    With a target_precision the run is adaptive ("process" and "asyncio" engines): the warm-up is detected
+    with MSER-5 and discarded, and the run stops as soon as the half-width of the batch means confidence
+    interval of the mean response time is below target_precision times the mean, or after
+    client_request_time seconds at most. The detected warm-up is then available in warm_up_time.
+
+    With live_metrics every client also updates its row of shared counters (LIVE_FIELDS) around each request,
+    without locks, so that read_live_metrics and live_statistics describe the running load test (they are read
+    by spe.generator.exposition). The parent of the hybrid engine only sees the counters, not the response times.
+
+    With a trace_path every request is also recorded in a binary trace (spe.utils.trace): client, intended and
+    actual send times, server-side start and end, status and reception time. With a replay_path the arrival
+    times of a recorded trace are re-issued instead, open loop and in a single event loop, whatever the engine.
     """
-    rng = np.random.default_rng(42)
+    seed = 42
 
-    def __init__(self, client_count: int, arrival_rate: float, target_url: str, client_request_time: int) -> None:
+    def __init__(self, client_count: int, arrival_rate: float, target_url: str, client_request_time: int,
+                 engine: str = ENGINE_PROCESS, shards: Optional[int] = None,
+                 clients_per_shard: Optional[int] = None, connection_mode: str = CONNECTION_KEEP_ALIVE,
+                 load_model: str = LOAD_CLOSED, target_precision: Optional[float] = None,
+                 trace_path: Optional[str] = None, replay_path: Optional[str] = None,
+                 live_metrics: bool = False) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        if connection_mode not in CONNECTION_MODES:
+            raise ValueError(f"Unknown connection mode '{connection_mode}', expected one of {CONNECTION_MODES}")
+        if load_model not in LOAD_MODELS:
+            raise ValueError(f"Unknown load model '{load_model}', expected one of {LOAD_MODELS}")
+        if load_model != LOAD_CLOSED and engine == ENGINE_PROCESS:
+            raise ValueError(f"The '{load_model}' load model requires the '{ENGINE_ASYNCIO}' or '{ENGINE_HYBRID}' engine")
+        if target_precision is not None and engine == ENGINE_HYBRID:
+            raise ValueError(f"Adaptive runs require the '{ENGINE_PROCESS}' or '{ENGINE_ASYNCIO}' engine")
         self.client_count = client_count
         self.arrival_rate = arrival_rate
         self.target_url = target_url
         self.client_request_time = client_request_time
+        self.engine = engine
+        self.shards = self._compute_shard_count(shards, clients_per_shard)
+        self.connection_mode = connection_mode
+        self.load_model = load_model
+        self.target_precision = target_precision
+        self.trace_path = trace_path
+        self.replay_path = replay_path
+        self.live_metrics = live_metrics
+        self.live_statistics: Optional[ClientStatistics] = None  # aggregates being updated by the running test
+        self.avg_connection_time = 0.0
+        self.avg_scheduling_lateness = 0.0
+        self.statistics = ClientStatistics()
+        self.batch_means = BatchMeansAccumulator()
+        self.converged = False
+        self.warm_up_time = 0.0  # seconds from the start of the run, detected in adaptive runs
+        self.relative_precision = math.nan  # half-width of the interval over the mean, in adaptive runs
+        # set to stop the clients of an adaptive run (not created otherwise: the hybrid engine pickles self)
+        self._stop_event = Event() if target_precision is not None else None
+        self._start_time = 0.0
+        self._origin = 0.0  # perf_counter time of the start of the run, origin of the trace
+        self._trace_writer: Optional[TraceWriter] = None  # of the current process
+        self._live_counters: Optional[SharedCounters] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_live_counters'] = None  # shared memory: the shards inherit it through the initializer of their pool
+        return state
+
+    def read_live_metrics(self) -> Dict[str, float]:
+        """
+        Totals of the live counters of the running (or last) load test, from any thread of the parent process.
+
+        Returns:
+            The value of each of LIVE_FIELDS and the seconds elapsed since the start of the test ('elapsed'),
+            or an empty dictionary without live_metrics
+        """
+        if self._live_counters is None:
+            return {}
+        return {**dict(zip(LIVE_FIELDS, self._live_counters.totals().tolist())),
+                'elapsed': time.time() - self._start_time}
 
     def generate_load(self) -> Tuple[float, float, float]:
         """
         Run load test with multiple client processes and collect statistics.
+        The mean connection setup time is stored in avg_connection_time and the mean scheduling lateness in
+        avg_scheduling_lateness.
 
         Returns:
             Tuple containing:
             - Average response time (float)
             - Lower bound of confidence interval (float)
             - Upper bound of confidence interval (float)
+            All three are NaN when no request succeeded.
         """
-        processes = []
-        queue = Queue()
-        response_times = []
+        client_seeds = np.random.SeedSequence(self.seed).spawn(self.client_count)
+        if self.live_metrics:
+            self._live_counters = SharedCounters(self.client_count, len(LIVE_FIELDS))  # before forking the clients
+        self._start_time = time.time()
+        self._origin = time.perf_counter()
+        if self.replay_path is not None:
+            self._trace_writer = self._create_trace_writer(self.trace_path)
+            statistics = asyncio.run(self._replay_trace())
+        elif self.engine == ENGINE_ASYNCIO:
+            statistics = self._run_shard(list(enumerate(client_seeds)))
+        elif self.engine == ENGINE_HYBRID:
+            statistics = self._run_shards(list(enumerate(client_seeds)))
+        else:
+            rings = [SharedRingBuffer(RING_CAPACITY, RECORD_WIDTH) for _ in range(self.client_count)]
+            processes = self._start_client_processes(rings, client_seeds)
+            self._trace_writer = self._create_trace_writer(self.trace_path)  # not inherited by the clients
+            statistics = self._collect_response_times(rings, processes)
+        if self._trace_writer is not None:
+            self._trace_writer.close()
+            self._trace_writer = None
+        self.statistics = statistics
+        if statistics.connection_times.count > 0:
+            self.avg_connection_time = statistics.connection_times.mean
+        if statistics.scheduling_lateness.count > 0:
+            self.avg_scheduling_lateness = statistics.scheduling_lateness.mean
+        if self.target_precision is not None and len(self.batch_means.means) >= MIN_BATCH_MEANS:
+            # autocorrelated response times: the interval of the batch means, after the warm-up
+            return self._estimate_after_warm_up()
+        if statistics.response_times.count == 0:
+            return math.nan, math.nan, math.nan  # the default mean of 0.0 would pass for a perfect result
+        avg_response_time = statistics.response_times.mean
+        ci_lower, ci_upper = compute_streaming_confidence_intervals(statistics.response_times)
+        return avg_response_time, ci_lower, ci_upper
+
+    def _estimate_after_warm_up(self) -> Tuple[float, float, float]:
+        """
+        Detect the warm-up of the response times so far with MSER-5, and estimate their mean after it with
+        batch means. The warm-up duration and the relative precision reached are stored.
 
-        processes = self._start_client_processes(queue)
-        response_times = self._collect_response_times(queue, processes)
-        avg_response_time = compute_mean(response_times)
-        ci_lower, ci_upper = compute_confidence_intervals(response_times)
+        Returns:
+            Tuple containing the average response time and the bounds of its confidence interval
+        """
+        batch_means = np.asarray(self.batch_means.means)
+        truncation = compute_mser_truncation(batch_means)
+        avg_response_time, ci_lower, ci_upper = compute_batch_means_interval(batch_means[truncation:],
+                                                                             CONFIDENCE_BATCH_COUNT)
+        self.warm_up_time = self.batch_means.times[truncation - 1] - self._start_time if truncation > 0 else 0.0
+        self.relative_precision = (ci_upper - avg_response_time) / avg_response_time
         return avg_response_time, ci_lower, ci_upper
 
-    def _start_client_processes(self, queue: Queue) -> List[Process]:
+    def _check_convergence(self) -> None:
+        """Stop the clients of an adaptive run if the target precision is reached."""
+        if len(self.batch_means.means) < MIN_BATCH_MEANS:
+            return
+        self._estimate_after_warm_up()
+        if self.relative_precision <= self.target_precision:
+            self.converged = True
+            self._stop_event.set()
+
+    def _is_stopped(self) -> bool:
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    def _compute_shard_count(self, shards: Optional[int], clients_per_shard: Optional[int]) -> int:
+        """
+        Number of worker processes of the hybrid engine: enough shards to keep at most clients_per_shard
+        clients in each of them if given, otherwise the requested number (default one per core).
+        """
+        if clients_per_shard is not None:
+            shards = -(-self.client_count // clients_per_shard)
+        elif shards is None:
+            shards = os.cpu_count() or 1
+        return max(1, min(shards, self.client_count))
+
+    def _run_shards(self, clients: List[Tuple[int, np.random.SeedSequence]]) -> ClientStatistics:
+        """
+        Split the clients evenly among a pool of worker processes and merge their measurements.
+
+        Args:
+            clients: Index and seed of each client, so that results do not depend on the number of shards
+
+        Returns:
+            Measurements collected from all shards
+        """
+        shard_clients = [clients[shard::self.shards] for shard in range(self.shards)]
+        with Pool(processes=self.shards, initializer=_inherit_live_counters, initargs=(self._live_counters,)) as pool:
+            shard_results = pool.map(self._run_shard, shard_clients)
+
+        statistics = ClientStatistics()
+        for shard_statistics in shard_results:
+            statistics.merge(shard_statistics)
+        if self.trace_path is not None:
+            # gather the traces of the shards into a single one
+            self._trace_writer = self._create_trace_writer(self.trace_path)
+            for shard in shard_clients:
+                part_path = self._trace_part_path(shard)
+                self._trace_writer.append_batch(read_trace(part_path)[1])
+                os.remove(part_path)
+        return statistics
+
+    def _run_shard(self, clients: List[Tuple[int, np.random.SeedSequence]]) -> ClientStatistics:
+        """Run one coroutine per client in a new event loop of the current process."""
+        if self.engine == ENGINE_HYBRID:
+            self._live_counters = _inherited_live_counters
+        if self.trace_path is not None:
+            # each process of the hybrid engine writes its own part of the trace
+            shard_trace_path = self.trace_path if self.engine == ENGINE_ASYNCIO else self._trace_part_path(clients)
+            self._trace_writer = self._create_trace_writer(shard_trace_path)
+        statistics = asyncio.run(self._run_client_coroutines(clients))
+        if self._trace_writer is not None and self.engine != ENGINE_ASYNCIO:
+            self._trace_writer.close()
+            self._trace_writer = None
+        return statistics
+
+    def _create_trace_writer(self, path: Optional[str]) -> Optional[TraceWriter]:
+        """Open a trace at the given path, or return None when no trace is recorded."""
+        if path is None:
+            return None
+        open_loop = self.load_model != LOAD_CLOSED or self.replay_path is not None
+        return TraceWriter(path, self.client_count, open_loop, self._origin, self._start_time)
+
+    def _trace_part_path(self, clients: List[Tuple[int, np.random.SeedSequence]]) -> str:
+        """Trace written by the shard of the hybrid engine running the given clients."""
+        return f"{self.trace_path}.part{clients[0][0]}"
+
+    def _start_client_processes(self, rings: List[SharedRingBuffer],
+                                client_seeds: List[np.random.SeedSequence]) -> List[Process]:
         processes = []
 
-        for _ in range(self.client_count):
-            process = Process(target=self._send_requests, args=[queue])
+        for client_index, (ring, seed) in enumerate(zip(rings, client_seeds)):
+            process = Process(target=self._send_requests, args=[ring, seed, client_index])
             processes.append(process)
             process.start()
 
         return processes
 
-    def _send_requests(self, queque: Queue) -> None:
+    def _send_requests(self, ring: SharedRingBuffer, seed: np.random.SeedSequence, client_index: int) -> None:
         """
         Send HTTP requests to the target URL with exponentially distributed intervals.
 
         Args:
-            queue: Queue to which response times will be added
+            ring: Shared buffer to which a record (see RECORD_WIDTH) is pushed per request
+            seed: Seed of the random stream of this client
+            client_index: Position of the client among all the clients of the generator
         """
-        response_times = []
-        elapsed_time = 0.0
+        url = urlsplit(self.target_url)
+        path = url.path or "/"
+        headers = {"Connection": "close"} if self.connection_mode == CONNECTION_NEW else {}
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=REQUEST_TIMEOUT)
+        think_times = self._think_times(np.random.default_rng(seed))
+        live = None if self._live_counters is None else self._live_counters.row(client_index)
+        end_time = time.perf_counter() + self.client_request_time
+        deadline = time.perf_counter()
 
-        while elapsed_time < self.client_request_time:
-            start_time = time.time()
+        while time.perf_counter() < end_time and not self._is_stopped():
+            deadline += next(think_times)
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+            response_time = connection_time = server_start = server_end = receive_time = math.nan
+            status = 0
+            start_response_time = time.perf_counter()
+            lateness = start_response_time - deadline
+            if live is not None:
+                _record_live_request(live)
             try:
-                time.sleep(self.rng.exponential(1/self.arrival_rate))
-                start_response_time = time.time()
-                response = requests.get(self.target_url)
-                if response.status_code == 200:     # ignore responses with an error
-                    end_response_time = time.time()
-                    response_times.append(end_response_time - start_response_time)
-            except requests.exceptions.RequestException as e:
+                if connection.sock is None:     # first request, or the previous connection was closed
+                    connection.connect()
+                    connected_time = time.perf_counter()
+                    connection_time = connected_time - start_response_time
+                    if self.connection_mode == CONNECTION_KEEP_ALIVE:
+                        start_response_time = connected_time
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                receive_time = time.perf_counter()
+                status = response.status
+                if response.status == 200:     # ignore responses with an error
+                    response_time = receive_time - start_response_time
+                server_start = float(response.getheader(SERVER_START_HEADER, math.nan))
+                server_end = float(response.getheader(SERVER_END_HEADER, math.nan))
+                if self.connection_mode == CONNECTION_NEW:
+                    connection.close()
+            except (OSError, http.client.HTTPException) as e:
                 print(f"Error: {e}")
+                connection.close()
+            ring.push(response_time, connection_time, lateness, client_index, status, deadline, start_response_time,
+                      server_start, server_end, receive_time)
+            if live is not None:
+                _record_live_response(live, response_time, lateness)
+            deadline = time.perf_counter()  # the client thinks again once it has its response
 
-            end_time = time.time()
-            elapsed_time += (end_time - start_time)
+        connection.close()
 
-        queque.put(response_times)
+    def _think_times(self, rng: np.random.Generator) -> Iterator[float]:
+        """Exponential think times (mean 1 / arrival_rate) of a client, drawn THINK_TIME_BLOCK_SIZE at a time."""
+        while True:
+            yield from rng.exponential(1/self.arrival_rate, THINK_TIME_BLOCK_SIZE).tolist()
 
-    def _collect_response_times(self, queue: Queue, processes: List[Process]) -> List[float]:
+    def _collect_response_times(self, rings: List[SharedRingBuffer], processes: List[Process]) -> ClientStatistics:
         """
-        Collect response times from queue and clean up processes.
+        Aggregate the records streamed by the client processes and clean up processes.
 
         Args:
-            queue: Queue containing response time lists from client processes
+            rings: Shared buffers filled by the client processes
             processes: List of client processes
 
         Returns:
-            List of response times collected from all processes
+            Aggregated measurements of all processes
         """
-        response_times = []
+        statistics = ClientStatistics()
+        self.live_statistics = statistics
         join_timeout = self.client_request_time + 30
 
-        # Periodically collect results to avoid memory issues
-        # that happened with many clients and long client request times
+        # Drain the rings while the clients run: they are bounded, so a client whose ring is full waits
         end_time = time.time() + self.client_request_time + 60
+        next_check_time = time.time() + CONVERGENCE_CHECK_INTERVAL
         while time.time() < end_time and any(p.is_alive() for p in processes):
-            self._drain_queue(queue, response_times)
-            time.sleep(1)  # Avoid busy waiting
+            self._drain_rings(rings, statistics)
+            if self.target_precision is not None and time.time() >= next_check_time:
+                self._check_convergence()
+                next_check_time += CONVERGENCE_CHECK_INTERVAL
+            time.sleep(DRAIN_INTERVAL)  # Avoid busy waiting
 
         for process in processes:
             process.join(timeout=join_timeout)
@@ -110,13 +435,241 @@ class LoadGenerator:
                 process.terminate()
                 process.join(1)
 
-        self._drain_queue(queue, response_times)
-        return response_times
+        self._drain_rings(rings, statistics)
+        return statistics
+
+    def _drain_rings(self, rings: List[SharedRingBuffer], statistics: ClientStatistics) -> None:
+        """Move the records available in every ring into the aggregates."""
+        records = [ring.drain() for ring in rings]
+        records = np.concatenate(records) if records else np.empty((0, RECORD_WIDTH))
+        statistics.add_records(records)
+        if self._trace_writer is not None and len(records) > 0:
+            self._trace_writer.append_batch(self._to_trace_records(records[:, TRACE_FIELDS]))
+        if self.target_precision is not None:
+            response_times = records[:, RESPONSE_TIME_FIELD]
+            self.batch_means.add_batch(response_times[~np.isnan(response_times)])
 
-    def _drain_queue(self, queue: Queue, response_times: List[float]) -> None:
-        """Empty the queue and extend response_times list."""
+    def _to_trace_records(self, fields: np.ndarray) -> np.ndarray:
+        """Convert the trace fields of ring records (in TRACE_DTYPE order) into trace records relative to the origin."""
+        trace_records = np.empty(len(fields), dtype=TRACE_DTYPE)
+        for column, name in enumerate(TRACE_DTYPE.names):
+            if TRACE_DTYPE[name].kind == 'f':
+                trace_records[name] = fields[:, column] - self._origin
+            else:
+                trace_records[name] = fields[:, column]
+        return trace_records
+
+    async def _run_client_coroutines(self, clients: List[Tuple[int, np.random.SeedSequence]]) -> ClientStatistics:
+        """
+        Run every client as a coroutine sharing one pooled HTTP session.
+        In keep-alive mode idle connections are kept in the pool and reused by any client.
+
+        Args:
+            clients: Index and seed of the random generator of each client
+
+        Returns:
+            Aggregated measurements of all clients
+        """
+        statistics = ClientStatistics()
+        self.live_statistics = statistics
+
+        async with self._create_session() as session:
+            if self.load_model == LOAD_CLOSED:
+                coroutines = [self._send_requests_async(session, np.random.default_rng(seed), statistics, index)
+                              for index, seed in clients]
+            else:
+                coroutines = [self._send_open_loop_requests(session, np.random.default_rng(seed), statistics, index)
+                              for index, seed in clients]
+            if self.target_precision is None:
+                await asyncio.gather(*coroutines)
+            else:
+                monitor = asyncio.create_task(self._monitor_convergence())
+                await asyncio.gather(*coroutines)
+                monitor.cancel()
+
+        return statistics
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """HTTP session shared by the coroutine clients, timing the connections they open."""
+        if self.connection_mode == CONNECTION_NEW:
+            connector = aiohttp.TCPConnector(limit=0, force_close=True)
+        else:
+            connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=self.client_request_time + REQUEST_TIMEOUT)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(self._on_connection_create_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+
+    async def _replay_trace(self) -> ClientStatistics:
+        """
+        Re-issue the requests of the trace at replay_path at the same times from the start of the run, with the
+        same clients, without waiting for the previous responses (response times are measured from these times).
+
+        Returns:
+            Aggregated measurements of the replayed requests
+        """
+        _, records = read_trace(self.replay_path)
+        order = np.argsort(records['intended_time'], kind='stable')
+        statistics = ClientStatistics()
+        self.live_statistics = statistics
+        in_flight = set()
+
+        async with self._create_session() as session:
+            for client_index, offset in zip(records['client'][order].tolist(), records['intended_time'][order].tolist()):
+                if self._is_stopped():
+                    break
+                intended_time = self._origin + offset
+                await asyncio.sleep(max(0.0, intended_time - time.perf_counter()))
+                statistics.scheduling_lateness.add(time.perf_counter() - intended_time)
+                request = asyncio.create_task(
+                    self._send_request_async(session, statistics, intended_time, client_index, intended_time))
+                in_flight.add(request)
+                request.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        return statistics
+
+    async def _monitor_convergence(self) -> None:
+        """Check the precision of an adaptive run periodically, until the clients are stopped."""
+        while not self._is_stopped():
+            await asyncio.sleep(CONVERGENCE_CHECK_INTERVAL)
+            self._check_convergence()
+
+    async def _send_requests_async(self, session: aiohttp.ClientSession, rng: np.random.Generator,
+                                   statistics: ClientStatistics, client_index: int) -> None:
+        """
+        Coroutine version of _send_requests: think for an exponential time, then wait for the response.
+
+        Args:
+            session: HTTP session shared by all the clients
+            rng: Random generator owned by this client
+            statistics: Aggregates shared by all the clients of the event loop
+            client_index: Position of the client among all the clients of the generator
+        """
+        think_times = self._think_times(rng)
+        end_time = time.perf_counter() + self.client_request_time
+
+        while time.perf_counter() < end_time and not self._is_stopped():
+            deadline = time.perf_counter() + next(think_times)
+            await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+            start_response_time = time.perf_counter()
+            statistics.scheduling_lateness.add(start_response_time - deadline)
+            await self._send_request_async(session, statistics, start_response_time, client_index, deadline)
+
+    async def _send_open_loop_requests(self, session: aiohttp.ClientSession, rng: np.random.Generator,
+                                       statistics: ClientStatistics, client_index: int) -> None:
+        """
+        Issue requests at the absolute times of this client's arrival process, without waiting for
+        the previous responses. With constant arrivals the clients are staggered evenly, so that the
+        aggregated stream is also evenly spaced.
+
+        Args:
+            session: HTTP session shared by all the clients
+            rng: Random generator owned by this client
+            statistics: Aggregates shared by all the clients of the event loop
+            client_index: Position of the client among all the clients of the generator
+        """
+        think_times = self._think_times(rng)
+        start_time = time.perf_counter()
+        end_time = start_time + self.client_request_time
+        if self.load_model == LOAD_OPEN_CONSTANT:
+            intended_time = start_time + client_index / (self.client_count * self.arrival_rate)
+        else:
+            intended_time = start_time + next(think_times)
+        in_flight = set()
+
+        while intended_time < end_time and not self._is_stopped():
+            await asyncio.sleep(max(0.0, intended_time - time.perf_counter()))
+            statistics.scheduling_lateness.add(time.perf_counter() - intended_time)
+            request = asyncio.create_task(
+                self._send_request_async(session, statistics, intended_time, client_index, intended_time))
+            in_flight.add(request)
+            request.add_done_callback(in_flight.discard)
+            if self.load_model == LOAD_OPEN_CONSTANT:
+                intended_time += 1 / self.arrival_rate
+            else:
+                intended_time += next(think_times)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def _send_request_async(self, session: aiohttp.ClientSession, statistics: ClientStatistics,
+                                  start_response_time: float, client_index: int, intended_time: float) -> None:
+        """
+        Send one request and record its response time, measured from start_response_time.
+
+        Args:
+            session: HTTP session shared by all the clients
+            statistics: Aggregates shared by all the clients of the event loop
+            start_response_time: perf_counter time from which the response time is measured
+            client_index: Client sending the request, for the trace
+            intended_time: perf_counter time at which the request was due, for the trace
+        """
+        send_time = time.perf_counter()
+        status = 0
+        server_start = server_end = receive_time = math.nan
+        live = None
+        if self._live_counters is not None:
+            live = self._live_counters.row(client_index % self._live_counters.rows)
+            _record_live_request(live)
+        lateness = send_time - intended_time
         try:
-            while not queue.empty():
-                response_times.extend(queue.get(block=False))
-        except Exception as e:
-            print(f"Error reading from queue: {e}")
+            request_context = SimpleNamespace(connection_time=None)
+            async with session.get(self.target_url, trace_request_ctx=request_context) as response:
+                await response.read()
+                receive_time = time.perf_counter()
+                response_time = receive_time - start_response_time
+            status = response.status
+            server_start = float(response.headers.get(SERVER_START_HEADER, math.nan))
+            server_end = float(response.headers.get(SERVER_END_HEADER, math.nan))
+            if request_context.connection_time is not None:
+                statistics.connection_times.add(request_context.connection_time)
+                if self.connection_mode == CONNECTION_KEEP_ALIVE:
+                    response_time -= request_context.connection_time
+                    send_time += request_context.connection_time
+            if response.status == 200:     # ignore responses with an error
+                statistics.add_response_time(response_time)
+                if self.target_precision is not None:
+                    self.batch_means.add(response_time)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error: {e}")
+        if live is not None:
+            _record_live_response(live, response_time if status == 200 else math.nan, lateness)
+        if self._trace_writer is not None:
+            self._trace_writer.append(client_index, status, intended_time, send_time, server_start, server_end,
+                                      receive_time)
+
+    @staticmethod
+    async def _on_connection_create_start(session: aiohttp.ClientSession, context: SimpleNamespace,
+                                          params: aiohttp.TraceConnectionCreateStartParams) -> None:
+        context.connection_start = time.perf_counter()
+
+    @staticmethod
+    async def _on_connection_create_end(session: aiohttp.ClientSession, context: SimpleNamespace,
+                                        params: aiohttp.TraceConnectionCreateEndParams) -> None:
+        context.trace_request_ctx.connection_time = time.perf_counter() - context.connection_start
+
+
+def _inherit_live_counters(live_counters: Optional[SharedCounters]) -> None:
+    """Initializer of the shards of the hybrid engine, which receive the shared counters at fork time."""
+    global _inherited_live_counters
+    _inherited_live_counters = live_counters
+
+
+def _record_live_request(live: np.ndarray) -> None:
+    """Update the live counters of a client when it sends a request."""
+    live[LIVE_SENT] += 1
+    live[LIVE_IN_FLIGHT] += 1
+
+
+def _record_live_response(live: np.ndarray, response_time: float, lateness: float) -> None:
+    """Update the live counters of a client when a request ends (response_time NaN if it failed)."""
+    live[LIVE_IN_FLIGHT] -= 1
+    live[LIVE_LATENESS_SUM] += lateness
+    if math.isnan(response_time):
+        live[LIVE_FAILED] += 1
+    else:
+        live[LIVE_COMPLETED] += 1
+        live[LIVE_RESPONSE_TIME_SUM] += response_time
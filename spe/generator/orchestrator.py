@@ -0,0 +1,212 @@
+"""This module runs a matrix of independent experiments concurrently.
+
+Every experiment (one service rate, arrival rate, user range and number of servers) is a separate `main.py run`
+process with its own Gunicorn instance on its own port, its own working directory (logs, CSV files and figures)
+and its own busy-time folder and control file. It is pinned, with all its children, to a set of k + generator
+cores disjoint from those of the experiments running at the same time, so that they do not interfere.
+All the experiments record their runs, labelled with their name, in the same result store in the output folder.
+"""
+from dataclasses import dataclass
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+import spe.utils.file as file
+from spe.utils.results import ResultStore
+
+MAIN_SCRIPT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "main.py"))
+PROJECT_ROOT = os.path.dirname(MAIN_SCRIPT_PATH)
+REQUIRED_OPTIONS = ("s", "a", "t", "u", "k")
+RESULTS_NPZ_NAME = "results.npz"
+RESULTS_STORE_NAME = "results.sqlite"
+OUTPUT_LOG_NAME = "output.log"
+POLL_INTERVAL = 1  # seconds between two checks of the running experiments
+
+
+@dataclass
+class Experiment:
+    name: str
+    service_rate: float
+    arrival_rate: float
+    number_of_servers: int
+    user_range: range
+    arguments: List[str]  # of `main.py run`, without the port
+
+
+@dataclass
+class RunningExperiment:
+    experiment: Experiment
+    process: subprocess.Popen
+    cpus: Set[int]
+    port: int
+    state_folder: str  # busy-time records and control file of the Gunicorn instance
+    start_time: float
+
+
+def load_experiments(spec_path: str) -> List[Experiment]:
+    """
+    Read a spec file describing the experiment matrix.
+
+    The spec is a JSON object with an "experiments" list and optional "defaults". Each entry maps the options of
+    `main.py run` (without the dashes, e.g. "s", "a", "t", "u", "k", "load-model") to their value: a list for
+    options taking several values, true for flags. Entries are merged over the defaults, and an entry with
+    several values of "k" is split into one experiment per k, so that each gets its own cores.
+    An optional "name" sets the output folder of the entry (by default derived from s, a, t and u).
+
+    Example:
+        {"defaults": {"t": 120, "u": [1, 15], "k": [1, 2, 4]},
+         "experiments": [{"s": 10, "a": 10}, {"s": 10, "a": 5}, {"s": 5, "a": 10, "backend": "gthread"}]}
+
+    Raises:
+        ValueError: If an entry misses a required option
+    """
+    with open(spec_path, 'r') as spec_file:
+        spec = json.load(spec_file)
+    defaults = spec.get("defaults", {})
+
+    experiments = []
+    for entry in spec["experiments"]:
+        options = {**defaults, **entry}
+        missing = [option for option in REQUIRED_OPTIONS if option not in options]
+        if missing:
+            raise ValueError(f"Experiment {entry} misses the options: {', '.join(missing)}")
+        name = options.pop("name", None) or _default_name(options)
+        server_counts = options.pop("k")
+        for number_of_servers in (server_counts if isinstance(server_counts, list) else [server_counts]):
+            experiments.append(Experiment(name=os.path.join(name, f"k{number_of_servers}"),
+                                          service_rate=float(options["s"]), arrival_rate=float(options["a"]),
+                                          number_of_servers=number_of_servers,
+                                          user_range=range(options["u"][0], options["u"][1] + 1),
+                                          arguments=[*_to_arguments(options), "-k", str(number_of_servers)]))
+    return experiments
+
+
+def run_experiments(experiments: List[Experiment], output_folder: str, cpus: Optional[List[int]] = None,
+                    base_port: int = 5000, generator_cores: int = 1) -> None:
+    """
+    Run the experiments concurrently on disjoint sets of cores and merge their results.
+
+    Experiments are started in order as soon as k + generator_cores of the cores are free (an experiment needing
+    more cores than available runs alone on all of them), and each one listens on the lowest free port from
+    base_port. The runs of all the experiments are stored in <output_folder>/results.sqlite, and their
+    measured metrics are also exported to <output_folder>/results.npz.
+
+    Args:
+        experiments: Experiments to run, from load_experiments
+        output_folder: Folder with one subfolder per experiment
+        cpus: Cores to use (default: those this process may run on)
+        base_port: First port of the Gunicorn instances
+        generator_cores: Cores given to the load generator of each experiment, besides the k of its servers
+    """
+    available_cpus = set(cpus if cpus is not None else os.sched_getaffinity(0))
+    pending = list(experiments)
+    running: List[RunningExperiment] = []
+    failed = []
+    start_time = time.perf_counter()
+    print(f"[INFO] Running {len(experiments)} experiments on {len(available_cpus)} cores")
+
+    try:
+        while pending or running:
+            for experiment in list(pending):
+                required_cores = min(experiment.number_of_servers + generator_cores, len(available_cpus))
+                if required_cores > len(available_cpus) - sum(len(other.cpus) for other in running):
+                    continue
+                used_cpus = set().union(*(other.cpus for other in running))
+                used_ports = {other.port for other in running}
+                experiment_cpus = set(sorted(available_cpus - used_cpus)[:required_cores])
+                port = next(port for port in range(base_port, base_port + len(available_cpus) + 1) if port not in used_ports)
+                running.append(_start_experiment(experiment, output_folder, experiment_cpus, port))
+                pending.remove(experiment)
+
+            time.sleep(POLL_INTERVAL)
+            for current in [current for current in running if current.process.poll() is not None]:
+                running.remove(current)
+                shutil.rmtree(current.state_folder, ignore_errors=True)
+                elapsed_time = time.perf_counter() - current.start_time
+                if current.process.returncode != 0:
+                    failed.append(current.experiment.name)
+                    print(f"[WARN] Experiment {current.experiment.name} failed with code {current.process.returncode} "
+                          f"(see {os.path.join(output_folder, current.experiment.name, OUTPUT_LOG_NAME)})")
+                else:
+                    print(f"[INFO] Experiment {current.experiment.name} finished in {elapsed_time:.1f}s")
+    finally:
+        for current in running:  # interrupted: let each experiment stop its Gunicorn instance
+            current.process.send_signal(signal.SIGINT)
+            current.process.wait()
+            shutil.rmtree(current.state_folder, ignore_errors=True)
+
+    merge_results(experiments, output_folder)
+    print(f"[INFO] {len(experiments) - len(failed)} of {len(experiments)} experiments completed "
+          f"in {time.perf_counter() - start_time:.1f}s")
+
+
+def merge_results(experiments: List[Experiment], output_folder: str) -> None:
+    """
+    Export the measured metrics of the latest run of each experiment, one row per experiment and number of
+    users, into results.npz, with the columns of ResultStore.query_metrics (as `main.py results --export`).
+    """
+    results_path = os.path.join(output_folder, RESULTS_NPZ_NAME)
+    file.delete_file_if_exists(results_path)
+    store = ResultStore(os.path.join(output_folder, RESULTS_STORE_NAME))
+    try:
+        merged = []
+        for experiment in experiments:
+            metrics = store.query_metrics(label=experiment.name)
+            if len(metrics) > 0:
+                merged.append(metrics[metrics['run_id'] == metrics['run_id'].max()])
+    finally:
+        store.close()
+    if not merged:
+        print("[WARN] No experiment stored any result: nothing to merge")
+        return
+    file.write_columns_to_npz(results_path, np.concatenate(merged))
+    print(f"[INFO] Results merged into {results_path}")
+
+
+def _start_experiment(experiment: Experiment, output_folder: str, cpus: Set[int], port: int) -> RunningExperiment:
+    """Launch `main.py run` for an experiment, in its own folder and pinned (with its children) to the given cores."""
+    working_folder = os.path.join(output_folder, experiment.name)
+    os.makedirs(working_folder, exist_ok=True)
+    state_folder = tempfile.mkdtemp(prefix="spe_experiment_")
+    environment = {**os.environ,
+                   "PYTHONPATH": os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])),
+                   "SPE_BUSY_TIME_FOLDER": os.path.join(state_folder, "busy_time"),
+                   "SPE_CONTROL_FILE": os.path.join(state_folder, "control.bin"),
+                   "SPE_RESULTS_PATH": os.path.abspath(os.path.join(output_folder, RESULTS_STORE_NAME))}
+    command = [sys.executable, MAIN_SCRIPT_PATH, "run", *experiment.arguments, "--port", str(port),
+               "--label", experiment.name]
+
+    print(f"[INFO] Starting experiment {experiment.name} on port {port} with cores {sorted(cpus)}")
+    with open(os.path.join(working_folder, OUTPUT_LOG_NAME), 'w') as output_log:
+        process = subprocess.Popen(command, cwd=working_folder, env=environment, stdout=output_log,
+                                   stderr=subprocess.STDOUT, preexec_fn=lambda: os.sched_setaffinity(0, cpus))
+    return RunningExperiment(experiment, process, cpus, port, state_folder, time.perf_counter())
+
+
+def _default_name(options: Dict[str, Any]) -> str:
+    """Folder name in the style of the experiments run by hand, e.g. s10_a5_t120_u1-15."""
+    first_users, last_users = options["u"]
+    return f"s{options['s']}_a{options['a']}_t{options['t']}_u{first_users}-{last_users}"
+
+
+def _to_arguments(options: Dict[str, Any]) -> List[str]:
+    """Command-line arguments of `main.py run` for the options of a spec entry."""
+    arguments = []
+    for option, value in options.items():
+        flag = f"-{option}" if len(option) == 1 else f"--{option.replace('_', '-')}"
+        if value is True:
+            arguments.append(flag)
+        elif isinstance(value, list):
+            arguments.extend([flag, *(str(item) for item in value)])
+        elif value is not False and value is not None:
+            arguments.extend([flag, str(value)])
+    return arguments
+
@@ -1,32 +1,135 @@
 """This module is responsible for simulating load on a web server."""
+import math
+import os
+import time
+from dataclasses import replace
+from typing import List, Optional
+
+import numpy as np
+
 import spe.utils.file as file
+from spe.generator.discrete_event import ENGINE_DES, simulate_measured_metrics
+from spe.generator.exposition import MetricsExporter
 from spe.generator.load_generator import LoadGenerator
+from spe.server.busy_time import (SERVICE_TIME_FIELDS, UtilizationMonitor, read_service_time_accuracy,
+                                  read_service_time_totals, read_worker_busy_times, reset_service_times)
 from spe.utils.argument_parser import Config
-from spe.utils.metric import MeasuredMetric, compute_theoretical_metrics, compute_utilization_from_logs
-from spe.utils.plot import save_metrics_plot
+from spe.utils.cache import ModelCache
+from spe.utils.metric import (SOLVER_VERSION, MeasuredMetric, TheoreticalMetric, compute_general_service_metrics,
+                              compute_load_imbalance, compute_open_theoretical_metrics, compute_percentiles,
+                              compute_server_utilizations, compute_theoretical_metrics)
+from spe.utils.plot import save_metrics_plot, save_server_utilization_plot
+from spe.utils.results import ResultStore, StoredRun
+from spe.utils.trace import COMPRESSED_SUFFIX, compress_trace
+
+LATENESS_WARNING_THRESHOLD = 0.005  # seconds of mean scheduling lateness above which the generator is overloaded
 
 
-def run_load_simulation(target_url: str, system_config: Config) -> None:
+def run_load_simulation(target_url: str, system_config: Config, exporter: Optional[MetricsExporter] = None) -> None:
     """
     Run a complete load simulation across a range of user counts.
-    This function collect the metrics in a CSV file and generates a plot comparing theoretical and measured metrics.
+    This function records the metrics as a new run of the result store (spe.utils.results) and generates a plot
+    comparing theoretical and measured metrics.
+    With the "des" engine the metrics come from the discrete-event simulator instead, without any server;
+    with des_overlay the simulated metrics are added to the plot of the measured ones.
 
     Args:
         target_url: The URL to target with the load test
         system_config: Configuration parameters for the simulation
+        exporter: Live metrics endpoint, following each load test as it runs
     """
-    file.delete_file_if_exists(file.CSV_PATH)
-    theoretical_metrics = compute_theoretical_metrics(system_config)
+    theoretical_metrics = _compute_theoretical_metrics(system_config)
+    store = ResultStore()
+    try:
+        run_id = store.start_run(system_config, system_config.label)
+        if system_config.engine == ENGINE_DES:
+            for number_of_users, simulated_metric in zip(system_config.user_range,
+                                                         _simulate_measured_metrics(system_config)):
+                store.add_metrics(run_id, number_of_users, simulated_metric)
+            store.flush()
+            save_metrics_plot(system_config, theoretical_metrics, list(store.read_metrics(run_id).values()))
+            print(f"[INFO] Simulation finished: run {run_id} stored in {store.path}, metrics' plot generated successfully")
+            return
 
-    for number_of_users in system_config.user_range:
-        _collect_measured_metrics(target_url, number_of_users, system_config)
+        reset_service_times()  # the workers of a warm server still hold the records of the previous runs
+        for number_of_users in system_config.user_range:
+            store.add_metrics(run_id, number_of_users, _collect_measured_metrics(
+                target_url, number_of_users, system_config, store, run_id, exporter))
+            store.flush()  # each load test is kept even if a later one fails
+        _report_service_time_accuracy(system_config)
 
-    system_metrics = file.read_metrics_from_csv(file.CSV_PATH)
-    save_metrics_plot(system_config, theoretical_metrics, system_metrics)
-    print("[INFO] Simulation finished: metrics' plot generated successfully")
+        system_metrics = list(store.read_metrics(run_id).values())
+        simulated_metrics = _simulate_measured_metrics(system_config) if system_config.des_overlay else None
+        save_metrics_plot(system_config, theoretical_metrics, system_metrics, simulated_metrics)
+        save_server_utilization_plot(system_config, store.read_server_utilizations(run_id), system_metrics)
+    finally:
+        store.close()
+    print(f"[INFO] Simulation finished: run {run_id} stored in {store.path}, metrics' plot generated successfully")
 
 
-def _collect_measured_metrics(target_url: str, number_of_users: int, system_config: Config) -> None:
+def plot_stored_run(store: ResultStore, run: StoredRun) -> None:
+    """
+    Regenerate the plots of a stored run from its stored metrics, without measuring anything again.
+    A run interrupted before the end of its user range is plotted for the users it measured.
+    """
+    measured_metrics = store.read_metrics(run.run_id)
+    if not measured_metrics:
+        print(f"[WARN] Run {run.run_id} has no measured metrics")
+        return
+    system_config = replace(run.system_config, user_range=range(min(measured_metrics), max(measured_metrics) + 1))
+    save_metrics_plot(system_config, _compute_theoretical_metrics(system_config), list(measured_metrics.values()))
+    server_utilizations = store.read_server_utilizations(run.run_id)
+    if server_utilizations:
+        save_server_utilization_plot(system_config, server_utilizations, list(measured_metrics.values()))
+
+
+def _compute_theoretical_metrics(system_config: Config) -> List[TheoreticalMetric]:
+    """
+    Compute the theoretical metrics, reusing the results of previous runs when the cache is enabled.
+    With non-exponential service times the closed M/M/k results are corrected into an M/G/k approximation.
+    """
+    if system_config.load_model != "closed":
+        return compute_open_theoretical_metrics(system_config)
+    if system_config.cache_path is None:
+        theoretical_metrics = compute_theoretical_metrics(system_config, system_config.solver)
+    else:
+        cache = ModelCache(SOLVER_VERSION, system_config.cache_path)
+        try:
+            theoretical_metrics = compute_theoretical_metrics(system_config, system_config.solver, cache)
+        finally:
+            cache.close()
+        print(f"[INFO] Theoretical model cache: {cache.hits} hits, {cache.misses} misses")
+
+    if system_config.service_distribution != "exponential":
+        theoretical_metrics = compute_general_service_metrics(system_config, theoretical_metrics)
+    return theoretical_metrics
+
+
+def _simulate_measured_metrics(system_config: Config) -> List[MeasuredMetric]:
+    """Run the discrete-event simulation of the whole user range and report its speed."""
+    start_time = time.perf_counter()
+    simulated_metrics = simulate_measured_metrics(system_config)
+    elapsed_time = time.perf_counter() - start_time
+    request_count = len(system_config.user_range) * system_config.des_replications * system_config.des_requests
+    print(f"[INFO] Discrete-event simulation of {request_count} requests in {elapsed_time:.1f}s "
+          f"({request_count / elapsed_time:.0f} requests/s)")
+    return simulated_metrics
+
+
+def _report_service_time_accuracy(system_config: Config) -> None:
+    """Print how closely the service times of the server followed the sampled ones during this run."""
+    accuracy = read_service_time_accuracy()
+    if accuracy.count == 0:
+        return
+    print(f"[INFO] Service times of {accuracy.count} requests: mean {accuracy.actual_time:.6f}s "
+          f"for a sampled mean of {accuracy.requested_time:.6f}s (1/mu = {1 / system_config.service_rate:.6f}s), "
+          f"mean absolute error {accuracy.absolute_error * 1e3:.3f}ms, "
+          f"mean server overhead {accuracy.overhead * 1e3:.3f}ms, "
+          f"max overshoot {accuracy.max_overshoot * 1e3:.3f}ms, max undershoot {accuracy.max_undershoot * 1e3:.3f}ms")
+
+
+def _collect_measured_metrics(target_url: str, number_of_users: int, system_config: Config, store: ResultStore,
+                              run_id: int, exporter: Optional[MetricsExporter] = None) -> MeasuredMetric:
     """
     Execute a single load test with specified parameters and collect performance metrics.
 
@@ -34,15 +137,112 @@ def _collect_measured_metrics(target_url: str, number_of_users: int, system_conf
         target_url: The URL to target with the load test
         number_of_users: Number of simulated users for this test
         system_config: Configuration parameters for the simulation
+        store: Result store receiving the utilization of each server
+        run_id: Run of the store this load test belongs to
+        exporter: Live metrics endpoint to which the load generator is attached
+
+    Returns:
+        The measured metrics of the load test
     """
     arrival_rate = system_config.arrival_rate
     user_request_time = system_config.user_request_time
     number_of_servers = system_config.number_of_servers
 
-    load_generator = LoadGenerator(number_of_users, arrival_rate, target_url, user_request_time)
+    load_generator = LoadGenerator(number_of_users, arrival_rate, target_url, user_request_time, system_config.engine,
+                                   system_config.shards, system_config.clients_per_shard,
+                                   system_config.connection_mode, system_config.load_model,
+                                   system_config.target_precision, _trace_path(number_of_users, system_config),
+                                   _replay_path(number_of_users, system_config), live_metrics=exporter is not None)
+    if exporter is not None:
+        exporter.load_generator = load_generator
+    service_time_totals = read_service_time_totals()
+    utilization_monitor = UtilizationMonitor(number_of_servers).start()
     avg_time, ci_lower, ci_upper = load_generator.generate_load()
-    utilization = compute_utilization_from_logs(
-        "access.log", user_request_time, number_of_servers)
-    file.truncate_file("access.log")
-    file.write_metrics_to_csv(file.CSV_PATH, MeasuredMetric(
-        avg_time, ci_lower, ci_upper, utilization))
+    end_time = utilization_monitor.stop()
+    server_overhead = _compute_server_overhead(read_service_time_totals() - service_time_totals)
+    if load_generator.statistics.response_times.count == 0:
+        print(f"[WARN] No request of the {number_of_users} users succeeded: their response time is stored as NaN")
+    if load_generator.trace_path is not None:
+        trace_path = load_generator.trace_path
+        if system_config.compress_trace:
+            trace_path = compress_trace(trace_path)
+        print(f"[INFO] Trace of {load_generator.statistics.scheduling_lateness.count} requests written to {trace_path}")
+    if load_generator.avg_scheduling_lateness > LATENESS_WARNING_THRESHOLD:
+        print(f"[WARN] Requests were sent {load_generator.avg_scheduling_lateness * 1e3:.1f}ms late on average: "
+              f"the load generator is overloaded and the offered load is lower than expected")
+    if system_config.target_precision is not None:
+        _report_convergence(load_generator, end_time - utilization_monitor.start_time)
+
+    # the workers record their busy time themselves, so the measurement covers exactly this load test
+    warm_up = max(system_config.warm_up, load_generator.warm_up_time)
+    start_time = utilization_monitor.start_time + warm_up
+    if start_time >= end_time:
+        print(f"[WARN] The warm-up of {warm_up:.1f}s covers the whole load test of {number_of_users} users: "
+              f"the utilization is measured over the whole test instead")
+        start_time = utilization_monitor.start_time
+    worker_busy_times = read_worker_busy_times(start_time, end_time)
+    server_utilizations = compute_server_utilizations(
+        worker_busy_times.values(), end_time - start_time, number_of_servers)
+    utilization = min(1.0, float(server_utilizations.sum()) / number_of_servers)
+    store.add_server_utilizations(run_id, number_of_users, server_utilizations)
+
+    histogram = load_generator.statistics.response_time_histogram
+    if system_config.accumulate_histograms:
+        # percentiles over every run made so far with the same configuration
+        histogram_path = _histogram_path(number_of_users, system_config)
+        histogram.merge(file.load_histogram(histogram_path))
+        file.save_histogram(histogram_path, histogram)
+    return MeasuredMetric(
+        avg_time, ci_lower, ci_upper, utilization, load_generator.avg_connection_time, *compute_percentiles(histogram),
+        compute_load_imbalance(server_utilizations), server_overhead, load_generator.avg_scheduling_lateness)
+
+
+def _report_convergence(load_generator: LoadGenerator, duration: float) -> None:
+    """Print whether an adaptive load test reached its target precision, and with which warm-up."""
+    details = (f"{load_generator.statistics.response_times.count} requests, warm-up of "
+               f"{load_generator.warm_up_time:.1f}s, relative half-width {load_generator.relative_precision:.4f}")
+    if load_generator.converged:
+        print(f"[INFO] Converged after {duration:.1f}s: {details}")
+    else:
+        print(f"[WARN] Not converged to {load_generator.target_precision} after {duration:.1f}s: {details}")
+
+
+def _compute_server_overhead(service_time_sums: np.ndarray) -> float:
+    """Mean time spent by the server on a request besides its service time, from the sums of the requests of a test."""
+    count = service_time_sums[0]
+    return float(service_time_sums[SERVICE_TIME_FIELDS.index('overhead')] / count) if count > 0 else math.nan
+
+
+def _histogram_path(number_of_users: int, system_config: Config) -> str:
+    name = (f"histogram_s{system_config.service_rate}_a{system_config.arrival_rate}"
+            f"_k{system_config.number_of_servers}_u{number_of_users}.npz")
+    return os.path.join(file.HISTOGRAM_FOLDER, name)
+
+
+def _trace_path(number_of_users: int, system_config: Config) -> Optional[str]:
+    """
+    Path of the trace of a load test when traces are recorded, one folder per configuration.
+    The trace of a replay is kept apart from the recorded one, which may be the trace being replayed.
+    """
+    if not system_config.trace:
+        return None
+    configuration = (f"s{system_config.service_rate}_a{system_config.arrival_rate}"
+                     f"_k{system_config.number_of_servers}")
+    suffix = "" if system_config.replay_folder is None else "_replay"
+    return os.path.join(file.TRACE_FOLDER, configuration, f"u{number_of_users}{suffix}.bin")
+
+
+def _replay_path(number_of_users: int, system_config: Config) -> Optional[str]:
+    """
+    Trace to replay for a number of users, compressed or not, from the replay folder.
+
+    Raises:
+        FileNotFoundError: If the replay folder has no trace for this number of users
+    """
+    if system_config.replay_folder is None:
+        return None
+    path = os.path.join(system_config.replay_folder, f"u{number_of_users}.bin")
+    for candidate in (path, path + COMPRESSED_SUFFIX):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"No trace to replay for {number_of_users} users in {system_config.replay_folder}")
@@ -0,0 +1,112 @@
+"""This module implements an ASGI server with the same endpoints as spe.server.flask_server, health probe included.
+
+A single event loop accepts every request and offloads the tasks to a pool of SPE_POOL_SIZE processes
+(k in the M/M/k model), which are the servers of the queue: each records its own busy time.
+It is served by Gunicorn with the uvicorn worker class (one worker).
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from spe.server.busy_time import (SERVER_END_HEADER, SERVER_START_HEADER, begin_busy_interval, count_ready_servers,
+                                  end_busy_interval, record_service_time, register_server)
+from spe.server.control import SharedControl
+from spe.server.task import TaskRunner, parse_workload_configuration
+
+POOL_SIZE = int(os.environ.get("SPE_POOL_SIZE", os.cpu_count() or 1))
+
+control = SharedControl()
+_executor: Optional[ProcessPoolExecutor] = None
+_task_runner: Optional[TaskRunner] = None  # in each process of the pool
+
+
+def _initialize_pool_process() -> None:
+    global _task_runner
+    _task_runner = TaskRunner()
+    register_server()
+
+
+def _run_task(submit_time: float) -> Tuple[float, float, float]:
+    """
+    Serve a task in a process of the pool.
+
+    Returns:
+        Tuple[float, float, float]: The sampled service time, the time actually spent and the time the task
+            waited for a free process, in seconds
+    """
+    waiting_time = time.time() - submit_time
+    begin_busy_interval()
+    try:
+        delay, service_time = _task_runner.run()
+    finally:
+        end_busy_interval()
+    return delay, service_time, waiting_time
+
+
+async def app(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    if scope["type"] == "lifespan":
+        await _handle_lifespan(receive, send)
+    elif scope["type"] == "http":
+        await _handle_request(scope, send)
+
+
+async def _handle_lifespan(receive: Callable, send: Callable) -> None:
+    global _executor
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _executor = ProcessPoolExecutor(POOL_SIZE, initializer=_initialize_pool_process)
+            # start (and calibrate) every process of the pool before the first request
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(_executor, time.sleep, 0.1) for _ in range(POOL_SIZE)))
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _handle_request(scope: Dict[str, Any], send: Callable) -> None:
+    path = scope["path"]
+    if path == "/":
+        start_time = time.time()
+        server_start = time.perf_counter()
+        delay, service_time, waiting_time = await asyncio.get_running_loop().run_in_executor(
+            _executor, _run_task, start_time)
+        timing_headers = [(SERVER_START_HEADER.encode(), repr(server_start).encode()),
+                          (SERVER_END_HEADER.encode(), repr(time.perf_counter()).encode())]
+        await _send_json(send, 200, {"message": "Task completed", "duration": delay, "service_time": service_time},
+                         timing_headers)
+        # the waiting time is queueing, not overhead of the server
+        record_service_time(delay, service_time, time.time() - start_time - waiting_time - service_time)
+    elif path.startswith("/mu/"):
+        service_rate = float(path[len("/mu/"):])
+        control.write(service_rate=service_rate)
+        print(f"[INFO] Updated mu: {service_rate}")
+        await _send_json(send, 200, {"message": f"Service rate updated successfully (mu: {service_rate})"})
+    elif path.startswith("/workload/"):
+        arguments = dict(parse_qsl(scope["query_string"].decode()))
+        try:
+            configuration = parse_workload_configuration(path[len("/workload/"):], arguments)
+            control.write(configuration=configuration)
+        except (ValueError, OSError) as e:
+            await _send_json(send, 400, {"message": str(e)})
+            return
+        print(f"[INFO] Updated workload: {configuration}")
+        await _send_json(send, 200, {"message": f"Workload updated successfully ({configuration})"})
+    elif path == "/health":
+        await _send_json(send, 200, {"status": "ok", "servers": count_ready_servers()})
+    else:
+        await _send_json(send, 404, {"message": "Not found"})
+
+
+async def _send_json(send: Callable, status: int, content: Dict[str, Any],
+                     extra_headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    body = json.dumps(content).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + (extra_headers or [])})
+    await send({"type": "http.response.body", "body": body})
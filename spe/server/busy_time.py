@@ -0,0 +1,287 @@
+"""This module records how long each Gunicorn worker spends serving requests, in fixed time windows,
+and how closely its CPU-bound tasks match the sampled service times. The records are read back from the
+load generator without parsing any log.
+
+Every worker owns a small memory-mapped file in BUSY_TIME_FOLDER named after its pid. The file is a ring
+of WINDOW_COUNT windows of WINDOW_LENGTH seconds (wall-clock time): each slot stores the absolute index
+of the window it currently holds and the busy seconds accumulated in it, so slots left over from an
+older lap of the ring are recognized and ignored. A second file per worker holds the running sums of
+the requested and actual service times and of the server's own overhead (SERVICE_TIME_FIELDS).
+"""
+from dataclasses import dataclass
+import glob
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BUSY_TIME_FOLDER = os.environ.get("SPE_BUSY_TIME_FOLDER", "/tmp/spe_busy_time")
+WINDOW_LENGTH = 0.1  # seconds
+WINDOW_COUNT = 1 << 16  # about 1.8 hours of history per worker
+LIVE_REPORT_INTERVAL = 10  # seconds between two live utilization reports
+WINDOW_DTYPE = np.dtype([('window', np.int64), ('busy_time', np.float64)])
+# sums first (the overhead is the time spent handling a request besides its service time), then maxima
+SERVICE_TIME_FIELDS = ('count', 'requested_time', 'actual_time', 'absolute_error', 'overhead',
+                       'max_overshoot', 'max_undershoot')
+SUMMED_FIELDS = 5
+# response headers with the perf_counter times at which the server started and finished handling a request
+SERVER_START_HEADER = "X-Server-Start"
+SERVER_END_HEADER = "X-Server-End"
+
+
+class BusyTimeRecorder:
+    """
+    Accumulates the busy intervals of the current worker process into its memory-mapped file.
+    A worker serving several requests at once (threads, greenlets) is busy from the moment it starts
+    the first one until it has no request left, so overlapping requests are not counted twice.
+    """
+
+    def __init__(self, folder: str = BUSY_TIME_FOLDER) -> None:
+        os.makedirs(folder, exist_ok=True)
+        self.pid = os.getpid()
+        path = os.path.join(folder, f"worker_{self.pid}.bin")
+        self._windows = np.memmap(path, dtype=WINDOW_DTYPE, mode='w+', shape=(WINDOW_COUNT,))
+        self._windows['window'] = -1
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._busy_since = 0.0
+
+    def begin(self) -> None:
+        """Mark the start of a request."""
+        with self._lock:
+            if self._active_requests == 0:
+                self._busy_since = time.time()
+            self._active_requests += 1
+
+    def end(self) -> None:
+        """Mark the end of a request, recording the busy interval when no other request is in progress."""
+        with self._lock:
+            self._active_requests -= 1
+            if self._active_requests == 0:
+                self.record(self._busy_since, time.time())
+
+    def record(self, start_time: float, end_time: float) -> None:
+        """Add the interval [start_time, end_time] (seconds since the epoch) to the windows it overlaps."""
+        window = int(start_time // WINDOW_LENGTH)
+        while start_time < end_time:
+            window_end = (window + 1) * WINDOW_LENGTH
+            slot = window % WINDOW_COUNT
+            if self._windows['window'][slot] != window:
+                self._windows['busy_time'][slot] = 0.0
+                self._windows['window'][slot] = window
+            self._windows['busy_time'][slot] += min(end_time, window_end) - start_time
+            start_time = window_end
+            window += 1
+
+
+class ServiceTimeRecorder:
+    """Accumulates the requested and actual durations of the current worker's tasks into its memory-mapped file."""
+
+    def __init__(self, folder: str = BUSY_TIME_FOLDER) -> None:
+        os.makedirs(folder, exist_ok=True)
+        self.pid = os.getpid()
+        path = os.path.join(folder, f"service_{self.pid}.bin")
+        self._sums = np.memmap(path, dtype=np.float64, mode='w+', shape=(len(SERVICE_TIME_FIELDS),))
+        self._lock = threading.Lock()
+
+    def record(self, requested_time: float, actual_time: float, overhead: float) -> None:
+        error = actual_time - requested_time
+        with self._lock:
+            self._sums[:SUMMED_FIELDS] += (1, requested_time, actual_time, abs(error), overhead)
+            self._sums[SUMMED_FIELDS] = max(self._sums[SUMMED_FIELDS], error)
+            self._sums[SUMMED_FIELDS + 1] = max(self._sums[SUMMED_FIELDS + 1], -error)
+
+
+@dataclass
+class ServiceTimeAccuracy:
+    """How far the actual service times of the workers were from the sampled ones."""
+    count: int
+    requested_time: float  # mean, in seconds
+    actual_time: float  # mean, in seconds
+    absolute_error: float  # mean, in seconds
+    overhead: float  # mean, in seconds
+    max_overshoot: float  # seconds
+    max_undershoot: float  # seconds
+
+
+_recorder: Optional[BusyTimeRecorder] = None
+_service_time_recorder: Optional[ServiceTimeRecorder] = None
+_recorders_lock = threading.Lock()  # the first requests of a threaded worker may arrive together
+
+
+def _busy_time_recorder() -> BusyTimeRecorder:
+    """Recorder of the calling worker, opening its file on first use (or after a fork)."""
+    global _recorder
+    if _recorder is None or _recorder.pid != os.getpid():
+        with _recorders_lock:
+            if _recorder is None or _recorder.pid != os.getpid():
+                _recorder = BusyTimeRecorder()
+    return _recorder
+
+
+def register_server() -> None:
+    """Create the file of the calling worker once it is ready to serve, so that it is counted by count_ready_servers."""
+    _busy_time_recorder()
+
+
+def begin_busy_interval() -> None:
+    """Mark the start of a request of the calling worker."""
+    _busy_time_recorder().begin()
+
+
+def end_busy_interval() -> None:
+    """Mark the end of a request of the calling worker."""
+    _busy_time_recorder().end()
+
+
+def record_service_time(requested_time: float, actual_time: float, overhead: float) -> None:
+    """Record the sampled and actual duration of a task of the calling worker, and the overhead of its request."""
+    global _service_time_recorder
+    if _service_time_recorder is None or _service_time_recorder.pid != os.getpid():
+        with _recorders_lock:
+            if _service_time_recorder is None or _service_time_recorder.pid != os.getpid():
+                _service_time_recorder = ServiceTimeRecorder()
+    _service_time_recorder.record(requested_time, actual_time, overhead)
+
+
+def clear_busy_times(folder: str = BUSY_TIME_FOLDER) -> None:
+    """Remove the files of previous servers, so that only the running workers are read."""
+    for path in glob.glob(os.path.join(folder, "worker_*.bin")) + glob.glob(os.path.join(folder, "service_*.bin")):
+        os.remove(path)
+
+
+def reset_service_times(folder: str = BUSY_TIME_FOLDER) -> None:
+    """
+    Zero the service-time records of every worker in place, so that the next reading (maxima included) only
+    covers the requests served from now on. The running workers keep their mappings of the files.
+    """
+    for path in glob.glob(os.path.join(folder, "service_*.bin")):
+        service_times = np.memmap(path, dtype=np.float64, mode='r+')
+        service_times[:] = 0.0
+        service_times.flush()
+
+
+def count_ready_servers(folder: str = BUSY_TIME_FOLDER) -> int:
+    """Number of running workers that have registered themselves."""
+    return sum(1 for pid in _worker_pids(folder) if _is_running(pid))
+
+
+def remove_stale_busy_times(folder: str = BUSY_TIME_FOLDER) -> None:
+    """Remove the busy-time files of the workers that have exited, e.g. after the server was scaled down."""
+    for pid in _worker_pids(folder):
+        if not _is_running(pid):
+            os.remove(os.path.join(folder, f"worker_{pid}.bin"))
+
+
+def _worker_pids(folder: str) -> List[int]:
+    paths = glob.glob(os.path.join(folder, "worker_*.bin"))
+    return [int(os.path.basename(path)[len("worker_"):-len(".bin")]) for path in paths]
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_service_time_totals(folder: str = BUSY_TIME_FOLDER) -> np.ndarray:
+    """
+    Combine the service-time records of every worker.
+
+    Returns:
+        np.ndarray: One value per field of SERVICE_TIME_FIELDS; the difference of two readings gives the
+            sums (not the maxima) of the requests served in between
+    """
+    totals = np.zeros(len(SERVICE_TIME_FIELDS))
+    for path in glob.glob(os.path.join(folder, "service_*.bin")):
+        worker_totals = np.fromfile(path, dtype=np.float64)
+        totals[:SUMMED_FIELDS] += worker_totals[:SUMMED_FIELDS]
+        totals[SUMMED_FIELDS:] = np.maximum(totals[SUMMED_FIELDS:], worker_totals[SUMMED_FIELDS:])
+    return totals
+
+
+def read_service_time_accuracy(folder: str = BUSY_TIME_FOLDER) -> ServiceTimeAccuracy:
+    """Summarize the service-time records of every worker."""
+    totals = read_service_time_totals(folder)
+    count = int(totals[0])
+    means = totals[1:SUMMED_FIELDS] / count if count > 0 else np.full(SUMMED_FIELDS - 1, math.nan)
+    return ServiceTimeAccuracy(count, *means.tolist(), *totals[SUMMED_FIELDS:].tolist())
+
+
+def read_busy_windows(start_time: float, end_time: float,
+                      folder: str = BUSY_TIME_FOLDER) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read the busy time of every worker in each window between start_time and end_time.
+
+    Args:
+        start_time: Beginning of the measurement (seconds since the epoch)
+        end_time: End of the measurement (seconds since the epoch)
+        folder: Folder holding the workers' files
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The worker pids and a (workers, windows) array of busy seconds.
+            The first and last windows only count the fraction that lies inside the measurement,
+            assuming the busy time is spread uniformly over a window.
+    """
+    first_window = int(start_time // WINDOW_LENGTH)
+    last_window = int(math.ceil(end_time / WINDOW_LENGTH))
+    windows = np.arange(first_window, last_window)
+    overlap = (np.minimum(end_time, (windows + 1) * WINDOW_LENGTH) - np.maximum(start_time, windows * WINDOW_LENGTH))
+    overlap_fraction = np.clip(overlap / WINDOW_LENGTH, 0.0, 1.0)
+
+    paths = sorted(glob.glob(os.path.join(folder, "worker_*.bin")))
+    pids = np.array([int(os.path.basename(path)[len("worker_"):-len(".bin")]) for path in paths], dtype=np.int64)
+    busy_times = np.zeros((len(paths), len(windows)))
+    for row, path in enumerate(paths):
+        records = np.fromfile(path, dtype=WINDOW_DTYPE)[windows % WINDOW_COUNT]
+        valid = records['window'] == windows
+        busy_times[row, valid] = records['busy_time'][valid] * overlap_fraction[valid]
+    return pids, busy_times
+
+
+def read_worker_busy_times(start_time: float, end_time: float, folder: str = BUSY_TIME_FOLDER) -> Dict[int, float]:
+    """Total busy seconds of every worker (by pid) between start_time and end_time."""
+    pids, busy_times = read_busy_windows(start_time, end_time, folder)
+    return dict(zip(pids.tolist(), busy_times.sum(axis=1).tolist()))
+
+
+class UtilizationMonitor:
+    """
+    Periodically reports, from a background thread, the utilization of the workers since the monitor
+    was started, while a load test runs.
+    """
+
+    def __init__(self, num_servers: int, interval: float = LIVE_REPORT_INTERVAL, folder: str = BUSY_TIME_FOLDER) -> None:
+        self.num_servers = num_servers
+        self.interval = interval
+        self.folder = folder
+        self.start_time = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'UtilizationMonitor':
+        self.start_time = time.time()
+        self._thread = threading.Thread(target=self._report, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        """Stop reporting and return the time at which the monitor was stopped."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        return time.time()
+
+    def _report(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            now = time.time()
+            busy_time = sum(read_worker_busy_times(self.start_time, now, self.folder).values())
+            utilization = min(1.0, busy_time / (self.num_servers * (now - self.start_time)))
+            print(f"[INFO] Live utilization: {utilization:.3f}")
@@ -0,0 +1,97 @@
+"""This module shares the server's configuration (service rate, distribution and workload) between all
+the Gunicorn workers through a memory-mapped file.
+
+Whichever worker handles a configuration request writes the new values under a sequence lock: the version
+counter is odd while a write is in progress and even once it is complete, and the writers of different workers
+are serialized by an exclusive flock on the file. On every request, each worker only compares that counter
+with the version it last applied, a single memory read, and reloads the configuration when it changed: no file
+is opened on the hot path and every worker sees a change immediately, even the ones forked before it.
+A reader that finds the counter odd, or changed by the time it has copied the values, retries.
+"""
+import fcntl
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+CONTROL_FILE_PATH = os.environ.get("SPE_CONTROL_FILE", "/tmp/spe_control.bin")  # persists across runs
+CONFIGURATION_SIZE = 4096  # bytes available for the JSON encoded workload configuration
+CONTROL_DTYPE = np.dtype([
+    ('version', np.int64),  # 0 until the first configuration request, odd while a write is in progress
+    ('service_rate', np.float64),
+    ('configuration_length', np.int64),
+    ('configuration', np.uint8, CONFIGURATION_SIZE),
+])
+READ_ATTEMPTS = 1000  # consistent reads tried before giving up on a configuration being written
+DEFAULT_SERVICE_RATE = 1.0
+DEFAULT_WORKLOAD = {"distribution": "exponential", "parameter": None, "workload": "cpu", "workload_parameter": None}
+
+
+class SharedControl:
+    """Configuration of the server shared by all the workers of this host."""
+
+    def __init__(self, path: str = CONTROL_FILE_PATH) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # the file may be created by several workers at once: only extend it, never truncate it
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < CONTROL_DTYPE.itemsize:
+                os.ftruncate(fd, CONTROL_DTYPE.itemsize)
+        finally:
+            os.close(fd)
+        self._path = path
+        self._control = np.memmap(path, dtype=CONTROL_DTYPE, mode='r+', shape=())
+        # plain view of the counter alone, much cheaper to read than a field of the structured array
+        self._version = np.ndarray((1,), dtype=np.int64, buffer=self._control, offset=0)
+
+    @property
+    def version(self) -> int:
+        return int(self._version[0])
+
+    def read(self) -> Optional[Tuple[int, float, Dict[str, Any]]]:
+        """
+        Read the current configuration, retrying while it is being written.
+
+        Returns:
+            Optional[Tuple[int, float, Dict[str, Any]]]: The version, the service rate and the workload
+                configuration, or None if no consistent copy could be read in READ_ATTEMPTS attempts
+        """
+        for _ in range(READ_ATTEMPTS):
+            version = self.version
+            if version == 0:
+                return version, DEFAULT_SERVICE_RATE, dict(DEFAULT_WORKLOAD)
+            if version % 2 == 1:
+                continue
+            service_rate = float(self._control['service_rate'])
+            length = int(self._control['configuration_length'])
+            encoded = self._control['configuration'][:min(max(length, 0), CONFIGURATION_SIZE)].tobytes()
+            if self.version != version:
+                continue  # a write started meanwhile: the copy may mix old and new values
+            configuration = json.loads(encoded) if encoded else {}
+            return version, service_rate, {**DEFAULT_WORKLOAD, **configuration}
+        return None
+
+    def write(self, service_rate: Optional[float] = None, configuration: Optional[Dict[str, Any]] = None) -> None:
+        """Update the service rate and/or the workload configuration, then publish them with a new version."""
+        encoded = None
+        if configuration is not None:
+            encoded = json.dumps(configuration).encode()
+            if len(encoded) > CONFIGURATION_SIZE:
+                raise ValueError(f"The workload configuration exceeds {CONFIGURATION_SIZE} bytes")
+        with open(self._path, 'rb') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed, even if the worker dies
+            version = self.version
+            # odd while writing; a write interrupted by the death of its worker left an odd version behind
+            self._version[0] = version | 1
+            if version == 0:
+                # the first write must also store the defaults of the part that is not written
+                self._control['service_rate'] = DEFAULT_SERVICE_RATE
+            if service_rate is not None:
+                self._control['service_rate'] = service_rate
+            if encoded is not None:
+                self._control['configuration'][:len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+                self._control['configuration_length'] = len(encoded)
+            self._version[0] = (version | 1) + 1
@@ -1,28 +1,69 @@
-"""This module defines a class to simulate CPU-bound tasks by calculating Fibonacci numbers recursively."""
+"""This module defines a class to simulate CPU-bound tasks with a calibrated busy loop."""
+import math
 import time
 
+CALIBRATION_TIME = 0.05  # seconds spent by each calibration round
+CALIBRATION_ROUNDS = 3
+CHECK_INTERVAL = 0.005  # seconds of work between two clock checks
+
 
 class CPUBoundTask:
-    @staticmethod
-    def run(duration: float) -> None:
+    """
+    Keeps the CPU busy for a given time with a tight integer loop.
+
+    The number of loop iterations executed per second on this host is measured once by calibrate(),
+    so that each task runs its whole duration as a few precomputed batches of iterations, reading
+    the clock only between batches (every CHECK_INTERVAL at most). The last batch is sized from the
+    time left, so the task ends within a few iterations of the requested duration.
+    """
+    iterations_per_second = 0.0
+
+    @classmethod
+    def calibrate(cls) -> float:
         """
-        Executes a CPU-bound task by calculating Fibonacci numbers 
-        for the specified duration in seconds.
+        Measure how many loop iterations this host executes per second, keeping the fastest of a few rounds.
+
+        Returns:
+            float: Iterations per second
         """
-        n = 70
-        end_time = time.time() + duration
-        while time.time() < end_time:
-            x = CPUBoundTask._fibonacci(n, end_time)
+        iterations = 10_000
+        best_rate = 0.0
+        for _ in range(CALIBRATION_ROUNDS):
+            start_time = time.perf_counter()
+            elapsed_time = 0.0
+            done = 0
+            while elapsed_time < CALIBRATION_TIME:
+                CPUBoundTask._spin(iterations)
+                done += iterations
+                elapsed_time = time.perf_counter() - start_time
+            best_rate = max(best_rate, done / elapsed_time)
+        cls.iterations_per_second = best_rate
+        return best_rate
 
-    @staticmethod
-    def _fibonacci(n: int, end_time: float) -> int:
+    @classmethod
+    def run(cls, duration: float) -> float:
         """
-        Recursively calculates the nth Fibonacci number while ensuring 
-        the computation stops if the current time exceeds the end_time.
+        Executes a CPU-bound task for the specified duration in seconds.
+
+        Returns:
+            float: The time actually spent, in seconds
         """
-        if time.time() >= end_time:
-            return n
-        if n <= 1:
-            return n
-        else:
-            return CPUBoundTask._fibonacci(n-1, end_time) + CPUBoundTask._fibonacci(n-2, end_time)
+        if cls.iterations_per_second == 0:
+            cls.calibrate()
+        batch_size = max(1, int(CHECK_INTERVAL * cls.iterations_per_second))
+        start_time = time.perf_counter()
+        end_time = start_time + duration
+        now = start_time
+        while now < end_time:
+            remaining_iterations = math.ceil((end_time - now) * cls.iterations_per_second)
+            CPUBoundTask._spin(min(batch_size, remaining_iterations))
+            now = time.perf_counter()
+        return now - start_time
+
+    @staticmethod
+    def _spin(iterations: int) -> int:
+        """Run the given number of iterations of a Lehmer random number generator."""
+        x = 1
+        for _ in range(iterations):
+            x = (x * 48271) % 2147483647
+        return x
@@ -0,0 +1,42 @@
+"""This module provides a sampled and buffered debug logger for the request path of the server."""
+import atexit
+import os
+import sys
+from typing import List, TextIO
+
+DEBUG_SAMPLE_RATE = float(os.environ.get("SPE_DEBUG_SAMPLE_RATE", "0"))  # fraction of the requests logged
+DEBUG_BUFFER_SIZE = 100  # messages written at once
+
+
+class SampledLogger:
+    """
+    Keeps one debug message every 1 / sample_rate calls and writes them in batches of buffer_size.
+    It is disabled when sample_rate is 0 (the default): callers should check `enabled` before
+    formatting anything, so that a disabled logger costs a single attribute read per request.
+    """
+
+    def __init__(self, sample_rate: float = DEBUG_SAMPLE_RATE, buffer_size: int = DEBUG_BUFFER_SIZE,
+                 stream: TextIO = sys.stdout) -> None:
+        self.enabled = sample_rate > 0
+        self.buffer_size = buffer_size
+        self.stream = stream
+        self._period = max(1, round(1 / sample_rate)) if self.enabled else 0
+        self._calls = 0
+        self._buffer: List[str] = []
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def debug(self, message: str, *args: object) -> None:
+        """Log message % args if this call is sampled; the message is only formatted in that case."""
+        self._calls += 1
+        if self._calls % self._period != 0:
+            return
+        self._buffer.append("[DEBUG] " + message % args)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.stream.write("\n".join(self._buffer) + "\n")
+            self.stream.flush()
+            self._buffer.clear()
@@ -1,66 +1,112 @@
-"""This module implements a Flask-based server for processing CPU-bound tasks with an exponential delay.
+"""This module implements a Flask-based server for processing tasks with a randomly sampled service time.
+It is served by Gunicorn with the sync, gthread or gevent worker class.
 
 Endpoints:
-1. `/` (GET): Processes a CPU-bound task with a delay sampled from an exponential distribution.
+1. `/` (GET): Processes a task (CPU-bound by default) with a delay sampled from the configured distribution
+   (exponential by default).
 2. `/mu/<service_rate>` (GET): Updates the service rate (`mu`) dynamically.
+3. `/workload/<distribution>` (GET): Updates the service-time distribution and the kind of work dynamically.
+   Query parameters: `parameter` (of the distribution), `workload` and `workload_parameter`.
+4. `/health` (GET): Reports that the server is up and how many workers are ready.
+
+The responses to `/` carry the perf_counter times at which the worker started and finished handling the request
+(SERVER_START_HEADER, SERVER_END_HEADER), recorded by the load generator in its traces.
+
+The configuration is shared by all the workers through spe.server.control, and every worker records its
+busy time, the accuracy of its service times and its own overhead through spe.server.busy_time.
 """
-import os
 import json
+import time
+from typing import Callable, Iterable
+
+from flask import Flask, jsonify, request, Response
+
+from spe.server.busy_time import (SERVER_END_HEADER, SERVER_START_HEADER, begin_busy_interval, count_ready_servers,
+                                  end_busy_interval, record_service_time, register_server)
+from spe.server.task import TaskRunner, parse_workload_configuration
+
+# keys of the WSGI environ through which the view passes its task durations to RequestTimer
+REQUESTED_TIME_KEY = "spe.requested_time"
+SERVICE_TIME_KEY = "spe.service_time"
+START_TIME_KEY = "spe.start_time"  # perf_counter time at which RequestTimer received the request
+
 
-import numpy as np
-from flask import Flask, jsonify, Response
+class RequestTimer:
+    """
+    WSGI middleware measuring how long the worker spends on each request. The whole interval counts as
+    busy time; what exceeds the service time of the task is the overhead of the server itself
+    (routing, JSON encoding...), published so that it can be subtracted from the measured response times.
+    """
+
+    def __init__(self, wsgi_app: Callable) -> None:
+        self.wsgi_app = wsgi_app
 
-from spe.server.cpubound_task import CPUBoundTask
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        start_time = time.time()
+        environ[START_TIME_KEY] = time.perf_counter()
+        begin_busy_interval()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            end_busy_interval()
+            service_time = environ.get(SERVICE_TIME_KEY)
+            if service_time is not None:
+                overhead = time.time() - start_time - service_time
+                record_service_time(environ[REQUESTED_TIME_KEY], service_time, overhead)
 
-MU_FILE_PATH = '/tmp/mu_value.json'  # this is needed to persist the mu value across multiple runs
 
 app = Flask(__name__)
-rng = np.random.default_rng(42)
-mu = None # initial declaration of mu value to be loaded later
+app.wsgi_app = RequestTimer(app.wsgi_app)
+task_runner = TaskRunner()
+register_server()
+
 
 @app.route('/', methods=['GET'])
 def process_task() -> Response:
     """
-    Load the service rate mu and use it for processing a CPU-bound task. 
-    This simulates the server's thinking time of the M/M/k queue.
+    Use the service rate mu for processing a task of the configured workload.
+    This simulates the server's thinking time of the M/G/k queue (M/M/k by default).
     """
-    global mu
-    if mu is None: 
-        mu = _load_service_rate() # first initialization of mu value
-    delay = rng.exponential(1 / mu)
-    print(f"[DEBUG] Delay sampled: {delay} \t mu: {mu}")
-    CPUBoundTask.run(delay)
-    return jsonify({"message": "Task completed", "duration": delay})
+    delay, service_time = task_runner.run()
+    request.environ[REQUESTED_TIME_KEY] = delay
+    request.environ[SERVICE_TIME_KEY] = service_time
+    response = jsonify({"message": "Task completed", "duration": delay, "service_time": service_time})
+    response.headers[SERVER_START_HEADER] = repr(request.environ[START_TIME_KEY])
+    response.headers[SERVER_END_HEADER] = repr(time.perf_counter())
+    return response
 
 
 @app.route('/mu/<service_rate>', methods=['GET'])
 def get_service_rate(service_rate: str) -> Response:
     """
     Update the service rate (`mu`) dynamically via the URL parameter.
-    The new value is stored in the file for persistence.
+    The new value is published to every worker through the shared control file.
     """
     service_rate = float(service_rate)
-    _store_service_rate(service_rate)
+    task_runner.control.write(service_rate=service_rate)
     print(f"[INFO] Updated mu: {service_rate}")
     return jsonify({"message": f"Service rate updated successfully (mu: {service_rate})"})
 
 
-def _load_service_rate() -> float:
+@app.route('/workload/<distribution_name>', methods=['GET'])
+def set_workload(distribution_name: str) -> Response:
     """
-    Load the service rate (`mu`) from the file if it exists, otherwise return the default value (1.0).
+    Update the service-time distribution and the kind of work via the URL and its query parameters.
+    The new configuration is validated and published to every worker through the shared control file.
     """
-    if os.path.exists(MU_FILE_PATH):
-        with open(MU_FILE_PATH, 'r') as f:
-            return json.load(f).get('mu', 1.0)
-    return 1.0
+    try:
+        configuration = parse_workload_configuration(distribution_name, request.args)
+        task_runner.control.write(configuration=configuration)
+    except (ValueError, OSError) as e:
+        return Response(json.dumps({"message": str(e)}), status=400, mimetype='application/json')
+    print(f"[INFO] Updated workload: {configuration}")
+    return jsonify({"message": f"Workload updated successfully ({configuration})"})
 
 
-def _store_service_rate(service_rate: float) -> None:
-    """
-    Store the service rate (`mu`) in the file for persistence.
-    """
-    with open(MU_FILE_PATH, 'w') as f:
-        json.dump({"mu": service_rate}, f)
+@app.route('/health', methods=['GET'])
+def health() -> Response:
+    """Readiness probe: answered as soon as one worker is up, with the number of workers ready so far."""
+    return jsonify({"status": "ok", "servers": count_ready_servers()})
 
 
 if __name__ == '__main__':
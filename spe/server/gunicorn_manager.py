@@ -1,11 +1,26 @@
 """This module contains functions to manage the Gunicorn HTTP server."""
+import os
+import signal
 import subprocess
 import time
+from typing import List
 
 import requests
 
+from spe.server.busy_time import clear_busy_times, remove_stale_busy_times
 from spe.utils.argument_parser import Config
-from spe.utils.file import delete_file_if_exists
+from spe.utils.file import READINESS_CSV_PATH, delete_file_if_exists, write_readiness_to_csv
+
+BACKEND_SYNC = "sync"
+BACKEND_GTHREAD = "gthread"
+BACKEND_GEVENT = "gevent"
+BACKEND_ASGI = "asgi"
+BACKENDS = (BACKEND_SYNC, BACKEND_GTHREAD, BACKEND_GEVENT, BACKEND_ASGI)
+GEVENT_WORKER_CONNECTIONS = 1000
+READY_TIMEOUT = 60  # seconds
+PROBE_INITIAL_DELAY = 0.01  # seconds, doubled after every failed probe
+PROBE_MAX_DELAY = 0.5  # seconds
+PROBE_REQUEST_TIMEOUT = 1  # seconds
 
 
 def start_gunicorn(target_url: str, access_log: str, error_log: str, system_config: Config) -> subprocess.Popen:
@@ -13,13 +28,14 @@ def start_gunicorn(target_url: str, access_log: str, error_log: str, system_conf
     Starts a Gunicorn server with the specified configuration for the M/M/k queue simulation.
 
     This function:
-    1. Removes any existing log files to ensure clean output
-    2. Creates a Gunicorn server with the number of workers specified in system_config
-    3. Configures logging to the specified files with detailed access logs
+    1. Removes any existing log files and worker busy-time records to ensure clean output
+    2. Creates a Gunicorn server with the back-end and the number of servers specified in system_config
+    3. Configures logging to the specified files, with an access log only when requests are debug-sampled
+    4. Waits until all the servers answer the readiness probe, recording how long it took
 
     Args:
         target_url: The URL where the Gunicorn server will listen (e.g., "127.0.0.1:5000")
-        access_log: Filepath where access logs will be written
+        access_log: Filepath where access logs will be written if system_config.debug_sample_rate is set
         error_log: Filepath where error logs will be written
         system_config: Configuration object containing simulation parameters,
                       including the number of server workers
@@ -35,23 +51,116 @@ def start_gunicorn(target_url: str, access_log: str, error_log: str, system_conf
 
     delete_file_if_exists(access_log)
     delete_file_if_exists(error_log)
+    clear_busy_times()
     gunicorn_cmd = [
         "gunicorn",
-        "-w", str(num_servers),
         "-b", target_url,  # Bind Gunicorn to the specified target URL
-        "--access-logfile", access_log,
-        "--access-logformat", '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s %(p)s %(L)s',
         "--error-logfile", error_log,
-        "spe.server.flask_server:app"
     ]
-
-    print(f"[INFO] Starting Gunicorn on {target_url} with {num_servers} workers...")
-    process = subprocess.Popen(gunicorn_cmd)
-    time.sleep(2)  # This sleep is needed to ensure Gunicorn starts correctly
-    print("[INFO] Gunicorn started successfully!")
+    if system_config.debug_sample_rate > 0:
+        # nothing reads the access log: it grows with every request, so it is only written for debugging
+        gunicorn_cmd += ["--access-logfile", access_log,
+                         "--access-logformat", '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s %(p)s %(L)s']
+    gunicorn_cmd += _backend_arguments(system_config)
+
+    print(f"[INFO] Starting Gunicorn on {target_url} with {num_servers} servers ({system_config.backend} back-end)...")
+    environment = {**os.environ, "SPE_DEBUG_SAMPLE_RATE": str(system_config.debug_sample_rate),
+                   "SPE_POOL_SIZE": str(num_servers)}
+    start_time = time.perf_counter()
+    process = subprocess.Popen(gunicorn_cmd, env=environment)
+    try:
+        wait_until_ready(target_url, num_servers, process)
+    except RuntimeError:
+        end_gunicorn(process)
+        raise
+    latency = time.perf_counter() - start_time
+    write_readiness_to_csv(READINESS_CSV_PATH, "start", system_config.backend, num_servers, latency)
+    print(f"[INFO] Gunicorn started successfully! Ready in {latency:.3f}s")
     return process
 
 
+def resize_gunicorn(process: subprocess.Popen, target_url: str, current_servers: int, system_config: Config) -> None:
+    """
+    Changes the number of workers of a running Gunicorn server to system_config.number_of_servers,
+    sending one TTIN (add a worker) or TTOU (remove the oldest worker) signal to the master at a time,
+    so that a sweep over k reuses the same warm master process.
+
+    Args:
+        process: The running Gunicorn master
+        target_url: The URL where the Gunicorn server listens (e.g., "127.0.0.1:5000")
+        current_servers: Number of workers the server has now
+        system_config: Configuration object containing the new number of servers
+
+    Raises:
+        ValueError: If the back-end cannot be resized (asgi, whose servers are a process pool)
+        RuntimeError: If the server does not reach the new size within READY_TIMEOUT
+    """
+    target_servers = system_config.number_of_servers
+    if target_servers == current_servers:
+        return
+    if system_config.backend == BACKEND_ASGI:
+        raise ValueError("The asgi back-end cannot be resized: restart it instead")
+
+    start_time = time.perf_counter()
+    step = 1 if target_servers > current_servers else -1
+    resize_signal = signal.SIGTTIN if step == 1 else signal.SIGTTOU
+    for servers in range(current_servers + step, target_servers + step, step):
+        process.send_signal(resize_signal)
+        wait_until_ready(target_url, servers, process)
+    remove_stale_busy_times()
+    latency = time.perf_counter() - start_time
+    write_readiness_to_csv(READINESS_CSV_PATH, "resize", system_config.backend, target_servers, latency)
+    print(f"[INFO] Gunicorn resized from {current_servers} to {target_servers} workers in {latency:.3f}s")
+
+
+def wait_until_ready(target_url: str, num_servers: int, process: subprocess.Popen) -> None:
+    """
+    Probes the /health endpoint, with exponential backoff, until exactly num_servers workers are ready.
+
+    Args:
+        target_url: The URL where the Gunicorn server listens (e.g., "127.0.0.1:5000")
+        num_servers: Number of ready workers to wait for
+        process: The Gunicorn master, whose early exit is reported
+
+    Raises:
+        RuntimeError: If the server exits or is not ready within READY_TIMEOUT
+    """
+    deadline = time.perf_counter() + READY_TIMEOUT
+    delay = PROBE_INITIAL_DELAY
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Gunicorn exited with code {process.returncode} before being ready")
+        try:
+            response = requests.get(f"http://{target_url}/health", timeout=PROBE_REQUEST_TIMEOUT)
+            if response.status_code == 200 and response.json()["servers"] == num_servers:
+                return
+        except requests.RequestException:
+            pass  # not listening yet
+        if time.perf_counter() + delay > deadline:
+            raise RuntimeError(f"Gunicorn was not ready with {num_servers} servers after {READY_TIMEOUT}s")
+        time.sleep(delay)
+        delay = min(2 * delay, PROBE_MAX_DELAY)
+
+
+def _backend_arguments(system_config: Config) -> List[str]:
+    """
+    Gunicorn arguments selecting the worker class and the application of the back-end:
+    - sync: k single-threaded worker processes (the M/M/k servers)
+    - gthread: k worker processes with a pool of threads each
+    - gevent: k worker processes serving requests in greenlets
+    - asgi: a single uvicorn worker offloading the tasks to a pool of k processes
+    """
+    num_servers = str(system_config.number_of_servers)
+    if system_config.backend == BACKEND_GTHREAD:
+        return ["-w", num_servers, "-k", "gthread", "--threads", str(system_config.threads), "spe.server.flask_server:app"]
+    if system_config.backend == BACKEND_GEVENT:
+        return ["-w", num_servers, "-k", "gevent", "--worker-connections", str(GEVENT_WORKER_CONNECTIONS),
+                "spe.server.flask_server:app"]
+    if system_config.backend == BACKEND_ASGI:
+        return ["-w", "1", "-k", "uvicorn.workers.UvicornWorker", "spe.server.asgi_server:app"]
+    return ["-w", num_servers, "spe.server.flask_server:app"]
+
+
 def end_gunicorn(process: subprocess.Popen) -> None:
     """
     Terminates the Gunicorn server process in a graceful manner.
@@ -80,3 +189,15 @@ def configure_service_rate(host: str, service_rate: float) -> None:
         raise RuntimeError(
             f"Failed to set service rate. Status code: {response.status_code}, Response: {response.text}"
         )
+
+
+def configure_workload(host: str, system_config: Config) -> None:
+    """Send a request to the server to set the service-time distribution and the kind of work."""
+    parameters = {"parameter": system_config.distribution_parameter, "workload": system_config.workload,
+                  "workload_parameter": system_config.workload_parameter}
+    response = requests.get(f"{host}/workload/{system_config.service_distribution}", params=parameters)
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"Failed to set workload. Status code: {response.status_code}, Response: {response.text}"
+        )
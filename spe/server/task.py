@@ -0,0 +1,77 @@
+"""This module contains the request processing shared by the server back-ends: it applies the configuration
+published in the shared control file, samples the service time and runs the configured workload.
+"""
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from spe.server.control import SharedControl
+from spe.server.cpubound_task import CPUBoundTask
+from spe.server.debug_log import SampledLogger
+from spe.server.workload import create_workload
+from spe.utils.distribution import create_distribution
+
+
+class TaskRunner:
+    """Processes the tasks of one server process, following the changes of the shared configuration."""
+
+    def __init__(self) -> None:
+        CPUBoundTask.calibrate()  # once per process, before it serves any request
+        self.rng = np.random.default_rng(42)
+        self.control = SharedControl()
+        self.debug_logger = SampledLogger()
+        self.applied_version = -1  # version of the shared configuration in use
+        self.mu = 1.0
+        self.distribution = create_distribution("exponential")
+        self.workload = create_workload("cpu")
+
+    def run(self) -> Tuple[float, float]:
+        """
+        Sample a service time with the current configuration and serve it.
+
+        Returns:
+            Tuple[float, float]: The sampled service time and the time actually spent, in seconds
+        """
+        if self.control.version != self.applied_version:
+            self._apply_configuration()
+        delay = self.distribution.sample(self.rng, 1 / self.mu)
+        if self.debug_logger.enabled:
+            self.debug_logger.debug("Delay sampled: %s \t mu: %s", delay, self.mu)
+        return delay, self.workload.run(delay)
+
+    def _apply_configuration(self) -> None:
+        """
+        Load the service rate, the distribution and the workload published in the shared control file.
+        A configuration that could not be read consistently (still being written) is retried at the next task.
+        """
+        state = self.control.read()
+        if state is None:
+            return
+        version, service_rate, configuration = state
+        self.mu = service_rate
+        self.distribution = create_distribution(configuration["distribution"], configuration["parameter"])
+        self.workload = create_workload(configuration["workload"], configuration["workload_parameter"])
+        self.applied_version = version
+
+
+def parse_workload_configuration(distribution_name: str, arguments: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    """
+    Build and validate the workload configuration of a `/workload/<distribution>` request.
+
+    Args:
+        distribution_name: Name of the distribution, from the URL
+        arguments: Query parameters: `parameter`, `workload` and `workload_parameter`
+
+    Raises:
+        ValueError: If the configuration is invalid
+        OSError: If the trace of an empirical distribution cannot be read
+    """
+    configuration = {
+        "distribution": distribution_name,
+        "parameter": arguments.get("parameter"),
+        "workload": arguments.get("workload", "cpu"),
+        "workload_parameter": arguments.get("workload_parameter"),
+    }
+    create_distribution(configuration["distribution"], configuration["parameter"])
+    create_workload(configuration["workload"], configuration["workload_parameter"])
+    return configuration
@@ -0,0 +1,77 @@
+"""This module defines the pluggable kind of work done by the server for each request, whose duration is
+sampled from a distribution of spe.utils.distribution.
+
+Workloads are looked up by name in WORKLOADS; a new one only needs a subclass of Workload and an entry
+in the dictionary. The base is abstract, so a subclass missing a method fails when it is created, not in
+the middle of a request.
+"""
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, Optional, Type
+
+from spe.server.cpubound_task import CPUBoundTask
+
+
+class Workload(ABC):
+    """Work done by the server for a request of the given service time."""
+
+    @abstractmethod
+    def run(self, duration: float) -> float:
+        """Serve a request for duration seconds and return the time actually spent."""
+
+
+class CPUBoundWorkload(Workload):
+    def run(self, duration: float) -> float:
+        return CPUBoundTask.run(duration)
+
+
+class IOBoundWorkload(Workload):
+    """Waits without using the CPU, like a request blocked on a database or a remote service."""
+
+    def run(self, duration: float) -> float:
+        start_time = time.perf_counter()
+        time.sleep(duration)
+        return time.perf_counter() - start_time
+
+
+class MixedWorkload(Workload):
+    """Computes for a fraction of the service time, then waits for the rest."""
+
+    def __init__(self, cpu_fraction: float) -> None:
+        if not 0 <= cpu_fraction <= 1:
+            raise ValueError("The CPU fraction must be between 0 and 1")
+        self.cpu_fraction = cpu_fraction
+
+    def run(self, duration: float) -> float:
+        start_time = time.perf_counter()
+        CPUBoundTask.run(duration * self.cpu_fraction)
+        time.sleep(max(0.0, start_time + duration - time.perf_counter()))
+        return time.perf_counter() - start_time
+
+
+WORKLOADS: Dict[str, Type[Workload]] = {
+    "cpu": CPUBoundWorkload,
+    "io": IOBoundWorkload,
+    "mixed": MixedWorkload,
+}
+WORKLOAD_PARAMETERS = {"mixed": "cpu_fraction"}
+
+
+def create_workload(name: str, parameter: Optional[str] = None) -> Workload:
+    """
+    Instantiate a workload of WORKLOADS.
+
+    Args:
+        name: Name of the workload
+        parameter: Its parameter (see WORKLOAD_PARAMETERS), as a string; ignored by the workloads without one
+
+    Raises:
+        ValueError: If the name is unknown or the parameter is missing or invalid
+    """
+    if name not in WORKLOADS:
+        raise ValueError(f"Unknown workload '{name}', expected one of {tuple(WORKLOADS)}")
+    if name not in WORKLOAD_PARAMETERS:
+        return WORKLOADS[name]()
+    if parameter is None:
+        raise ValueError(f"The {name} workload needs a parameter ({WORKLOAD_PARAMETERS[name]})")
+    return WORKLOADS[name](float(parameter))
@@ -1,6 +1,15 @@
 """This module provides functionality for parsing command-line arguments to configure the system settings."""
 from argparse import ArgumentParser
 from dataclasses import dataclass
+import os
+import time
+from typing import List, Optional, Tuple, Union
+
+from spe.utils.cache import CACHE_PATH
+from spe.utils.distribution import DISTRIBUTIONS, create_distribution
+from spe.utils.streaming import MSER_BATCH_SIZE
+
+BENCHMARK_GROUPS = ("theoretical", "busy-time", "cpu-task", "generator", "server")  # see spe.generator.benchmark
 
 
 @dataclass
@@ -10,6 +19,87 @@ class Config:
     user_range: range
     user_request_time: int
     number_of_servers: int
+    server_counts: Tuple[int, ...] = ()  # every k of a sweep, run in order on the same server
+    solver: str = "product-form"
+    cache_path: Optional[str] = CACHE_PATH
+    engine: str = "process"
+    shards: Optional[int] = None
+    clients_per_shard: Optional[int] = None
+    connection_mode: str = "keep-alive"
+    accumulate_histograms: bool = False
+    load_model: str = "closed"
+    warm_up: float = 0.0
+    target_precision: Optional[float] = None  # adaptive run length: relative half-width of the interval to reach
+    service_distribution: str = "exponential"
+    distribution_parameter: Optional[str] = None
+    workload: str = "cpu"
+    workload_parameter: Optional[str] = None
+    debug_sample_rate: float = 0.0
+    backend: str = "sync"
+    threads: int = 4
+    port: int = 5000
+    des_overlay: bool = False  # also simulate the system with discrete events and plot the results
+    des_requests: int = 1_000_000
+    des_replications: int = 4
+    trace: bool = False  # record every request in a binary trace (spe.utils.trace)
+    compress_trace: bool = False
+    replay_folder: Optional[str] = None  # folder of the traces whose arrivals are re-issued
+    label: Optional[str] = None  # name of the run in the result store
+    metrics_port: Optional[int] = None  # port of the live /metrics endpoint (disabled if None)
+
+
+@dataclass
+class ModelConfig:
+    service_rates: List[float]
+    arrival_rates: List[float]
+    numbers_of_servers: List[int]
+    user_range: range
+    grid: bool
+    output_path: str
+
+
+@dataclass
+class ExperimentsConfig:
+    spec_path: str
+    output_folder: str
+    cpus: Optional[List[int]]
+    base_port: int
+    generator_cores: int
+
+
+@dataclass
+class TraceConfig:
+    trace_paths: List[str]
+    plot: bool
+
+
+@dataclass
+class ResultsConfig:
+    service_rate: Optional[float]
+    arrival_rate: Optional[float]
+    number_of_servers: Optional[int]
+    user_request_time: Optional[int]
+    label: Optional[str]
+    since: Optional[float]  # time.time() value
+    export_path: Optional[str]
+    plot: bool
+
+
+@dataclass
+class BenchmarkConfig:
+    output_path: str
+    groups: Tuple[str, ...]
+    repeats: int
+    port: int
+    baseline_path: Optional[str]  # results to compare with once the benchmarks are run
+    threshold: float
+
+
+@dataclass
+class CompareConfig:
+    baseline_path: str
+    current_path: str
+    threshold: float
 
 
 def create_parser() -> ArgumentParser:
@@ -24,6 +114,24 @@ def create_parser() -> ArgumentParser:
     run_parser = subparsers.add_parser(
         "run", help="Default mode: main.py run -s <service_rate> -a <arrival_rate> -t <time> -u <user_range> -k <number_of_servers>")
     _add_arguments_to_run_parser(run_parser)
+    model_parser = subparsers.add_parser(
+        "model", help="Theoretical model only: main.py model -s <rates> -a <rates> -k <servers> -u <user_range> [--grid]")
+    _add_arguments_to_model_parser(model_parser)
+    experiments_parser = subparsers.add_parser(
+        "experiments", help="Experiment matrix run concurrently: main.py experiments <spec.json> [--cpus <cores>]")
+    _add_arguments_to_experiments_parser(experiments_parser)
+    trace_parser = subparsers.add_parser(
+        "trace", help="Offline analysis of recorded traces: main.py trace <trace files> [--plot]")
+    _add_arguments_to_trace_parser(trace_parser)
+    results_parser = subparsers.add_parser(
+        "results", help="Stored runs: main.py results [-s <rate>] [-a <rate>] [-k <servers>] [--export <file.npz>] [--plot]")
+    _add_arguments_to_results_parser(results_parser)
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Offline benchmarks: main.py benchmark [-o <file.json>] [--only <groups>] [--baseline <file.json>]")
+    _add_arguments_to_benchmark_parser(benchmark_parser)
+    compare_parser = subparsers.add_parser(
+        "compare", help="Regressions between benchmark results: main.py compare <baseline.json> <current.json>")
+    _add_arguments_to_compare_parser(compare_parser)
 
     return global_parser
 
@@ -33,10 +141,130 @@ def _add_arguments_to_run_parser(subparser: ArgumentParser) -> None:
     subparser.add_argument('-a', type=float, required=True, help='Parameter arrival rate')
     subparser.add_argument('-u', type=int, nargs=2, required=True, help='Range of users')
     subparser.add_argument('-t', type=int, required=True, help='Maximum time to run the simulation')
-    subparser.add_argument('-k', type=int, required=True, help='Number of servers')
+    subparser.add_argument('-k', type=int, nargs='+', required=True,
+                           help='Number of servers; several values run one simulation per value, resizing the '
+                                'same server in between')
+    subparser.add_argument('--solver', choices=["product-form", "linear", "transient", "incremental"], default="product-form",
+                           help='Method used to compute the theoretical metrics')
+    subparser.add_argument('--engine', choices=["process", "asyncio", "hybrid", "des"], default="process",
+                           help='Load generator engine: one process per client, one coroutine per client, '
+                                'coroutines spread over a pool of processes, or no server at all with a '
+                                'discrete-event simulation of the system (des)')
+    subparser.add_argument('--shards', type=int, default=None,
+                           help='Worker processes of the hybrid engine (default: one per core)')
+    subparser.add_argument('--clients-per-shard', type=int, default=None,
+                           help='Maximum clients per worker process of the hybrid engine (overrides --shards)')
+    subparser.add_argument('--connection', choices=["keep-alive", "new"], default="keep-alive",
+                           help='Reuse client connections, or open a new one per request and count its setup '
+                                'in the response time')
+    subparser.add_argument('--load-model', choices=["closed", "open-poisson", "open-constant"], default="closed",
+                           help='Closed loop (clients wait for their response) or open loop (each client sends at '
+                                'rate -a on a Poisson or constant schedule); open loop needs --engine asyncio or hybrid')
+    subparser.add_argument('--accumulate', action='store_true',
+                           help='Merge the response-time histograms with those of previous runs of the same '
+                                'configuration before computing the percentiles')
+    subparser.add_argument('--no-cache', action='store_true',
+                           help=f'Always run the solver instead of reusing the results stored in {CACHE_PATH}')
+    subparser.add_argument('--distribution', choices=list(DISTRIBUTIONS), default="exponential",
+                           help='Distribution of the service times (mean 1/s)')
+    subparser.add_argument('--distribution-parameter', default=None,
+                           help='Number of phases (erlang), squared coefficient of variation (hyperexponential, '
+                                'lognormal) or file with one service time per line (empirical)')
+    subparser.add_argument('--workload', choices=["cpu", "io", "mixed"], default="cpu",
+                           help='Work done for each request: computation, waiting or computation then waiting')
+    subparser.add_argument('--cpu-fraction', type=float, default=None,
+                           help='Fraction of the service time spent computing with --workload mixed')
+    subparser.add_argument('--backend', choices=["sync", "gthread", "gevent", "asgi"], default="sync",
+                           help='Server architecture: sync, gthread or gevent Gunicorn workers running the Flask app, '
+                                'or an ASGI app offloading the tasks to a pool of -k processes')
+    subparser.add_argument('--threads', type=int, default=4, help='Threads of each worker with --backend gthread')
+    subparser.add_argument('--debug-sample-rate', type=float, default=0.0,
+                           help='Fraction of the requests logged by the server workers (0, the default, disables it)')
+    subparser.add_argument('--warm-up', type=float, default=0.0,
+                           help='Seconds at the beginning of each load test excluded from the utilization')
+    subparser.add_argument('--precision', type=float, default=None,
+                           help='Adaptive run length: stop each load test once the half-width of the confidence '
+                                'interval of the mean response time is below this fraction of the mean (the '
+                                'warm-up is detected and discarded), -t being the maximum duration')
+    subparser.add_argument('--des', action='store_true',
+                           help='Also simulate the system with discrete events and add the results to the plot')
+    subparser.add_argument('--des-requests', type=int, default=1_000_000,
+                           help='Requests of each replication of the discrete-event simulation')
+    subparser.add_argument('--des-replications', type=int, default=4,
+                           help='Independent replications of the discrete-event simulation, run in parallel')
+    subparser.add_argument('--port', type=int, default=5000, help='Port of the Gunicorn server')
+    subparser.add_argument('--trace', action='store_true',
+                           help='Record every request (send, server and reception times) in a binary trace '
+                                'under data/traces/, one file per number of users')
+    subparser.add_argument('--compress-trace', action='store_true', help='Compress the traces with gzip')
+    subparser.add_argument('--label', default=None, help='Name of the run in the result store')
+    subparser.add_argument('--metrics-port', type=int, default=None,
+                           help='Serve the live metrics of the load generator and of the server on '
+                                'http://127.0.0.1:<port>/metrics, in the Prometheus text format')
+    subparser.add_argument('--replay', default=None, metavar='FOLDER',
+                           help='Re-issue the arrivals recorded in the traces u<users>.bin of this folder, open loop, '
+                                'instead of generating them')
+
+
+def _add_arguments_to_model_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('-s', type=float, nargs='+', required=True, help='Service rates')
+    subparser.add_argument('-a', type=float, nargs='+', required=True, help='Arrival rates')
+    subparser.add_argument('-k', type=int, nargs='+', required=True, help='Numbers of servers')
+    subparser.add_argument('-u', type=int, nargs=2, required=True, help='Range of users')
+    subparser.add_argument('--grid', action='store_true',
+                           help='Evaluate every combination of -s, -a and -k instead of pairing them position by position')
+    subparser.add_argument('-o', default="data/model.npz", help='Output file (one array per column)')
+
+
+def _add_arguments_to_experiments_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('spec', help='JSON file describing the experiments (see spe.generator.orchestrator)')
+    subparser.add_argument('-o', default="experiments/", help='Output folder, with one subfolder per experiment')
+    subparser.add_argument('--cpus', type=int, nargs='+', default=None,
+                           help='Cores shared among the experiments (default: every core available)')
+    subparser.add_argument('--base-port', type=int, default=5000, help='Port of the first Gunicorn instance')
+    subparser.add_argument('--generator-cores', type=int, default=1,
+                           help='Cores of the load generator of each experiment, besides its k servers')
+
 
+def _add_arguments_to_trace_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('traces', nargs='+', help='Trace files, compressed or not')
+    subparser.add_argument('--plot', action='store_true',
+                           help='Save the response times over time and their histogram next to each trace')
 
-def parse_arguments(parser: ArgumentParser) -> Config:
+
+def _add_arguments_to_results_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('-s', type=float, default=None, help='Only the runs with this service rate')
+    subparser.add_argument('-a', type=float, default=None, help='Only the runs with this arrival rate')
+    subparser.add_argument('-k', type=int, default=None, help='Only the runs with this number of servers')
+    subparser.add_argument('-t', type=int, default=None, help='Only the runs with this duration')
+    subparser.add_argument('--label', default=None, help='Only the runs with this label')
+    subparser.add_argument('--since', default=None, help='Only the runs started from this date (YYYY-MM-DD)')
+    subparser.add_argument('--export', default=None,
+                           help='Write the metrics of the matching runs to a .npz file, one array per column')
+    subparser.add_argument('--plot', action='store_true', help='Regenerate the plots of the matching runs')
+
+
+def _add_arguments_to_benchmark_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('-o', default="data/benchmark.json", help='JSON file receiving the results')
+    subparser.add_argument('--only', nargs='+', default=list(BENCHMARK_GROUPS), choices=BENCHMARK_GROUPS,
+                           help='Groups of benchmarks to run (default: all of them)')
+    subparser.add_argument('--repeats', type=int, default=3, help='Repetitions of each benchmark, whose median is kept')
+    subparser.add_argument('--port', type=int, default=5100,
+                           help='Port of the no-op endpoint, Gunicorn using the next one')
+    subparser.add_argument('--baseline', default=None, help='Benchmark results to compare the new ones with')
+    subparser.add_argument('--threshold', type=float, default=0.1,
+                           help='Relative change in the worse direction flagged as a regression')
+
+
+def _add_arguments_to_compare_parser(subparser: ArgumentParser) -> None:
+    subparser.add_argument('baseline', help='Reference benchmark results')
+    subparser.add_argument('current', help='Benchmark results to check')
+    subparser.add_argument('--threshold', type=float, default=0.1,
+                           help='Relative change in the worse direction flagged as a regression')
+
+
+def parse_arguments(parser: ArgumentParser) -> Union[Config, ModelConfig, ExperimentsConfig, TraceConfig,
+                                                     ResultsConfig, BenchmarkConfig, CompareConfig]:
     """
     Parse command-line arguments and create a configuration object.
 
@@ -44,8 +272,110 @@ def parse_arguments(parser: ArgumentParser) -> Config:
         parser: Configured argument parser
 
     Returns:
-        Config: Configuration object with parsed values
+        Config for the "run" mode, ModelConfig for the "model" mode, ExperimentsConfig for the "experiments" mode,
+        TraceConfig for the "trace" mode, ResultsConfig for the "results" mode, BenchmarkConfig for the
+        "benchmark" mode or CompareConfig for the "compare" mode
     """
     args = parser.parse_args()
+    if args.mode in ("benchmark", "compare"):
+        if args.threshold <= 0:
+            parser.error("--threshold must be positive")
+        baseline_path = args.baseline
+        missing_files = [path for path in (baseline_path, getattr(args, 'current', None))
+                         if path is not None and not os.path.isfile(path)]
+        if missing_files:
+            parser.error(f"benchmark results not found: {', '.join(missing_files)}")
+        if args.mode == "compare":
+            return CompareConfig(baseline_path=baseline_path, current_path=args.current, threshold=args.threshold)
+        if args.repeats < 1:
+            parser.error("--repeats must be at least 1")
+        return BenchmarkConfig(output_path=args.o, groups=tuple(dict.fromkeys(args.only)), repeats=args.repeats,
+                               port=args.port, baseline_path=baseline_path, threshold=args.threshold)
+    if args.mode == "results":
+        try:
+            since = None if args.since is None else time.mktime(time.strptime(args.since, "%Y-%m-%d"))
+        except ValueError:
+            parser.error(f"--since must be a date YYYY-MM-DD, got {args.since}")
+        return ResultsConfig(service_rate=args.s, arrival_rate=args.a, number_of_servers=args.k,
+                             user_request_time=args.t, label=args.label, since=since, export_path=args.export,
+                             plot=args.plot)
+    if args.mode == "trace":
+        missing_traces = [path for path in args.traces if not os.path.isfile(path)]
+        if missing_traces:
+            parser.error(f"trace files not found: {', '.join(missing_traces)}")
+        return TraceConfig(trace_paths=args.traces, plot=args.plot)
+    if args.mode == "experiments":
+        if args.generator_cores < 1:
+            parser.error("--generator-cores must be at least 1")
+        unavailable_cpus = set(args.cpus or []) - os.sched_getaffinity(0)
+        if unavailable_cpus:
+            parser.error(f"--cpus not available: {sorted(unavailable_cpus)}")
+        return ExperimentsConfig(spec_path=args.spec, output_folder=args.o, cpus=args.cpus,
+                                 base_port=args.base_port, generator_cores=args.generator_cores)
+    if args.mode == "model":
+        if min(args.s) <= 0 or min(args.a) <= 0:
+            parser.error("-s and -a values must be positive")
+        if min(args.k) < 1:
+            parser.error("-k values must be at least 1")
+        if not 1 <= args.u[0] <= args.u[1]:
+            parser.error("-u must be a range of at least one user, e.g. -u 1 100")
+        lengths = {len(values) for values in (args.s, args.a, args.k)} - {1}
+        if not args.grid and len(lengths) > 1:
+            parser.error("without --grid, -s, -a and -k are paired position by position: give them the same "
+                         "number of values (or a single one)")
+        return ModelConfig(service_rates=args.s, arrival_rates=args.a, numbers_of_servers=args.k,
+                           user_range=range(args.u[0], args.u[1] + 1), grid=args.grid, output_path=args.o)
+
+    if args.load_model != "closed" and args.engine in ("process", "des"):
+        parser.error(f"--load-model {args.load_model} requires --engine asyncio or hybrid")
+    if args.des_replications < 1 or args.des_requests < 100 * MSER_BATCH_SIZE:
+        parser.error(f"--des-replications must be at least 1 and --des-requests at least {100 * MSER_BATCH_SIZE}")
+    if min(args.k) < 1:
+        parser.error("-k values must be at least 1")
+    if any(value is not None and value < 1 for value in (args.shards, args.clients_per_shard)):
+        parser.error("--shards and --clients-per-shard must be at least 1")
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if not 0 <= args.debug_sample_rate <= 1:
+        parser.error("--debug-sample-rate must be between 0 and 1")
+    if not 0 <= args.warm_up < args.t:
+        parser.error("--warm-up must be between 0 and the duration -t")
+    if args.precision is not None and not 0 < args.precision < 1:
+        parser.error("--precision must be between 0 and 1")
+    if args.precision is not None and args.engine in ("hybrid", "des"):
+        parser.error("--precision requires --engine process or asyncio")
+    if (args.trace or args.compress_trace or args.replay is not None) and args.engine == "des":
+        parser.error("--trace, --compress-trace and --replay require a live engine, not des")
+    if args.metrics_port is not None and args.engine == "des":
+        parser.error("--metrics-port requires a live engine, not des")
+    if args.metrics_port is not None and args.metrics_port == args.port:
+        parser.error("--metrics-port must differ from the port of the server --port")
+    if args.replay is not None and args.precision is not None:
+        parser.error("--replay re-issues a whole trace and cannot be combined with --precision")
+    if args.replay is not None and not os.path.isdir(args.replay):
+        parser.error(f"--replay folder not found: {args.replay}")
+    distribution_parameter = args.distribution_parameter
+    if args.distribution == "empirical" and distribution_parameter is not None:
+        distribution_parameter = os.path.abspath(distribution_parameter)  # read by the server, whose working directory may differ
+    try:
+        create_distribution(args.distribution, distribution_parameter)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if args.workload == "mixed" and (args.cpu_fraction is None or not 0 <= args.cpu_fraction <= 1):
+        parser.error("--workload mixed needs a --cpu-fraction between 0 and 1")
+    workload_parameter = None if args.cpu_fraction is None else str(args.cpu_fraction)
 
-    return Config(service_rate=args.s, arrival_rate=args.a, user_range=range(args.u[0], args.u[1] + 1), user_request_time=args.t, number_of_servers=args.k)
+    return Config(service_rate=args.s, arrival_rate=args.a, user_range=range(args.u[0], args.u[1] + 1), user_request_time=args.t, number_of_servers=args.k[0], server_counts=tuple(args.k), solver=args.solver,
+                  cache_path=None if args.no_cache else CACHE_PATH, engine=args.engine,
+                  shards=args.shards, clients_per_shard=args.clients_per_shard,
+                  connection_mode=args.connection, accumulate_histograms=args.accumulate,
+                  load_model=args.load_model, warm_up=args.warm_up, target_precision=args.precision,
+                  service_distribution=args.distribution,
+                  distribution_parameter=distribution_parameter, workload=args.workload,
+                  workload_parameter=workload_parameter, debug_sample_rate=args.debug_sample_rate,
+                  backend=args.backend, threads=args.threads, port=args.port,
+                  des_overlay=args.des and args.engine != "des", des_requests=args.des_requests,
+                  des_replications=args.des_replications, trace=args.trace or args.compress_trace,
+                  compress_trace=args.compress_trace,
+                  replay_folder=None if args.replay is None else os.path.abspath(args.replay), label=args.label,
+                  metrics_port=args.metrics_port)
@@ -0,0 +1,83 @@
+"""This module provides a cache of theoretical model results stored in SQLite."""
+import os
+import sqlite3
+from typing import Iterable, Optional, Tuple
+
+CACHE_PATH = "data/theoretical_cache.sqlite"
+CACHE_MAX_ENTRIES = 500_000  # under 50 MB: the incremental and grid solvers store every population of a sweep
+
+ModelKey = Tuple[str, float, float, int, int]  # (solver, service_rate, arrival_rate, servers, clients)
+ModelValue = Tuple[float, float]  # (avg_response_time, utilization)
+
+
+class ModelCache:
+    """
+    Memoizes the solution of the closed M/M/k model for given parameters.
+
+    Every entry is written to a SQLite database, so that later runs skip the solver entirely; without a
+    path the database lives in memory, for the lifetime of the cache. The database remembers the version
+    of the solver that produced it: if it differs from the current one, all the stored results are discarded.
+    It keeps at most max_entries results: beyond that, the oldest ones (by insertion) are evicted.
+    """
+
+    def __init__(self, version: str, path: Optional[str] = None, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.version = version
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection = self._open_database(path)
+
+    def get(self, key: ModelKey) -> Optional[ModelValue]:
+        """Return the cached value for key, or None, updating the hit/miss counters."""
+        row = self._connection.execute(
+            "SELECT avg_response_time, utilization FROM results "
+            "WHERE solver = ? AND service_rate = ? AND arrival_rate = ? AND servers = ? AND clients = ?",
+            key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def put_many(self, items: Iterable[Tuple[ModelKey, ModelValue]]) -> None:
+        """Store several results at once, with a single database transaction, then evict the oldest ones."""
+        items = list(items)
+        if items:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(*key, *value) for key, value in items])
+                excess = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    # a replaced row gets a new rowid, so the smallest rowids are the oldest results
+                    self._connection.execute(
+                        "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY rowid LIMIT ?)",
+                        (excess,))
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _open_database(self, path: Optional[str]) -> sqlite3.Connection:
+        if path is None:
+            path = ":memory:"
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "solver TEXT, service_rate REAL, arrival_rate REAL, servers INTEGER, clients INTEGER, "
+                "avg_response_time REAL, utilization REAL, "
+                "PRIMARY KEY (solver, service_rate, arrival_rate, servers, clients))")
+            row = connection.execute("SELECT value FROM metadata WHERE name = 'solver_version'").fetchone()
+            if row is None or row[0] != self.version:
+                # results computed by another version of the solver cannot be trusted anymore
+                connection.execute("DELETE FROM results")
+                connection.execute("INSERT OR REPLACE INTO metadata VALUES ('solver_version', ?)", (self.version,))
+        return connection
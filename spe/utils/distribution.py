@@ -0,0 +1,157 @@
+"""This module defines the distributions of the service times, parametrized by their mean (1 / mu).
+
+They are shared by the server, which samples the service time of each request, by the discrete-event
+simulator and by the theoretical model, which only needs their squared coefficient of variation (SCV).
+Distributions are looked up by name in DISTRIBUTIONS; a new one only needs a subclass of
+ServiceTimeDistribution and an entry in the dictionary.
+"""
+from abc import ABC, abstractmethod
+import math
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+
+class ServiceTimeDistribution(ABC):
+    """Distribution of the service times, parametrized by its mean (1 / mu)."""
+    squared_coefficient_of_variation = 1.0
+
+    @abstractmethod
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        """Draw one service time."""
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        """Draw size service times at once (used by the discrete-event simulator)."""
+        return np.array([self.sample(rng, mean) for _ in range(size)])
+
+
+class ExponentialDistribution(ServiceTimeDistribution):
+    """Exponential service times, as in the M/M/k model."""
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        return rng.exponential(mean)
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        return rng.exponential(mean, size)
+
+
+class DeterministicDistribution(ServiceTimeDistribution):
+    """Every request takes exactly the mean service time."""
+    squared_coefficient_of_variation = 0.0
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        return mean
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        return np.full(size, mean)
+
+
+class ErlangDistribution(ServiceTimeDistribution):
+    """Sum of `phases` exponential stages: less variable than the exponential (SCV = 1 / phases)."""
+
+    def __init__(self, phases: int) -> None:
+        if phases < 1:
+            raise ValueError("The Erlang distribution needs at least one phase")
+        self.phases = int(phases)
+        self.squared_coefficient_of_variation = 1 / self.phases
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        return rng.gamma(self.phases, mean / self.phases)
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        return rng.gamma(self.phases, mean / self.phases, size)
+
+
+class HyperexponentialDistribution(ServiceTimeDistribution):
+    """Two-phase hyperexponential with balanced means, for an SCV of at least 1."""
+
+    def __init__(self, scv: float) -> None:
+        if scv < 1:
+            raise ValueError("The hyperexponential distribution needs an SCV of at least 1")
+        self.squared_coefficient_of_variation = scv
+        self.first_phase_probability = (1 + math.sqrt((scv - 1) / (scv + 1))) / 2
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        p = self.first_phase_probability
+        if rng.random() < p:
+            return rng.exponential(mean / (2 * p))
+        return rng.exponential(mean / (2 * (1 - p)))
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        p = self.first_phase_probability
+        phase_means = np.where(rng.random(size) < p, mean / (2 * p), mean / (2 * (1 - p)))
+        return rng.exponential(phase_means)
+
+
+class LognormalDistribution(ServiceTimeDistribution):
+    """Lognormal service times with the given SCV."""
+
+    def __init__(self, scv: float) -> None:
+        if scv <= 0:
+            raise ValueError("The lognormal distribution needs a positive SCV")
+        self.squared_coefficient_of_variation = scv
+        self.sigma = math.sqrt(math.log1p(scv))
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        return rng.lognormal(math.log(mean) - self.sigma ** 2 / 2, self.sigma)
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        return rng.lognormal(math.log(mean) - self.sigma ** 2 / 2, self.sigma, size)
+
+
+class EmpiricalDistribution(ServiceTimeDistribution):
+    """
+    Replays, in order and cyclically, the service times read from a text file (one per line),
+    rescaled so that their mean is the requested one.
+    """
+
+    def __init__(self, trace_path: str) -> None:
+        self.trace = np.loadtxt(trace_path, ndmin=1)
+        if len(self.trace) == 0 or np.any(self.trace < 0):
+            raise ValueError(f"The trace {trace_path} must contain non-negative service times")
+        self.trace_mean = float(np.mean(self.trace))
+        self.squared_coefficient_of_variation = float(np.var(self.trace)) / self.trace_mean ** 2
+        self._position = 0
+
+    def sample(self, rng: np.random.Generator, mean: float) -> float:
+        value = self.trace[self._position] * mean / self.trace_mean
+        self._position = (self._position + 1) % len(self.trace)
+        return float(value)
+
+    def sample_block(self, rng: np.random.Generator, mean: float, size: int) -> np.ndarray:
+        positions = (self._position + np.arange(size)) % len(self.trace)
+        self._position = (self._position + size) % len(self.trace)
+        return self.trace[positions] * mean / self.trace_mean
+
+
+DISTRIBUTIONS: Dict[str, Type[ServiceTimeDistribution]] = {
+    "exponential": ExponentialDistribution,
+    "deterministic": DeterministicDistribution,
+    "erlang": ErlangDistribution,
+    "hyperexponential": HyperexponentialDistribution,
+    "lognormal": LognormalDistribution,
+    "empirical": EmpiricalDistribution,
+}
+DISTRIBUTION_PARAMETERS = {"erlang": "phases", "hyperexponential": "scv", "lognormal": "scv", "empirical": "trace_path"}
+
+
+def create_distribution(name: str, parameter: Optional[str] = None) -> ServiceTimeDistribution:
+    """
+    Instantiate a distribution of DISTRIBUTIONS.
+
+    Args:
+        name: Name of the distribution
+        parameter: Its parameter (see DISTRIBUTION_PARAMETERS), as a string; ignored by the distributions without one
+
+    Raises:
+        ValueError: If the name is unknown or the parameter is missing or invalid
+    """
+    if name not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution '{name}', expected one of {tuple(DISTRIBUTIONS)}")
+    if name not in DISTRIBUTION_PARAMETERS:
+        return DISTRIBUTIONS[name]()
+    if parameter is None:
+        raise ValueError(f"The {name} distribution needs a parameter ({DISTRIBUTION_PARAMETERS[name]})")
+    if name == "empirical":
+        return EmpiricalDistribution(parameter)
+    return DISTRIBUTIONS[name](float(parameter))
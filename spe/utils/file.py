@@ -1,50 +1,53 @@
 """This module provides utility functions for handling CSV files and managing file operations."""
-from csv import writer, reader
+from csv import writer
 import os
-from typing import List
+import time
 
-from spe.utils.metric import MeasuredMetric
+import numpy as np
 
-CSV_PATH = "data/metrics.csv"
+from spe.utils.streaming import LatencyHistogram
 
+HISTOGRAM_FOLDER = "data/histograms/"
+TRACE_FOLDER = "data/traces/"
+READINESS_CSV_PATH = "data/server_readiness.csv"
 
-def write_metrics_to_csv(path: str, metrics: MeasuredMetric) -> None:
-    """"Write measured metrics to a CSV file, creating the directory if it doesn't exist."""
+
+def write_columns_to_npz(path: str, records: np.ndarray) -> None:
+    """Write a structured array as one uncompressed array per field, creating the directory if it doesn't exist."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    np.savez(path, **{name: records[name] for name in records.dtype.names})
+
+
+def write_readiness_to_csv(path: str, event: str, backend: str, number_of_servers: int, latency: float) -> None:
+    """Append the time the server took to be ready after a start or a resize, creating the directory if it doesn't exist."""
     directory = os.path.dirname(path)
     if directory and not os.path.exists(directory):
         os.makedirs(directory)
 
     with open(path, 'a', newline='') as csv_file:
-        wr = writer(csv_file)
-        wr.writerow([metrics.avg_response_time, metrics.lower_bound,
-                    metrics.upper_bound, metrics.utilization])
+        writer(csv_file).writerow([time.strftime("%Y-%m-%d %H:%M:%S"), event, backend, number_of_servers, latency])
 
 
-def read_metrics_from_csv(path: str) -> List[MeasuredMetric]:
-    measured_metrics = []
+def load_histogram(path: str) -> LatencyHistogram:
+    """Load a histogram saved by save_histogram, or return an empty one if the file doesn't exist."""
+    if not os.path.exists(path):
+        return LatencyHistogram()
+    with np.load(path) as saved:
+        return LatencyHistogram(saved["counts"], float(saved["maximum"]))
 
-    with open(path, 'r', newline='') as csv_file:
-        csv_reader = reader(csv_file)
-        for metrics in csv_reader:
-            avg_response_time = float(metrics[0])
-            lower_bound = float(metrics[1])
-            upper_bound = float(metrics[2])
-            utilization = float(metrics[3])
-            measured_metrics.append(MeasuredMetric(
-                avg_response_time, lower_bound, upper_bound, utilization))
 
-    return measured_metrics
+def save_histogram(path: str, histogram: LatencyHistogram) -> None:
+    """Save a histogram as a NumPy .npz file, creating the directory if it doesn't exist."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    np.savez(path, counts=histogram.counts, maximum=histogram.maximum)
 
 
 def delete_file_if_exists(path: str) -> None:
     if os.path.exists(path):
         os.remove(path)
-
-
-def truncate_file(path: str) -> None:
-    """Clear the contents of a file without closing the handle."""
-    try:
-        with open(path, 'w') as f:
-            f.truncate(0)
-    except Exception as e:
-        print(f"Error truncating file {path}: {e}")
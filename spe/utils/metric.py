@@ -2,17 +2,46 @@
 related to system performance. 
 """
 from dataclasses import dataclass
-import re
-from typing import List, Tuple
+import math
+from typing import Iterable, List, Optional, Tuple
 
 import numpy as np
-from scipy import stats
+from scipy import sparse, stats
 from scipy.integrate import solve_ivp
+from scipy.sparse.linalg import spsolve
+from scipy.special import gammaln, logsumexp
 
 from spe.utils.argument_parser import Config
+from spe.utils.cache import ModelCache, ModelKey
+from spe.utils.distribution import create_distribution
+from spe.utils.streaming import LatencyHistogram, StreamingStatistics
+
+SOLVER_VERSION = "2"  # bump whenever a change to the solvers can alter their results (invalidates ModelCache)
 
 INITIAL_STATE = 0
 CONFIDENCE_LEVEL = 0.90
+PERCENTILES = (50, 90, 95, 99)
+TRANSIENT_T_MAX = 200
+TRANSIENT_RTOL = 1e-10
+TRANSIENT_ATOL = 1e-12
+
+SOLVER_PRODUCT_FORM = "product-form"
+SOLVER_LINEAR = "linear"
+SOLVER_TRANSIENT = "transient"
+SOLVER_INCREMENTAL = "incremental"
+SOLVERS = (SOLVER_PRODUCT_FORM, SOLVER_LINEAR, SOLVER_TRANSIENT, SOLVER_INCREMENTAL)
+
+GRID_BATCH_SIZE = 1 << 18  # states (configurations x populations x servers) swept at once by the grid
+GRID_DTYPE = np.dtype([
+    ('service_rate', float),
+    ('arrival_rate', float),
+    ('number_of_servers', int),
+    ('number_of_clients', int),
+    ('avg_response_time', float),
+    ('utilization', float),
+    ('throughput', float),
+    ('queue_length', float),
+])
 
 
 @dataclass
@@ -21,6 +50,15 @@ class MeasuredMetric():
     lower_bound: float
     upper_bound: float
     utilization: float
+    avg_connection_time: float = 0.0
+    p50: float = math.nan
+    p90: float = math.nan
+    p95: float = math.nan
+    p99: float = math.nan
+    max_response_time: float = math.nan
+    load_imbalance: float = math.nan
+    server_overhead: float = math.nan
+    scheduling_lateness: float = math.nan  # mean delay of the generator in sending requests after their deadline
 
 
 @dataclass
@@ -29,6 +67,18 @@ class TheoreticalMetric():
     utilization: float
 
 
+@dataclass
+class TheoreticalSweep():
+    """Theoretical metrics for every population 0..N, indexed by number of clients."""
+    response_times: np.ndarray
+    utilizations: np.ndarray
+    throughputs: np.ndarray
+    queue_lengths: np.ndarray
+
+    def to_metrics(self, populations: Iterable[int]) -> List[TheoreticalMetric]:
+        return [TheoreticalMetric(self.response_times[n], self.utilizations[n]) for n in populations]
+
+
 def compute_mean(data: List[float]) -> float:
     return sum(data) / len(data)
 
@@ -44,64 +94,160 @@ def compute_confidence_intervals(data: List[float]) -> Tuple[float, float]:
     Returns:
         A tuple containing (lower_bound, upper_bound) of the confidence interval.
     """
-    mean = np.mean(data)
-    std = np.std(data)
-    number_of_observations = len(data)
+    statistics = StreamingStatistics()
+    statistics.add_batch(np.asarray(data, dtype=float))
+    return compute_streaming_confidence_intervals(statistics)
+
+
+def compute_streaming_confidence_intervals(statistics: StreamingStatistics) -> Tuple[float, float]:
+    """
+    Same as compute_confidence_intervals, from the running moments of the observations
+    instead of the observations themselves.
+    """
+    mean = statistics.mean
+    std = np.sqrt(statistics.variance)
+    number_of_observations = statistics.count
     margin_of_error = (std / np.sqrt(number_of_observations)) * \
         stats.t.ppf((1 + CONFIDENCE_LEVEL) / 2, number_of_observations - 1)
     return (mean - margin_of_error, mean + margin_of_error)
 
 
-def compute_utilization_from_logs(log_file_path: str, simulation_duration: int, num_servers: int) -> float:
+def compute_mser_truncation(batch_means: np.ndarray) -> int:
     """
-    Calculate server utilization from Gunicorn access logs.
+    Marginal Standard Error Rule (MSER): the number of leading batch means to discard as warm-up, the one
+    minimizing the squared standard error of the mean of the remaining ones, searched in the first half.
 
     Args:
-        log_file_path: Path to the access log file
-        simulation_duration: Total duration of the simulation in seconds
-        num_servers: Number of server workers (c in M/M/c/K)
+        batch_means: Means of consecutive batches of observations (of 5 observations for MSER-5), in order
+
+    Returns:
+        The number of batch means to discard
+    """
+    deviations = batch_means - batch_means.mean()  # centered, so that the sums of squares do not cancel out
+    suffix_sums = np.cumsum(deviations[::-1])[::-1]
+    suffix_squares = np.cumsum((deviations ** 2)[::-1])[::-1]
+    truncations = np.arange(len(batch_means) // 2 + 1)
+    remaining = len(batch_means) - truncations
+    sums_of_squares = suffix_squares[truncations] - suffix_sums[truncations] ** 2 / remaining
+    return int(np.argmin(sums_of_squares / remaining ** 2))
+
+
+def compute_batch_means_interval(batch_means: np.ndarray, batch_count: int) -> Tuple[float, float, float]:
+    """
+    Mean and confidence interval of an autocorrelated stream with the method of batch means: the values are
+    grouped into batch_count equal batches (the oldest remainder is dropped) whose means are nearly independent.
+
+    Args:
+        batch_means: Means of consecutive small batches of observations, in order, after the warm-up
+        batch_count: Number of batches of the interval
+
+    Returns:
+        A tuple (mean, lower_bound, upper_bound) of the CONFIDENCE_LEVEL interval
+    """
+    batch_size = len(batch_means) // batch_count
+    batches = batch_means[len(batch_means) - batch_count * batch_size:].reshape(batch_count, batch_size).mean(axis=1)
+    mean = float(batches.mean())
+    margin_of_error = float(batches.std(ddof=1) / np.sqrt(batch_count) *
+                            stats.t.ppf((1 + CONFIDENCE_LEVEL) / 2, batch_count - 1))
+    return mean, mean - margin_of_error, mean + margin_of_error
+
+
+def compute_percentiles(histogram: LatencyHistogram) -> Tuple[float, ...]:
+    """
+    Computes the PERCENTILES of the response times and their maximum.
 
     Returns:
-        float: Utilization as a value between 0 and 1
+        A tuple (p50, p90, p95, p99, max), NaN when the histogram is empty.
+    """
+    if histogram.total == 0:
+        return (math.nan,) * (len(PERCENTILES) + 1)
+    return tuple(histogram.quantile(percentile / 100) for percentile in PERCENTILES) + (histogram.maximum,)
+
 
-    Notes:
-        the log format is assumed to be something like: '... 200 1024 <requestID> 0.123'
+def compute_server_utilizations(worker_busy_times: Iterable[float], simulation_duration: float,
+                                num_servers: int) -> np.ndarray:
     """
-    pattern = r'.*" \d+ \d+ <\d+> ([\d.]+)'
-    request_times = []
+    Calculate the utilization of each server from the time it spent serving requests.
 
-    with open(log_file_path, 'r') as f:
-        for line in f:
-            match = re.search(pattern, line)
-            if match:
-                duration = float(match.group(1))  # Request duration in seconds
-                request_times.append(duration)
+    Args:
+        worker_busy_times: Busy time in seconds of each worker that served requests
+        simulation_duration: Length of the measurement in seconds
+        num_servers: Number of server workers (c in M/M/c/K)
 
-    total_busy_time = sum(request_times)
-    max_possible_busy_time = num_servers * simulation_duration
-    utilization = min(1.0, total_busy_time / max_possible_busy_time)
-    return utilization
+    Returns:
+        np.ndarray: Utilization of each server, with 0 for the servers that served no request
+    """
+    busy_times = np.fromiter(worker_busy_times, dtype=float)
+    utilizations = np.zeros(max(num_servers, len(busy_times)))
+    utilizations[:len(busy_times)] = np.minimum(1.0, busy_times / simulation_duration)
+    return utilizations
 
 
-def compute_theoretical_metrics(system_config: Config) -> List[TheoreticalMetric]:
+def compute_load_imbalance(server_utilizations: np.ndarray) -> float:
+    """
+    Calculate how unevenly the load is spread across the servers.
+
+    Returns:
+        float: Relative excess of the busiest server over the mean utilization (0 when perfectly balanced)
+    """
+    mean_utilization = float(np.mean(server_utilizations))
+    if mean_utilization == 0:
+        return 0.0
+    return float(np.max(server_utilizations)) / mean_utilization - 1
+
+
+def compute_theoretical_metrics(
+    system_config: Config,
+    solver: str = SOLVER_PRODUCT_FORM,
+    cache: Optional[ModelCache] = None
+) -> List[TheoreticalMetric]:
     """
     Computes the average reponse time and the server utilization for a closed M/M/k queue system.
 
     Args:
         system_config: Configuration containing service parameters and user range.
+        solver: How the state probabilities are obtained:
+            - "product-form": closed-form birth-death recursion evaluated in log space (default)
+            - "linear": sparse linear solve of the global balance equations (pi * Q = 0)
+            - "transient": integration of the forward equations up to TRANSIENT_T_MAX
+            - "incremental": single pass over the whole range, see compute_theoretical_sweep
+        cache: Optional cache of previous results; only the client counts missing from it are solved.
 
     Returns:
         A list of TheoreticalMetric objects, one for each client count in the user_range.
     """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver '{solver}', expected one of {SOLVERS}")
+    if cache is None:
+        return _solve_populations(system_config, system_config.user_range, solver)
+
+    def key(num_clients: int) -> ModelKey:
+        return (solver, system_config.service_rate, system_config.arrival_rate,
+                system_config.number_of_servers, num_clients)
+
+    cached = {num_clients: cache.get(key(num_clients)) for num_clients in system_config.user_range}
+    missing = [num_clients for num_clients, value in cached.items() if value is None]
+    if missing:
+        solved = _solve_populations(system_config, missing, solver)
+        cache.put_many((key(num_clients), (float(metric.avg_response_time), float(metric.utilization)))
+                       for num_clients, metric in zip(missing, solved))
+        cached.update((num_clients, (metric.avg_response_time, metric.utilization))
+                      for num_clients, metric in zip(missing, solved))
+
+    return [TheoreticalMetric(*cached[num_clients]) for num_clients in system_config.user_range]
+
+
+def _solve_populations(system_config: Config, populations: Iterable[int], solver: str) -> List[TheoreticalMetric]:
     arrival_rate = system_config.arrival_rate
     service_rate = system_config.service_rate
     c = system_config.number_of_servers
+    if solver == SOLVER_INCREMENTAL:
+        return _sweep_populations(max(populations, default=0), arrival_rate, service_rate, c).to_metrics(populations)
+
     metrics = []
 
-    for num_clients in system_config.user_range:
-        Q = _build_rate_matrix(num_clients, arrival_rate, service_rate, c)
-        probabilities_over_time = _compute_forward_equations(Q, t_max=200)
-        steady_state = probabilities_over_time[-1]
+    for num_clients in populations:
+        steady_state = compute_state_probabilities(num_clients, arrival_rate, service_rate, c, solver)
         theoretical = _calculate_metrics_from_steady_state(
             steady_state, num_clients, c, service_rate
         )
@@ -110,6 +256,333 @@ def compute_theoretical_metrics(system_config: Config) -> List[TheoreticalMetric
     return metrics
 
 
+def compute_open_theoretical_metrics(system_config: Config) -> List[TheoreticalMetric]:
+    """
+    Computes the average response time and the server utilization for an open G/G/k queue
+    fed by num_clients streams of rate arrival_rate, the counterpart of the closed system
+    when the load generator runs in open-loop mode.
+
+    The waiting time follows the Allen-Cunneen approximation, W = C(k, a) / (k * mu - lambda) * (ca^2 + cs^2) / 2,
+    which is exact for M/M/k. cs^2 is the SCV of the service-time distribution. ca^2 is 1 for Poisson clients,
+    and for constant-rate clients it is the SCV of the superposition of num_clients periodic streams
+    (see _superposition_scv).
+
+    Args:
+        system_config: Configuration containing service parameters and user range.
+
+    Returns:
+        A list of TheoreticalMetric objects, one for each client count in the user_range.
+        Unstable configurations (offered load >= k) have an infinite response time and utilization 1.
+    """
+    service_rate = system_config.service_rate
+    c = system_config.number_of_servers
+    service_scv = compute_service_time_scv(system_config)
+    metrics = []
+
+    for num_clients in system_config.user_range:
+        total_arrival_rate = num_clients * system_config.arrival_rate
+        offered_load = total_arrival_rate / service_rate
+        if offered_load >= c:
+            metrics.append(TheoreticalMetric(float('inf'), 1.0))
+            continue
+        if system_config.load_model == "open-constant":
+            arrival_scv = _superposition_scv(num_clients, offered_load / c)
+        else:
+            arrival_scv = 1.0
+        waiting_probability = _erlang_c(offered_load, c)
+        average_waiting_time = waiting_probability / (c * service_rate - total_arrival_rate)
+        average_response_time = 1 / service_rate + average_waiting_time * (arrival_scv + service_scv) / 2
+        metrics.append(TheoreticalMetric(average_response_time, offered_load / c))
+
+    return metrics
+
+
+def compute_general_service_metrics(
+    system_config: Config,
+    exponential_metrics: List[TheoreticalMetric]
+) -> List[TheoreticalMetric]:
+    """
+    Approximates the metrics of the closed M/G/k system from those of the closed M/M/k system.
+
+    The waiting time of the M/M/k solution is scaled by (1 + cs^2) / 2, as in the Allen-Cunneen and
+    Pollaczek-Khinchine formulas. The throughput and the utilization then follow from the interactive
+    response time law, X = N / (R + 1 / arrival_rate), bounded by the capacity k * mu of the servers.
+
+    Args:
+        system_config: Configuration containing service parameters, user range and service-time distribution.
+        exponential_metrics: Metrics of the closed M/M/k system, one for each client count in the user_range.
+
+    Returns:
+        A list of TheoreticalMetric objects, one for each client count in the user_range.
+    """
+    service_time = 1 / system_config.service_rate
+    variability = (1 + compute_service_time_scv(system_config)) / 2
+    if variability == 1:
+        return exponential_metrics  # exponential service times: the M/M/k solution itself
+    c = system_config.number_of_servers
+    metrics = []
+
+    for num_clients, metric in zip(system_config.user_range, exponential_metrics):
+        waiting_time = max(0.0, metric.avg_response_time - service_time)
+        average_response_time = service_time + waiting_time * variability
+        think_time = 1 / system_config.arrival_rate
+        throughput = num_clients / (average_response_time + think_time)
+        if throughput > c / service_time:
+            # the servers cannot go faster than k * mu: the response time follows from the saturated throughput
+            throughput = c / service_time
+            average_response_time = num_clients / throughput - think_time
+        metrics.append(TheoreticalMetric(average_response_time, throughput * service_time / c))
+
+    return metrics
+
+
+def compute_service_time_scv(system_config: Config) -> float:
+    """Squared coefficient of variation of the service times configured on the server (1 for exponential)."""
+    distribution = create_distribution(system_config.service_distribution, system_config.distribution_parameter)
+    return distribution.squared_coefficient_of_variation
+
+
+def _superposition_scv(num_streams: int, utilization: float) -> float:
+    """
+    SCV of the superposition of num_streams equal deterministic streams, from Whitt's QNA hybrid approximation:
+    a single stream stays deterministic (0), many streams tend to a Poisson process (1).
+    """
+    weight = 1 / (1 + 4 * (1 - utilization) ** 2 * (num_streams - 1))
+    return 1 - weight
+
+
+def _erlang_c(offered_load: float, c: int) -> float:
+    """Probability that an arrival has to wait in an M/M/c queue, from the Erlang B recursion."""
+    blocking_probability = 1.0
+    for servers in range(1, c + 1):
+        blocking_probability = offered_load * blocking_probability / (servers + offered_load * blocking_probability)
+    return c * blocking_probability / (c - offered_load * (1 - blocking_probability))
+
+
+def compute_theoretical_sweep(system_config: Config) -> TheoreticalSweep:
+    """
+    Computes the theoretical metrics of every population up to max(user_range) in a single pass.
+
+    With n clients the product-form weight of i requests at the servers is w_n(i) = a(n - i) * b(i),
+    where a(t) = (1/lambda)^t / t! comes from the thinking clients and b(i) = (1/mu)^i / prod min(j, k).
+    Beyond k requests the servers behave as one server of rate k * mu, so the tail sum
+    T(n) = sum_{i >= k} w_n(i) follows T(n) = T(n - 1) / (k * mu) + a(n - k) * b(k): each population is
+    obtained from the previous one. The recursions are evaluated for all n at once with cumulative
+    log-sum-exp, so only O(N * k) vectorized work is needed and nothing overflows.
+
+    Args:
+        system_config: Configuration containing service parameters and user range.
+
+    Returns:
+        TheoreticalSweep with response time, utilization, throughput and mean number of
+        requests at the servers, indexed by number of clients from 0 to max(user_range).
+    """
+    N = max(system_config.user_range, default=0)
+    return _sweep_populations(N, system_config.arrival_rate, system_config.service_rate,
+                              system_config.number_of_servers)
+
+
+def compute_theoretical_grid(
+    service_rates: np.ndarray,
+    arrival_rates: np.ndarray,
+    numbers_of_servers: np.ndarray,
+    numbers_of_clients: np.ndarray
+) -> np.ndarray:
+    """
+    Evaluates the closed M/M/k model on many parameter points at once.
+
+    The four inputs are broadcast against each other (use np.meshgrid for a full grid).
+    Points sharing (mu, lambda, k) are answered by a single sweep up to their largest
+    number of clients, so the cost depends on the distinct configurations, not on the points.
+    The configurations with the same k are swept together, vectorized over the configuration axis.
+
+    Args:
+        service_rates: Service rate of each server (mu)
+        arrival_rates: Request rate of each thinking client (lambda)
+        numbers_of_servers: Number of servers (k)
+        numbers_of_clients: Population of the closed system (N)
+
+    Returns:
+        np.ndarray: Flat structured array with dtype GRID_DTYPE, one record per point.
+    """
+    service_rates, arrival_rates, numbers_of_servers, numbers_of_clients = (
+        np.ravel(values) for values in np.broadcast_arrays(
+            np.asarray(service_rates, dtype=float), np.asarray(arrival_rates, dtype=float),
+            np.asarray(numbers_of_servers, dtype=int), np.asarray(numbers_of_clients, dtype=int)))
+
+    results = np.empty(service_rates.size, dtype=GRID_DTYPE)
+    results['service_rate'] = service_rates
+    results['arrival_rate'] = arrival_rates
+    results['number_of_servers'] = numbers_of_servers
+    results['number_of_clients'] = numbers_of_clients
+
+    # integer key per (mu, lambda, k) configuration: sorting 1-D keys is much cheaper than np.unique(axis=0)
+    key = np.zeros(service_rates.size, dtype=np.int64)
+    for column in (service_rates, arrival_rates, numbers_of_servers):
+        values, inverse = np.unique(column, return_inverse=True)
+        key = key * len(values) + inverse.ravel()
+    _, first, group = np.unique(key, return_index=True, return_inverse=True)
+    group = group.ravel()
+    populations = np.zeros(len(first), dtype=np.int64)  # largest number of clients asked of each configuration
+    np.maximum.at(populations, group, numbers_of_clients)
+
+    # configurations sharing k are swept together, padded to the largest population of their batch: sorting
+    # them by population keeps the padding small, and batches are bounded to GRID_BATCH_SIZE states
+    configurations = np.lexsort((populations, numbers_of_servers[first]))
+    batch_of = np.empty(len(first), dtype=np.int64)
+    row_of = np.empty(len(first), dtype=np.int64)
+    batches = []
+    start = 0
+    while start < len(configurations):
+        c = int(numbers_of_servers[first[configurations[start]]])
+        stop = start + 1
+        while (stop < len(configurations) and numbers_of_servers[first[configurations[stop]]] == c
+               and (stop - start + 1) * (populations[configurations[stop]] + 1) * (c + 1) <= GRID_BATCH_SIZE):
+            stop += 1
+        batch = configurations[start:stop]
+        batch_of[batch] = len(batches)
+        row_of[batch] = np.arange(len(batch))
+        batches.append(batch)
+        start = stop
+
+    point_batch = batch_of[group]
+    order = np.argsort(point_batch, kind='stable')
+    boundaries = np.cumsum(np.bincount(point_batch, minlength=len(batches)))[:-1]
+    for batch, points in zip(batches, np.split(order, boundaries)):
+        configuration = first[batch]
+        sweep = _sweep_configurations(int(populations[batch[-1]]), arrival_rates[configuration],
+                                      service_rates[configuration], int(numbers_of_servers[configuration[0]]))
+        rows = row_of[group[points]]
+        clients = numbers_of_clients[points]
+        results['avg_response_time'][points] = sweep.response_times[rows, clients]
+        results['utilization'][points] = sweep.utilizations[rows, clients]
+        results['throughput'][points] = sweep.throughputs[rows, clients]
+        results['queue_length'][points] = sweep.queue_lengths[rows, clients]
+
+    return results
+
+
+def _sweep_populations(N: int, arrival_rate: float, service_rate: float, c: int) -> TheoreticalSweep:
+    """Recursions of compute_theoretical_sweep for populations 0..N."""
+    sweep = _sweep_configurations(N, np.array([arrival_rate]), np.array([service_rate]), c)
+    return TheoreticalSweep(sweep.response_times[0], sweep.utilizations[0], sweep.throughputs[0],
+                            sweep.queue_lengths[0])
+
+
+def _sweep_configurations(N: int, arrival_rates: np.ndarray, service_rates: np.ndarray, c: int) -> TheoreticalSweep:
+    """
+    Recursions of compute_theoretical_sweep for populations 0..N of several configurations with c servers.
+
+    Returns:
+        TheoreticalSweep: Arrays of shape (configurations, N + 1)
+    """
+    log_think_time = -np.log(arrival_rates)[:, None]
+    log_service_time = -np.log(service_rates)[:, None]
+    log_ratio = log_service_time - np.log(c)
+    n = np.arange(N + 1)
+    j = np.arange(c + 1)
+    log_a = n * log_think_time - gammaln(n + 1)
+    log_b = j * log_service_time - gammaln(j + 1)
+
+    # states with fewer than c requests at the servers, one column per number of busy servers
+    thinking = n[:, None] - j[None, :c]
+    log_head = np.where(thinking >= 0, log_a[:, np.clip(thinking, 0, None)] + log_b[:, None, :c], -np.inf)
+
+    # tail mass T(n) and its excess moment T'(n) = sum_{i > c} (i - c) w_n(i) = (T'(n - 1) + T(n - 1)) / (c * mu)
+    log_tail = np.full((len(arrival_rates), N + 1), -np.inf)
+    log_tail_moment = np.full((len(arrival_rates), N + 1), -np.inf)
+    if N >= c:
+        m = np.arange(N - c + 1)
+        log_tail[:, c:] = m * log_ratio + np.logaddexp.accumulate(
+            log_a[:, :N - c + 1] + log_b[:, c:c + 1] - m * log_ratio, axis=1)
+    if N > c:
+        m = np.arange(c + 1, N + 1)
+        log_tail_moment[:, c + 1:] = m * log_ratio + np.logaddexp.accumulate(
+            log_tail[:, c:N] - (m - 1) * log_ratio, axis=1)
+
+    log_normalization = np.logaddexp(logsumexp(log_head, axis=2), log_tail)
+    with np.errstate(divide='ignore'):
+        log_queue = logsumexp(np.concatenate([
+            np.log(j[1:c]) + log_head[:, :, 1:c],
+            (np.log(c) + log_tail)[:, :, None],
+            log_tail_moment[:, :, None]
+        ], axis=2), axis=2)
+
+    throughputs = np.zeros((len(arrival_rates), N + 1))
+    throughputs[:, 1:] = np.exp(log_normalization[:, :-1] - log_normalization[:, 1:])
+    queue_lengths = np.exp(log_queue - log_normalization)
+    response_times = np.full((len(arrival_rates), N + 1), float('inf'))
+    response_times[:, 1:] = queue_lengths[:, 1:] / throughputs[:, 1:]
+    utilizations = throughputs / (service_rates[:, None] * c)
+
+    return TheoreticalSweep(response_times, utilizations, throughputs, queue_lengths)
+
+
+def compute_state_probabilities(
+    num_clients: int,
+    arrival_rate: float,
+    service_rate: float,
+    c: int,
+    solver: str = SOLVER_PRODUCT_FORM
+) -> np.ndarray:
+    """
+    Computes the probability of having i = 0..N clients in the system.
+
+    Args:
+        num_clients: Population of the closed system (N)
+        arrival_rate: Request rate of a single thinking client (lambda)
+        service_rate: Service rate of a single server (mu)
+        c: Number of servers
+        solver: One of SOLVERS, see compute_theoretical_metrics
+
+    Returns:
+        np.ndarray: Vector of N + 1 state probabilities
+    """
+    if solver == SOLVER_PRODUCT_FORM:
+        return _compute_product_form(num_clients, arrival_rate, service_rate, c)
+    if solver == SOLVER_LINEAR:
+        Q = _build_sparse_rate_matrix(num_clients, arrival_rate, service_rate, c)
+        return _solve_global_balance(Q)
+    Q = _build_rate_matrix(num_clients, arrival_rate, service_rate, c)
+    return _compute_forward_equations(Q, t_max=TRANSIENT_T_MAX)[-1]
+
+
+def _compute_product_form(N: int, arrival_rate: float, service_rate: float, c: int) -> np.ndarray:
+    """
+    Birth-death recursion p(i) = p(i-1) * (N-i+1) * lambda / (min(i, c) * mu).
+    The products are accumulated as sums of logarithms so large populations do not overflow.
+    """
+    i = np.arange(1, N + 1)
+    log_ratios = np.log((N - i + 1) * arrival_rate) - np.log(np.minimum(i, c) * service_rate)
+    log_weights = np.concatenate(([0.0], np.cumsum(log_ratios)))
+    return np.exp(log_weights - logsumexp(log_weights))
+
+
+def _build_sparse_rate_matrix(N: int, arrival_rate: float, service_rate: float, c: int) -> sparse.csr_matrix:
+    """Tridiagonal version of _build_rate_matrix stored in sparse format."""
+    i = np.arange(N + 1)
+    births = (N - i[:-1]) * arrival_rate
+    deaths = np.minimum(i[1:], c) * service_rate
+    diagonal = -(np.append(births, 0.0) + np.insert(deaths, 0, 0.0))
+    return sparse.diags([deaths, diagonal, births], offsets=[-1, 0, 1], format='csr')
+
+
+def _solve_global_balance(Q: sparse.spmatrix) -> np.ndarray:
+    """
+    Solves pi * Q = 0 subject to sum(pi) = 1 for any irreducible generator matrix.
+    One balance equation is redundant, so pi(0) is fixed to 1 and the reduced system is solved:
+    this keeps the sparsity pattern of Q (tridiagonal for birth-death chains) and avoids fill-in.
+    """
+    A = sparse.csc_matrix(Q.T)
+    if A.shape[0] == 1:
+        return np.ones(1)
+    reduced = A[1:, 1:]
+    rhs = -A[1:, 0].toarray().ravel()
+    unnormalized = np.concatenate(([1.0], np.atleast_1d(spsolve(reduced, rhs))))
+    unnormalized = np.clip(unnormalized, 0.0, None)
+    return unnormalized / unnormalized.sum()
+
+
 def _build_rate_matrix(N: int, arrival_rate: float, service_rate: float, c: int) -> np.ndarray:
     Q = np.zeros((N + 1, N + 1))
 
@@ -132,10 +605,12 @@ def _calculate_metrics_from_steady_state(
     service_rate: float
 ) -> TheoreticalMetric:
     """Calculate key performance metrics from the steady state distribution."""
-    L = sum(i * steady_state[i] for i in range(num_clients + 1))
-    X = sum(min(i, c) * service_rate * steady_state[i] for i in range(1, num_clients + 1))
+    states = np.arange(num_clients + 1)
+    busy = np.minimum(states, c)
+    L = np.dot(states, steady_state)
+    busy_servers = np.dot(busy, steady_state)
+    X = busy_servers * service_rate
     average_response_time = L / X if X > 0 else float('inf')
-    busy_servers = sum(min(i, c) * steady_state[i] for i in range(1, num_clients + 1))
     utilization = busy_servers / c
 
     return TheoreticalMetric(average_response_time, utilization)
@@ -154,5 +629,7 @@ def _forward_equations(Q: np.ndarray, t_max: int, initial_state_probs: np.ndarra
     def ode_system(t, pi):
         return Q.T @ pi
 
-    solution = solve_ivp(ode_system, [0, t_max], initial_state_probs, t_eval=t_points)
+    # tight tolerances so that the transient mode agrees with the steady-state solvers once settled
+    solution = solve_ivp(ode_system, [0, t_max], initial_state_probs, t_eval=t_points,
+                         rtol=TRANSIENT_RTOL, atol=TRANSIENT_ATOL)
     return solution.y.T
@@ -2,7 +2,7 @@
 theoretical and measured metrics from queue simulation experiments.
 """
 import os
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -13,14 +13,17 @@ from spe.utils.metric import MeasuredMetric, TheoreticalMetric
 FIGURE_FOLDER = "data/"
 
 
-def save_metrics_plot(system_config: Config, theoretical_metrics: List[TheoreticalMetric], measured_metrics: List[MeasuredMetric]) -> None:
+def save_metrics_plot(system_config: Config, theoretical_metrics: List[TheoreticalMetric], measured_metrics: List[MeasuredMetric],
+                      simulated_metrics: Optional[List[MeasuredMetric]] = None) -> None:
     """
     Creates and saves visualization comparing theoretical and measured performance metrics.
 
     This function generates a plot with two y-axes:
     1. Left y-axis: Bar chart comparing theoretical vs measured average response times (ARTs)
-       with confidence intervals for measured values
+       with confidence intervals for measured values, plus markers for the measured
+       percentiles (p50, p90, p95, p99) and maximum response time
     2. Right y-axis: Line plot comparing theoretical vs measured server utilization
+    When simulated metrics (discrete-event simulation) are given, they are added as a third series on both axes.
 
     The plot is saved as a PNG file in the data directory with a filename derived from
     the system configuration parameters.
@@ -29,6 +32,7 @@ def save_metrics_plot(system_config: Config, theoretical_metrics: List[Theoretic
         system_config: Configuration object containing simulation parameters
         theoretical_metrics: List of theoretical performance metrics for different client counts
         measured_metrics: List of measured performance metrics for different client counts
+        simulated_metrics: Optional list of simulated performance metrics for the same client counts
 
     Note:
         The function automatically creates the data directory if it doesn't exist.
@@ -37,7 +41,9 @@ def save_metrics_plot(system_config: Config, theoretical_metrics: List[Theoretic
     os.makedirs(FIGURE_FOLDER, exist_ok=True)
 
     user_range = system_config.user_range
-    theoretical_arts = [metric.avg_response_time for metric in theoretical_metrics]
+    # unstable open systems have an infinite response time, which cannot be drawn
+    theoretical_arts = [metric.avg_response_time if np.isfinite(metric.avg_response_time) else np.nan
+                        for metric in theoretical_metrics]
     theoretical_utils = [metric.utilization for metric in theoretical_metrics]
     avg_response_times = [metric.avg_response_time for metric in measured_metrics]
     lower_bounds = [metric.lower_bound for metric in measured_metrics]
@@ -55,26 +61,148 @@ def save_metrics_plot(system_config: Config, theoretical_metrics: List[Theoretic
         f"[$t$] = {system_config.user_request_time}, "
         f"[$k$] = {system_config.number_of_servers}"
     )
+    if system_config.load_model != "closed":
+        simulation_info += f", {system_config.load_model} load"
+    if system_config.service_distribution != "exponential":
+        simulation_info += f", {system_config.service_distribution} service (M/G/k approximation)"
+    if system_config.engine == "des":
+        simulation_info += ", discrete-event simulation"
+    elif system_config.backend != "sync":
+        simulation_info += f", {system_config.backend} back-end"
     plt.title(simulation_info, fontsize=10, loc='center')
 
-    bar_width = 0.35
-    ax1.bar(x - bar_width / 2, theoretical_arts, bar_width,
+    # with the des engine the "measured" metrics are the simulated ones
+    measured_name = 'Simulated' if system_config.engine == "des" else 'Measured'
+    bar_width = 0.35 if simulated_metrics is None else 0.25
+    measured_offset = bar_width / 2 if simulated_metrics is None else 0.0
+    ax1.bar(x - bar_width / 2 if simulated_metrics is None else x - bar_width, theoretical_arts, bar_width,
             label='Theoretical ARTs', color='skyblue', edgecolor='black', alpha=1)
-    ax1.bar(x + bar_width / 2, avg_response_times, bar_width,
-            label='Measured ARTs', color='orange', edgecolor='black', alpha=1)
+    ax1.bar(x + measured_offset, avg_response_times, bar_width,
+            label=f'{measured_name} ARTs', color='orange', edgecolor='black', alpha=1)
     error = [avg_response_times[i] - lower_bounds[i] for i in range(len(avg_response_times))]
-    ax1.errorbar(x + bar_width / 2, avg_response_times, yerr=[error, [upper_bounds[i] - avg_response_times[i] for i in range(
+    ax1.errorbar(x + measured_offset, avg_response_times, yerr=[error, [upper_bounds[i] - avg_response_times[i] for i in range(
         len(avg_response_times))]], fmt='none', ecolor='black', capsize=5, label='Confidence Interval')
-    ax1.legend(loc='upper left', bbox_to_anchor=(0, 1))
+    if simulated_metrics is not None:
+        simulated_arts = np.array([metric.avg_response_time for metric in simulated_metrics])
+        simulated_errors = [simulated_arts - [metric.lower_bound for metric in simulated_metrics],
+                            [metric.upper_bound for metric in simulated_metrics] - simulated_arts]
+        ax1.bar(x + bar_width, simulated_arts, bar_width, label='Simulated ARTs (DES)', color='lightgray',
+                edgecolor='black', alpha=1)
+        ax1.errorbar(x + bar_width, simulated_arts, yerr=simulated_errors, fmt='none', ecolor='black', capsize=5)
+    ax1.add_artist(ax1.legend(loc='upper left', bbox_to_anchor=(0, 1)))
+    percentile_markers = [
+        ax1.scatter(x + measured_offset, values, marker=marker, color='dimgray', zorder=3, label=label)
+        for label, values, marker in _percentile_series(measured_metrics) if not np.all(np.isnan(values))
+    ]
+    if percentile_markers:
+        ax1.legend(handles=percentile_markers, loc='upper right', title='Measured percentiles')
 
     ax2 = ax1.twinx()
     ax2.plot(x, theoretical_utils, label='Theoretical Utils', color='green', marker='o')
-    ax2.plot(x, measured_utils, label='Measured Utils', color='purple', marker='^')
+    ax2.plot(x, measured_utils, label=f'{measured_name} Utils', color='purple', marker='^')
+    if simulated_metrics is not None:
+        ax2.plot(x, [metric.utilization for metric in simulated_metrics], label='Simulated Utils (DES)',
+                 color='gray', marker='s', linestyle=':')
     ax2.set_ylabel("Utilization")
-    ax2.legend(loc='upper left', bbox_to_anchor=(0, 0.85))
+    ax2.legend(loc='upper left', bbox_to_anchor=(0, 0.85 if simulated_metrics is None else 0.79))
 
     fig.tight_layout()
-    figure_name = f"simulation_s{system_config.service_rate}_a{system_config.arrival_rate}_t{system_config.user_request_time}_k{system_config.number_of_servers}"
-    figure_path = os.path.join(FIGURE_FOLDER, f"{figure_name}.png")
+    figure_path = os.path.join(FIGURE_FOLDER, f"{_figure_name('simulation', system_config)}.png")
     plt.savefig(figure_path)
     plt.close()
+
+
+def save_server_utilization_plot(system_config: Config, server_utilizations: Dict[int, List[float]],
+                                 measured_metrics: List[MeasuredMetric]) -> None:
+    """
+    Creates and saves a plot of the utilization of every server and of the load imbalance.
+
+    Left y-axis: one line per Gunicorn worker with its utilization.
+    Right y-axis: load imbalance (relative excess of the busiest worker over the mean utilization).
+
+    Args:
+        system_config: Configuration object containing simulation parameters
+        server_utilizations: Utilization of each server, by number of clients
+        measured_metrics: List of measured performance metrics for different client counts
+    """
+    os.makedirs(FIGURE_FOLDER, exist_ok=True)
+
+    x = np.array(sorted(server_utilizations))
+    worker_count = max(len(utilizations) for utilizations in server_utilizations.values())
+    utilizations = np.full((len(x), worker_count), np.nan)
+    for row, number_of_clients in enumerate(x):
+        utilizations[row, :len(server_utilizations[number_of_clients])] = server_utilizations[number_of_clients]
+
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+    ax1.set_xlabel("Number of clients")
+    ax1.set_ylabel("Utilization")
+    plt.suptitle('Utilization of each server', fontsize=14)
+    plt.title(f"[$\\mu$] = {system_config.service_rate}, [$\\lambda$] = {system_config.arrival_rate}, "
+              f"[$t$] = {system_config.user_request_time}, [$k$] = {system_config.number_of_servers}",
+              fontsize=10, loc='center')
+    for worker in range(worker_count):
+        ax1.plot(x, utilizations[:, worker], marker='.', alpha=0.7, label=f'Server {worker + 1}')
+    ax1.legend(loc='upper left')
+
+    ax2 = ax1.twinx()
+    ax2.plot(x, [metric.load_imbalance for metric in measured_metrics[:len(x)]],
+             color='black', linestyle='--', marker='x', label='Load imbalance')
+    ax2.set_ylabel("Load imbalance (max / mean - 1)")
+    ax2.legend(loc='upper right')
+
+    fig.tight_layout()
+    plt.savefig(os.path.join(FIGURE_FOLDER, f"{_figure_name('servers', system_config)}.png"))
+    plt.close()
+
+
+def save_trace_plot(trace_path: str, header: np.void, records: np.ndarray) -> str:
+    """
+    Plot the response times of a trace over the time they were sent, and their histogram.
+
+    Returns:
+        Path of the figure, next to the trace
+    """
+    successful = records[records['status'] == 200]
+    start_field = 'intended_time' if header['open_loop'] else 'send_time'
+    response_times = successful['receive_time'] - successful[start_field]
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6), gridspec_kw={'width_ratios': [3, 1]})
+    plt.suptitle(f"Trace of {header['number_of_users']} clients: {len(records)} requests, "
+                 f"{len(records) - len(successful)} failed", fontsize=14)
+    ax1.scatter(successful[start_field], response_times, s=2, alpha=0.5)
+    ax1.set_xlabel("Time from the start of the load test (s)")
+    ax1.set_ylabel("Response time (s)")
+    ax2.hist(response_times, bins=100, orientation='horizontal')
+    ax2.set_xlabel("Requests")
+    ax2.sharey(ax1)
+
+    fig.tight_layout()
+    figure_path = f"{trace_path}.png"
+    plt.savefig(figure_path)
+    plt.close()
+    return figure_path
+
+
+def _figure_name(prefix: str, system_config: Config) -> str:
+    """File name (without extension) of a figure, with the parameters of the simulation and its non-default options."""
+    figure_name = f"{prefix}_s{system_config.service_rate}_a{system_config.arrival_rate}_t{system_config.user_request_time}_k{system_config.number_of_servers}"
+    if system_config.load_model != "closed":
+        figure_name += f"_{system_config.load_model}"
+    if system_config.service_distribution != "exponential":
+        figure_name += f"_{system_config.service_distribution}"
+    if system_config.engine == "des":
+        figure_name += "_des"
+    elif system_config.backend != "sync":
+        figure_name += f"_{system_config.backend}"
+    return figure_name
+
+
+def _percentile_series(measured_metrics: List[MeasuredMetric]) -> List[Tuple[str, np.ndarray, str]]:
+    """(label, values per client count, marker) of each measured percentile."""
+    return [
+        ('p50', np.array([metric.p50 for metric in measured_metrics], dtype=float), '_'),
+        ('p90', np.array([metric.p90 for metric in measured_metrics], dtype=float), '1'),
+        ('p95', np.array([metric.p95 for metric in measured_metrics], dtype=float), '2'),
+        ('p99', np.array([metric.p99 for metric in measured_metrics], dtype=float), 'x'),
+        ('max', np.array([metric.max_response_time for metric in measured_metrics], dtype=float), '*'),
+    ]
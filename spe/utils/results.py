@@ -0,0 +1,196 @@
+"""This module stores the measured metrics of every run in a SQLite database, to query and plot them later.
+
+A run is one call of run_load_simulation: one configuration (mu, lambda, k, t and the other options) measured
+for every number of users of its range. Runs are never overwritten, so the database keeps the whole history
+of the measurements, and several processes (e.g. the experiments of a matrix) can write to it at the same time.
+"""
+from dataclasses import asdict, dataclass, fields
+import json
+import math
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spe.utils.argument_parser import Config
+from spe.utils.metric import MeasuredMetric
+
+RESULTS_PATH = os.environ.get("SPE_RESULTS_PATH", "data/results.sqlite")  # shared by the experiments of a matrix
+BUSY_TIMEOUT = 30  # seconds a writer waits for the lock held by another process
+METRIC_FIELDS = tuple(metric_field.name for metric_field in fields(MeasuredMetric))
+RUN_FIELDS = ("run_id", "started_at", "label", "service_rate", "arrival_rate", "servers", "duration", "engine",
+              "backend")  # the configuration columns, the whole Config being stored as JSON
+
+
+@dataclass
+class StoredRun:
+    run_id: int
+    started_at: float  # time.time() when the run was created
+    label: Optional[str]
+    system_config: Config
+
+
+class ResultStore:
+    """
+    Stores the measured metrics and server utilizations of runs, keyed by run and number of users.
+
+    Rows are buffered in memory and written with a single transaction by flush (or close). The columns of the
+    metrics follow the fields of MeasuredMetric: fields added later are added to an existing database, and
+    are NaN for the runs recorded before them.
+    """
+
+    def __init__(self, path: str = RESULTS_PATH) -> None:
+        self.path = path
+        self._pending_metrics: List[Tuple] = []
+        self._pending_utilizations: List[Tuple[int, int, int, float]] = []
+        self._connection = self._open_database(path)
+
+    def start_run(self, system_config: Config, label: Optional[str] = None) -> int:
+        """Record a new run of the given configuration and return its id."""
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (started_at, label, service_rate, arrival_rate, servers, duration, engine, backend, "
+                "config) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), label, system_config.service_rate, system_config.arrival_rate,
+                 system_config.number_of_servers, system_config.user_request_time, system_config.engine,
+                 system_config.backend, _config_to_json(system_config)))
+        return cursor.lastrowid
+
+    def add_metrics(self, run_id: int, number_of_users: int, metrics: MeasuredMetric) -> None:
+        self._pending_metrics.append((run_id, number_of_users, time.time(),
+                                      *(getattr(metrics, name) for name in METRIC_FIELDS)))
+
+    def add_server_utilizations(self, run_id: int, number_of_users: int, utilizations: np.ndarray) -> None:
+        self._pending_utilizations.extend((run_id, number_of_users, server, float(utilization))
+                                          for server, utilization in enumerate(utilizations))
+
+    def flush(self) -> None:
+        """Write the buffered rows with a single transaction."""
+        if not self._pending_metrics and not self._pending_utilizations:
+            return
+        columns = ("run_id", "clients", "recorded_at", *METRIC_FIELDS)
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO metrics ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                self._pending_metrics)
+            self._connection.executemany("INSERT OR REPLACE INTO server_utilizations VALUES (?, ?, ?, ?)",
+                                         self._pending_utilizations)
+        self._pending_metrics.clear()
+        self._pending_utilizations.clear()
+
+    def find_runs(self, service_rate: Optional[float] = None, arrival_rate: Optional[float] = None,
+                  number_of_servers: Optional[int] = None, user_request_time: Optional[int] = None,
+                  label: Optional[str] = None, since: Optional[float] = None) -> List[StoredRun]:
+        """Runs matching every given filter (since is a time.time() value), oldest first."""
+        where, parameters = _run_filter(service_rate, arrival_rate, number_of_servers, user_request_time, label, since)
+        rows = self._connection.execute(
+            f"SELECT run_id, started_at, label, config FROM runs {where} ORDER BY run_id", parameters).fetchall()
+        return [StoredRun(run_id, started_at, label, _config_from_json(config))
+                for run_id, started_at, label, config in rows]
+
+    def read_metrics(self, run_id: int) -> Dict[int, MeasuredMetric]:
+        """Measured metrics of a run, by number of users in increasing order."""
+        rows = self._connection.execute(
+            f"SELECT clients, {', '.join(METRIC_FIELDS)} FROM metrics WHERE run_id = ? ORDER BY clients",
+            (run_id,)).fetchall()
+        return {row[0]: MeasuredMetric(*(_to_float(value) for value in row[1:])) for row in rows}
+
+    def read_server_utilizations(self, run_id: int) -> Dict[int, List[float]]:
+        """Utilization of each server of a run, by number of users."""
+        server_utilizations: Dict[int, List[float]] = {}
+        for clients, utilization in self._connection.execute(
+                "SELECT clients, utilization FROM server_utilizations WHERE run_id = ? ORDER BY clients, server",
+                (run_id,)):
+            server_utilizations.setdefault(clients, []).append(_to_float(utilization))
+        return server_utilizations
+
+    def query_metrics(self, service_rate: Optional[float] = None, arrival_rate: Optional[float] = None,
+                      number_of_servers: Optional[int] = None, user_request_time: Optional[int] = None,
+                      label: Optional[str] = None, since: Optional[float] = None) -> np.ndarray:
+        """
+        Measured metrics of every matching run, one row per run and number of users, as a structured array
+        with the configuration columns (RUN_FIELDS), "clients" and the fields of MeasuredMetric.
+        """
+        where, parameters = _run_filter(service_rate, arrival_rate, number_of_servers, user_request_time, label, since)
+        columns = [f"runs.{name}" for name in RUN_FIELDS] + ["metrics.clients"] + [f"metrics.{name}" for name in METRIC_FIELDS]
+        rows = self._connection.execute(
+            f"SELECT {', '.join(columns)} FROM runs JOIN metrics ON metrics.run_id = runs.run_id {where} "
+            f"ORDER BY runs.run_id, metrics.clients", parameters).fetchall()
+        dtype = np.dtype([('run_id', 'i8'), ('started_at', 'f8'), ('label', 'U64'), ('service_rate', 'f8'),
+                          ('arrival_rate', 'f8'), ('servers', 'i8'), ('duration', 'i8'), ('engine', 'U16'),
+                          ('backend', 'U16'), ('clients', 'i8'), *((name, 'f8') for name in METRIC_FIELDS)])
+        first_metric = len(RUN_FIELDS) + 1
+        return np.array([(*row[:2], row[2] or "", *row[3:first_metric], *(_to_float(value) for value in row[first_metric:]))
+                         for row in rows], dtype=dtype)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def _open_database(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        connection.execute("PRAGMA journal_mode=WAL")  # readers do not block the writers of concurrent runs
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL, label TEXT, service_rate REAL, "
+                "arrival_rate REAL, servers INTEGER, duration INTEGER, engine TEXT, backend TEXT, config TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS runs_configuration "
+                               "ON runs (service_rate, arrival_rate, servers, duration)")
+            connection.execute("CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS runs_label ON runs (label)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metrics ("
+                "run_id INTEGER REFERENCES runs (run_id), clients INTEGER, recorded_at REAL, "
+                f"{', '.join(f'{name} REAL' for name in METRIC_FIELDS)}, PRIMARY KEY (run_id, clients))")
+            existing_columns = {row[1] for row in connection.execute("PRAGMA table_info(metrics)")}
+            for name in METRIC_FIELDS:
+                if name not in existing_columns:  # a field added to MeasuredMetric since the database was created
+                    connection.execute(f"ALTER TABLE metrics ADD COLUMN {name} REAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS server_utilizations ("
+                "run_id INTEGER REFERENCES runs (run_id), clients INTEGER, server INTEGER, utilization REAL, "
+                "PRIMARY KEY (run_id, clients, server))")
+        return connection
+
+
+def _run_filter(service_rate: Optional[float], arrival_rate: Optional[float], number_of_servers: Optional[int],
+                user_request_time: Optional[int], label: Optional[str],
+                since: Optional[float]) -> Tuple[str, List]:
+    """WHERE clause selecting the runs matching the given filters, and its parameters."""
+    conditions = [("runs.service_rate = ?", service_rate), ("runs.arrival_rate = ?", arrival_rate),
+                  ("runs.servers = ?", number_of_servers), ("runs.duration = ?", user_request_time),
+                  ("runs.label = ?", label), ("runs.started_at >= ?", since)]
+    conditions = [(condition, value) for condition, value in conditions if value is not None]
+    if not conditions:
+        return "", []
+    return "WHERE " + " AND ".join(condition for condition, _ in conditions), [value for _, value in conditions]
+
+
+def _config_to_json(system_config: Config) -> str:
+    config = asdict(system_config)
+    config["user_range"] = [system_config.user_range.start, system_config.user_range.stop]
+    return json.dumps(config)
+
+
+def _config_from_json(content: str) -> Config:
+    """Rebuild a stored Config, ignoring the options that no longer exist."""
+    config = json.loads(content)
+    known_fields = {config_field.name for config_field in fields(Config)}
+    config = {name: value for name, value in config.items() if name in known_fields}
+    config["user_range"] = range(*config["user_range"])
+    config["server_counts"] = tuple(config.get("server_counts", ()))
+    return Config(**config)
+
+
+def _to_float(value: Optional[float]) -> float:
+    """SQLite stores NaN as NULL."""
+    return math.nan if value is None else value
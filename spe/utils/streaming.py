@@ -0,0 +1,190 @@
+"""This module provides constant-memory aggregation of response times: online moments, a mergeable
+log-bucketed histogram for quantiles and a shared-memory ring buffer to move samples between processes,
+plus the means of small batches of a stream used to detect its warm-up and stop it once converged.
+"""
+from dataclasses import dataclass, field
+import math
+from multiprocessing.sharedctypes import RawArray, RawValue
+import time
+from typing import List
+
+import numpy as np
+
+HISTOGRAM_MIN_VALUE = 1e-6  # seconds, smaller values fall into the first bucket
+HISTOGRAM_MAX_VALUE = 1e4  # seconds, larger values fall into the last bucket
+HISTOGRAM_PRECISION = 0.01  # relative width of a bucket
+HISTOGRAM_BUCKETS = int(math.ceil(math.log(HISTOGRAM_MAX_VALUE / HISTOGRAM_MIN_VALUE) / math.log1p(HISTOGRAM_PRECISION))) + 1
+RING_FULL_WAIT = 0.001  # seconds a producer waits when the consumer is late
+MSER_BATCH_SIZE = 5  # observations per batch mean of MSER-5
+
+
+@dataclass
+class StreamingStatistics:
+    """Count, mean and variance of a stream of values, updated with Welford's algorithm."""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0  # sum of squared deviations from the mean
+    maximum: float = -math.inf
+
+    @property
+    def variance(self) -> float:
+        """Population variance (as np.var)."""
+        return self.m2 / self.count if self.count > 0 else math.nan
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.maximum = max(self.maximum, value)
+
+    def add_batch(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        batch_mean = float(np.mean(values))
+        self.merge(StreamingStatistics(len(values), batch_mean, float(np.sum((values - batch_mean) ** 2)),
+                                       float(np.max(values))))
+
+    def merge(self, other: 'StreamingStatistics') -> None:
+        """Combine with the statistics of another stream (Chan et al. parallel update)."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.maximum = max(self.maximum, other.maximum)
+
+
+class BatchMeansAccumulator:
+    """
+    Means of consecutive batches of batch_size observations of a stream, in arrival order, with the time
+    (time.time()) each batch was completed. It keeps a fraction 1/batch_size of the stream, which is what
+    the MSER warm-up detection and the batch means confidence interval need.
+    """
+
+    def __init__(self, batch_size: int = MSER_BATCH_SIZE) -> None:
+        self.batch_size = batch_size
+        self.means: List[float] = []
+        self.times: List[float] = []
+        self._pending: List[float] = []  # observations of the incomplete batch
+
+    def add(self, value: float) -> None:
+        self._pending.append(value)
+        if len(self._pending) == self.batch_size:
+            self.means.append(sum(self._pending) / self.batch_size)
+            self.times.append(time.time())
+            self._pending.clear()
+
+    def add_batch(self, values: np.ndarray) -> None:
+        values = np.concatenate([self._pending, values])
+        complete = len(values) // self.batch_size * self.batch_size
+        batch_means = values[:complete].reshape(-1, self.batch_size).mean(axis=1)
+        self.means.extend(batch_means.tolist())
+        self.times.extend([time.time()] * len(batch_means))
+        self._pending = values[complete:].tolist()
+
+
+@dataclass
+class LatencyHistogram:
+    """
+    Histogram with logarithmic buckets: every bucket spans a relative width of HISTOGRAM_PRECISION,
+    so quantiles are estimated within that relative error whatever their magnitude.
+    Histograms with the same layout are merged by adding their counts; the exact maximum is kept aside.
+    """
+    counts: np.ndarray = field(default_factory=lambda: np.zeros(HISTOGRAM_BUCKETS, dtype=np.int64))
+    maximum: float = -math.inf
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, value: float) -> None:
+        self.counts[self._bucket_of(value)] += 1
+        self.maximum = max(self.maximum, value)
+
+    def add_batch(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self.maximum = max(self.maximum, float(np.max(values)))
+        ratios = np.maximum(values, HISTOGRAM_MIN_VALUE) / HISTOGRAM_MIN_VALUE
+        buckets = (np.log(ratios) / math.log1p(HISTOGRAM_PRECISION)).astype(np.int64)
+        buckets = np.minimum(buckets, HISTOGRAM_BUCKETS - 1)
+        self.counts += np.bincount(buckets, minlength=HISTOGRAM_BUCKETS)
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        self.counts += other.counts
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q: float) -> float:
+        """
+        Value below which a fraction q of the samples falls: the midpoint of its bucket, bounded by the exact
+        maximum so that no quantile exceeds it.
+        """
+        total = self.total
+        if total == 0:
+            return math.nan
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q * total, side='left'))
+        bucket = min(bucket, HISTOGRAM_BUCKETS - 1)
+        return min(HISTOGRAM_MIN_VALUE * (1 + HISTOGRAM_PRECISION) ** (bucket + 0.5), self.maximum)
+
+    def _bucket_of(self, value: float) -> int:
+        if value <= HISTOGRAM_MIN_VALUE:
+            return 0
+        return min(int(math.log(value / HISTOGRAM_MIN_VALUE) / math.log1p(HISTOGRAM_PRECISION)), HISTOGRAM_BUCKETS - 1)
+
+
+class SharedRingBuffer:
+    """
+    Fixed-size ring of fixed-width float records in shared memory, written by one process and read by
+    another without locks: the producer only moves the write counter and the consumer the read counter.
+    Must be created before forking the producer.
+    """
+
+    def __init__(self, capacity: int, width: int) -> None:
+        self.capacity = capacity
+        self.width = width
+        self._data = RawArray('d', capacity * width)
+        self._written = RawValue('q', 0)
+        self._read = RawValue('q', 0)
+
+    def push(self, *record: float) -> None:
+        """Append a record, waiting for the consumer if the ring is full."""
+        while self._written.value - self._read.value >= self.capacity:
+            time.sleep(RING_FULL_WAIT)
+        start = (self._written.value % self.capacity) * self.width
+        self._data[start:start + self.width] = record
+        self._written.value += 1
+
+    def drain(self) -> np.ndarray:
+        """Remove and return every available record as an array of shape (records, width)."""
+        written = self._written.value
+        read = self._read.value
+        if written == read:
+            return np.empty((0, self.width))
+        buffer = np.frombuffer(self._data, dtype=np.float64).reshape(self.capacity, self.width)
+        indices = np.arange(read, written) % self.capacity
+        records = buffer[indices].copy()
+        self._read.value = written
+        return records
+
+
+class SharedCounters:
+    """
+    Rows of float counters in shared memory, each row written by a single process (or event loop) and summed
+    by readers in any process without locks. Must be created before forking the writers.
+    """
+
+    def __init__(self, rows: int, width: int) -> None:
+        self.rows = rows
+        self.width = width
+        self._data = RawArray('d', rows * width)
+
+    def row(self, index: int) -> np.ndarray:
+        """Writable view of one row, to be kept by its writer."""
+        return np.frombuffer(self._data, dtype=np.float64).reshape(self.rows, self.width)[index]
+
+    def totals(self) -> np.ndarray:
+        """Sum of every row: a snapshot that may mix values from before and after concurrent updates."""
+        return np.frombuffer(self._data, dtype=np.float64).reshape(self.rows, self.width).sum(axis=0)
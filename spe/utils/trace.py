@@ -0,0 +1,139 @@
+"""This module records every request of a load test in a compact binary trace and reads it back offline.
+
+A trace file is a fixed-size header followed by fixed-width records (TRACE_DTYPE) appended as the requests
+complete, so that it can be memory-mapped and analysed with NumPy without loading it. Times are in seconds
+from the start of the load test, on the perf_counter clock of the host (shared by the generator and a server
+running on the same host). A trace can be compressed with gzip, and is then decompressed in memory when read.
+"""
+import gzip
+import math
+import os
+import shutil
+from typing import Tuple
+
+import numpy as np
+
+from spe.utils.metric import PERCENTILES, MeasuredMetric, compute_confidence_intervals
+
+TRACE_MAGIC = b"SPETRACE"
+TRACE_VERSION = 1
+TRACE_BUFFER_SIZE = 4096  # records buffered in memory between two writes
+COMPRESSED_SUFFIX = ".gz"
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<i8'),
+    ('origin', '<f8'),  # perf_counter time of the start of the load test
+    ('wall_clock_origin', '<f8'),  # time.time() at the same instant
+    ('number_of_users', '<i8'),
+    ('open_loop', '<i8'),  # 1 if response times are measured from the intended time (open or replayed load)
+    ('reserved', '<i8', (2,)),
+])  # 64 bytes
+TRACE_DTYPE = np.dtype([
+    ('client', '<i4'),
+    ('status', '<i4'),  # HTTP status, 0 when the request failed without a response
+    ('intended_time', '<f8'),  # when the request was due (end of the think time, or scheduled arrival)
+    ('send_time', '<f8'),  # when it was actually sent
+    ('server_start', '<f8'),  # when the server started and finished handling it (NaN if unknown)
+    ('server_end', '<f8'),
+    ('receive_time', '<f8'),  # when the response was received (NaN if none)
+])  # 48 bytes
+
+
+class TraceWriter:
+    """Appends records to a trace file through a small in-memory buffer."""
+
+    def __init__(self, path: str, number_of_users: int, open_loop: bool, origin: float,
+                 wall_clock_origin: float) -> None:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.origin = origin
+        self._buffer = np.empty(TRACE_BUFFER_SIZE, dtype=TRACE_DTYPE)
+        self._buffered = 0
+        self._file = open(path, 'wb')
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (TRACE_MAGIC, TRACE_VERSION, origin, wall_clock_origin, number_of_users, open_loop, (0, 0))
+        self._file.write(header.tobytes())
+
+    def append(self, client: int, status: int, intended_time: float, send_time: float, server_start: float,
+               server_end: float, receive_time: float) -> None:
+        """Append a record with perf_counter times, stored relative to the origin of the trace."""
+        origin = self.origin
+        self._buffer[self._buffered] = (client, status, intended_time - origin, send_time - origin,
+                                        server_start - origin, server_end - origin, receive_time - origin)
+        self._buffered += 1
+        if self._buffered == TRACE_BUFFER_SIZE:
+            self.flush()
+
+    def append_batch(self, records: np.ndarray) -> None:
+        """Append records of TRACE_DTYPE whose times are already relative to the origin of the trace."""
+        self.flush()
+        self._file.write(records.astype(TRACE_DTYPE, copy=False).tobytes())
+
+    def flush(self) -> None:
+        if self._buffered > 0:
+            self._file.write(self._buffer[:self._buffered].tobytes())
+            self._buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+def read_trace(path: str) -> Tuple[np.void, np.ndarray]:
+    """
+    Read a trace file, memory-mapped unless it is compressed. An incomplete last record is ignored.
+
+    Returns:
+        Tuple containing the header (HEADER_DTYPE) and the records (TRACE_DTYPE)
+
+    Raises:
+        ValueError: If the file is not a trace or has an unsupported version
+    """
+    if path.endswith(COMPRESSED_SUFFIX):
+        with gzip.open(path, 'rb') as trace_file:
+            content = trace_file.read()
+        header = np.frombuffer(content, dtype=HEADER_DTYPE, count=1)[0] if len(content) >= HEADER_DTYPE.itemsize else None
+        record_count = (len(content) - HEADER_DTYPE.itemsize) // TRACE_DTYPE.itemsize
+        records = np.frombuffer(content, dtype=TRACE_DTYPE, count=max(0, record_count), offset=HEADER_DTYPE.itemsize)
+    else:
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        header = header[0] if len(header) == 1 else None
+        record_count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // TRACE_DTYPE.itemsize
+        if record_count > 0:
+            records = np.memmap(path, dtype=TRACE_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize, shape=(record_count,))
+        else:
+            records = np.empty(0, dtype=TRACE_DTYPE)
+    if header is None or header['magic'] != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a trace file")
+    if header['version'] != TRACE_VERSION:
+        raise ValueError(f"{path} has trace version {header['version']}, expected {TRACE_VERSION}")
+    return header, records
+
+
+def compress_trace(path: str) -> str:
+    """Compress a trace file with gzip, replacing it, and return the path of the compressed file."""
+    compressed_path = path + COMPRESSED_SUFFIX
+    with open(path, 'rb') as trace_file, gzip.open(compressed_path, 'wb') as compressed_file:
+        shutil.copyfileobj(trace_file, compressed_file)
+    os.remove(path)
+    return compressed_path
+
+
+def compute_trace_metrics(header: np.void, records: np.ndarray) -> MeasuredMetric:
+    """
+    Recompute the client-side metrics of a load test from its trace, as the load generator measured them
+    (from the send time, or from the intended time for open-loop and replayed load). The percentiles are exact,
+    since every response time is available; the utilization and the per-server metrics are not in the trace (NaN).
+    """
+    successful = records[records['status'] == 200]
+    start_field = 'intended_time' if header['open_loop'] else 'send_time'
+    response_times = successful['receive_time'] - successful[start_field]
+    if len(response_times) == 0:
+        return MeasuredMetric(math.nan, math.nan, math.nan, math.nan)
+    ci_lower, ci_upper = compute_confidence_intervals(response_times)
+    percentiles = np.percentile(response_times, PERCENTILES)
+    lateness = records['send_time'] - records['intended_time']
+    return MeasuredMetric(float(np.mean(response_times)), ci_lower, ci_upper, math.nan, 0.0, *percentiles.tolist(),
+                          float(np.max(response_times)), scheduling_lateness=float(np.nanmean(lateness)))
@@ -0,0 +1,30 @@
+"""Tests of the validation of the command-line arguments."""
+import sys
+
+import pytest
+
+from spe.utils.argument_parser import Config, create_parser, parse_arguments
+
+RUN_ARGUMENTS = ["main.py", "run", "-s", "10", "-a", "5", "-u", "1", "3", "-t", "10", "-k", "2"]
+
+
+def _parse(monkeypatch, arguments):
+    monkeypatch.setattr(sys, "argv", RUN_ARGUMENTS + arguments)
+    return parse_arguments(create_parser())
+
+
+@pytest.mark.parametrize("arguments", [["--engine", "hybrid", "--shards", "0"],
+                                       ["--engine", "hybrid", "--shards", "-2"],
+                                       ["--engine", "hybrid", "--clients-per-shard", "0"],
+                                       ["--backend", "gthread", "--threads", "0"]])
+def test_invalid_values_are_rejected(monkeypatch, arguments):
+    with pytest.raises(SystemExit) as error:
+        _parse(monkeypatch, arguments)
+    assert error.value.code == 2
+
+
+def test_valid_values_are_kept(monkeypatch):
+    config = _parse(monkeypatch, ["--engine", "hybrid", "--shards", "2", "--clients-per-shard", "100",
+                                  "--backend", "gthread", "--threads", "8"])
+    assert isinstance(config, Config)
+    assert (config.shards, config.clients_per_shard, config.threads) == (2, 100, 8)
@@ -0,0 +1,40 @@
+"""Tests of the busy-time records of the server workers."""
+from types import SimpleNamespace
+
+import pytest
+
+import spe.server.busy_time as busy_time
+from spe.server.busy_time import WINDOW_LENGTH, BusyTimeRecorder, read_busy_windows, read_worker_busy_times
+
+START = 1000.0  # seconds since the epoch, on a window boundary
+
+
+def test_a_request_across_a_window_boundary_is_split(tmp_path):
+    recorder = BusyTimeRecorder(str(tmp_path))
+    recorder.record(START + 0.05, START + 0.17)
+
+    pids, busy_times = read_busy_windows(START + 0.01, START + 0.29, str(tmp_path))
+    assert pids.tolist() == [recorder.pid]
+    assert busy_times.shape == (1, 3)
+    # the first window only counts the 0.09s of it inside the measurement, assuming its busy time is uniform
+    assert busy_times[0].tolist() == pytest.approx([0.05 * 0.9, 0.07, 0.0])
+
+
+def test_overlapping_requests_are_counted_once(tmp_path, monkeypatch):
+    clock = SimpleNamespace(now=START)
+    monkeypatch.setattr(busy_time, "time", SimpleNamespace(time=lambda: clock.now))
+    recorder = BusyTimeRecorder(str(tmp_path))
+    for now, event in ((0.02, recorder.begin), (0.04, recorder.begin), (0.06, recorder.end), (0.08, recorder.end)):
+        clock.now = START + now
+        event()
+
+    # busy from the start of the first request to the end of the last: 0.06s, not 0.04s + 0.04s
+    assert read_worker_busy_times(START, START + WINDOW_LENGTH, str(tmp_path)) == {recorder.pid: pytest.approx(0.06)}
+
+
+def test_warm_up_windows_are_left_out(tmp_path):
+    recorder = BusyTimeRecorder(str(tmp_path))
+    recorder.record(START, START + 1.0)  # fully busy during a one-second warm-up
+    recorder.record(START + 1.0, START + 1.5)  # then busy half of the measurement
+
+    assert read_worker_busy_times(START + 1.0, START + 2.0, str(tmp_path)) == {recorder.pid: pytest.approx(0.5)}
@@ -0,0 +1,53 @@
+"""Tests of the cache of theoretical results."""
+from spe.utils.argument_parser import Config
+from spe.utils.cache import ModelCache
+from spe.utils.metric import SOLVER_VERSION, compute_theoretical_metrics
+
+KEY = ("product-form", 10.0, 5.0, 2, 3)
+
+
+def test_results_persist_across_caches_of_the_same_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ModelCache(SOLVER_VERSION, path)
+    cache.put_many([(KEY, (0.12, 0.5))])
+    cache.close()
+
+    cache = ModelCache(SOLVER_VERSION, path)
+    assert cache.get(KEY) == (0.12, 0.5)
+    assert cache.get(("product-form", 10.0, 5.0, 2, 4)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_a_new_solver_version_discards_the_stored_results(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ModelCache("1", path)
+    cache.put_many([(KEY, (0.12, 0.5))])
+    cache.close()
+
+    cache = ModelCache("2", path)
+    assert cache.get(KEY) is None
+    cache.close()
+
+
+def test_cached_metrics_equal_the_solved_ones(tmp_path):
+    config = Config(service_rate=10, arrival_rate=5, user_range=range(1, 21), user_request_time=60,
+                    number_of_servers=3, cache_path=None)
+    cache = ModelCache(SOLVER_VERSION, str(tmp_path / "cache.sqlite"))
+    solved = compute_theoretical_metrics(config, cache=cache)
+    cached = compute_theoretical_metrics(config, cache=cache)
+
+    assert cached == solved == compute_theoretical_metrics(config)
+    assert (cache.hits, cache.misses) == (20, 20)
+    cache.close()
+
+
+def test_the_oldest_results_are_evicted_beyond_the_maximum(tmp_path):
+    cache = ModelCache(SOLVER_VERSION, str(tmp_path / "cache.sqlite"), max_entries=5)
+    keys = [("product-form", 10.0, 5.0, 2, clients) for clients in range(1, 9)]
+    cache.put_many((key, (0.1, 0.5)) for key in keys[:4])
+    cache.put_many([(keys[0], (0.1, 0.5))])  # stored again: now the most recent
+    cache.put_many((key, (0.1, 0.5)) for key in keys[4:])
+
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, False, True, True, True, True]
+    cache.close()
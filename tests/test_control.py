@@ -0,0 +1,49 @@
+"""Tests of the configuration shared by the server workers."""
+from multiprocessing import Process
+
+from spe.server.control import DEFAULT_SERVICE_RATE, DEFAULT_WORKLOAD, SharedControl
+
+WRITES = 300
+
+
+def _write_configurations(path: str, writer: int) -> None:
+    control = SharedControl(path)
+    for index in range(WRITES):
+        # the service rate identifies the configuration, whose length varies from one write to the next
+        service_rate = float(writer * WRITES + index + 1)
+        control.write(service_rate, {"distribution": "exponential", "rate": service_rate,
+                                     "padding": "x" * (index % 50)})
+
+
+def test_defaults_before_the_first_write(tmp_path):
+    version, service_rate, configuration = SharedControl(str(tmp_path / "control.bin")).read()
+    assert (version, service_rate, configuration) == (0, DEFAULT_SERVICE_RATE, DEFAULT_WORKLOAD)
+
+
+def test_write_publishes_an_even_version(tmp_path):
+    control = SharedControl(str(tmp_path / "control.bin"))
+    control.write(service_rate=5.0)
+    control.write(configuration={"distribution": "deterministic"})
+
+    version, service_rate, configuration = SharedControl(str(tmp_path / "control.bin")).read()
+    assert version == 4
+    assert service_rate == 5.0
+    assert configuration["distribution"] == "deterministic"
+
+
+def test_concurrent_writers_lose_no_version_and_readers_see_no_mixed_configuration(tmp_path):
+    path = str(tmp_path / "control.bin")
+    reader = SharedControl(path)
+    writers = [Process(target=_write_configurations, args=[path, writer]) for writer in range(2)]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        state = reader.read()
+        if state is not None and state[0] > 0:
+            _, service_rate, configuration = state
+            assert configuration["rate"] == service_rate
+    for writer in writers:
+        writer.join()
+
+    assert writers[0].exitcode == writers[1].exitcode == 0
+    assert reader.version == 2 * 2 * WRITES
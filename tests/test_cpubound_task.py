@@ -0,0 +1,25 @@
+"""Tests of the calibrated busy loop of the CPU-bound workload."""
+import time
+
+from spe.server.cpubound_task import CHECK_INTERVAL, CPUBoundTask
+
+DURATION = 0.02  # seconds
+
+
+def test_calibration_measures_a_positive_rate():
+    rate = CPUBoundTask.calibrate()
+    assert rate > 0
+    assert CPUBoundTask.iterations_per_second == rate
+
+
+def test_task_ends_within_a_few_milliseconds_of_its_duration():
+    CPUBoundTask.calibrate()
+    overshoots = []
+    for _ in range(5):
+        start_time = time.perf_counter()
+        spent_time = CPUBoundTask.run(DURATION)
+        elapsed_time = time.perf_counter() - start_time
+        assert DURATION <= spent_time <= elapsed_time
+        overshoots.append(spent_time - DURATION)
+    # the best of a few runs, in case the test process is preempted
+    assert min(overshoots) < CHECK_INTERVAL
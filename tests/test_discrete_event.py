@@ -0,0 +1,34 @@
+"""Tests of the discrete-event simulation of the closed M/M/k system."""
+import numpy as np
+import pytest
+
+from spe.generator.discrete_event import simulate_measured_metrics
+from spe.utils.argument_parser import Config
+from spe.utils.metric import compute_theoretical_metrics
+
+
+def _config(number_of_clients: int, number_of_servers: int, **kwargs) -> Config:
+    return Config(service_rate=10.0, arrival_rate=4.0, user_range=range(1, number_of_clients + 1),
+                  user_request_time=60, number_of_servers=number_of_servers, cache_path=None,
+                  des_requests=40_000, des_replications=4, **kwargs)
+
+
+@pytest.mark.parametrize("number_of_servers", [1, 3])
+def test_simulation_agrees_with_the_theory(number_of_servers):
+    config = _config(8, number_of_servers)
+    simulated = simulate_measured_metrics(config)
+    theoretical = compute_theoretical_metrics(config)
+
+    np.testing.assert_allclose([metric.avg_response_time for metric in simulated],
+                               [metric.avg_response_time for metric in theoretical], rtol=0.03)
+    np.testing.assert_allclose([metric.utilization for metric in simulated],
+                               [metric.utilization for metric in theoretical], rtol=0.03)
+    for metric in simulated:
+        assert metric.lower_bound <= metric.avg_response_time <= metric.upper_bound
+
+
+def test_a_single_client_never_queues():
+    # without queueing, the response time of a deterministic service is the service time itself
+    metric, = simulate_measured_metrics(_config(1, 1, service_distribution="deterministic"))
+    assert metric.avg_response_time == pytest.approx(0.1)
+    assert metric.max_response_time == pytest.approx(0.1, rel=1e-9)
@@ -0,0 +1,18 @@
+"""Tests of the load generator that need no server."""
+import math
+
+import pytest
+
+from spe.generator.load_generator import ENGINE_ASYNCIO, ENGINE_PROCESS, LoadGenerator
+
+UNUSED_URL = "http://127.0.0.1:9/"  # discard port: nothing listens on it
+
+
+@pytest.mark.parametrize("engine", [ENGINE_PROCESS, ENGINE_ASYNCIO])
+def test_no_successful_request_gives_nan_instead_of_zero(engine):
+    load_generator = LoadGenerator(1, 100, UNUSED_URL, 1, engine)
+
+    avg_response_time, ci_lower, ci_upper = load_generator.generate_load()
+
+    assert load_generator.statistics.response_times.count == 0
+    assert math.isnan(avg_response_time) and math.isnan(ci_lower) and math.isnan(ci_upper)
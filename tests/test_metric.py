@@ -0,0 +1,172 @@
+"""Tests of the theoretical models of the system and of the statistics of the measurements."""
+from dataclasses import replace
+import math
+
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from spe.utils.argument_parser import Config
+from spe.utils.metric import (SOLVER_INCREMENTAL, SOLVER_LINEAR, SOLVER_PRODUCT_FORM, SOLVER_TRANSIENT,
+                              _erlang_c, compute_batch_means_interval, compute_confidence_intervals,
+                              compute_general_service_metrics, compute_mser_truncation,
+                              compute_open_theoretical_metrics, compute_state_probabilities, compute_theoretical_grid,
+                              compute_theoretical_metrics, compute_theoretical_sweep)
+
+
+def _config(service_rate: float, arrival_rate: float, number_of_clients: int, number_of_servers: int) -> Config:
+    return Config(service_rate=service_rate, arrival_rate=arrival_rate, user_range=range(1, number_of_clients + 1),
+                  user_request_time=60, number_of_servers=number_of_servers, cache_path=None)
+
+
+@pytest.mark.parametrize("number_of_servers", [1, 3, 8])
+def test_product_form_and_linear_solvers_agree(number_of_servers):
+    for number_of_clients in (1, 5, 40):
+        product_form = compute_state_probabilities(number_of_clients, 5.0, 10.0, number_of_servers,
+                                                   SOLVER_PRODUCT_FORM)
+        linear = compute_state_probabilities(number_of_clients, 5.0, 10.0, number_of_servers, SOLVER_LINEAR)
+        assert product_form.sum() == pytest.approx(1.0)
+        np.testing.assert_allclose(product_form, linear, rtol=1e-8, atol=1e-12)
+
+
+def test_transient_solver_converges_to_the_steady_state():
+    config = _config(10.0, 5.0, 8, 2)
+    product_form = compute_theoretical_metrics(config, SOLVER_PRODUCT_FORM)
+    transient = compute_theoretical_metrics(config, SOLVER_TRANSIENT)
+    np.testing.assert_allclose([metric.avg_response_time for metric in transient],
+                               [metric.avg_response_time for metric in product_form], rtol=1e-6)
+
+
+def test_product_form_is_stable_for_thousands_of_clients():
+    metrics = compute_theoretical_metrics(_config(10.0, 5.0, 3000, 4))
+    response_times = np.array([metric.avg_response_time for metric in metrics])
+    utilizations = np.array([metric.utilization for metric in metrics])
+    assert np.all(np.isfinite(response_times))
+    # saturated servers: the response time law R = N / (k * mu) - 1 / lambda
+    assert response_times[-1] == pytest.approx(3000 / 40 - 1 / 5, rel=1e-6)
+    assert utilizations[-1] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("number_of_servers", [1, 4, 16])
+def test_incremental_sweep_matches_the_product_form(number_of_servers):
+    config = _config(10.0, 5.0, 200, number_of_servers)
+    product_form = compute_theoretical_metrics(config, SOLVER_PRODUCT_FORM)
+    incremental = compute_theoretical_metrics(config, SOLVER_INCREMENTAL)
+    np.testing.assert_allclose([metric.avg_response_time for metric in incremental],
+                               [metric.avg_response_time for metric in product_form], rtol=1e-9)
+    np.testing.assert_allclose([metric.utilization for metric in incremental],
+                               [metric.utilization for metric in product_form], rtol=1e-9)
+
+
+def test_sweep_satisfies_littles_law():
+    sweep = compute_theoretical_sweep(_config(10.0, 5.0, 100, 4))
+    populations = np.arange(1, 101)
+    # every client is either thinking (mean 1 / lambda) or at the servers: N = X * (R + 1 / lambda)
+    np.testing.assert_allclose(sweep.throughputs[1:] * (sweep.response_times[1:] + 1 / 5.0), populations, rtol=1e-9)
+    np.testing.assert_allclose(sweep.queue_lengths[1:], sweep.throughputs[1:] * sweep.response_times[1:], rtol=1e-9)
+
+
+def test_grid_matches_each_configuration():
+    service_rates, arrival_rates, numbers_of_servers = [5.0, 10.0, 10.0], [10.0, 5.0, 2.0], [1, 4, 16]
+    users = np.arange(1, 31)
+    results = compute_theoretical_grid(*np.meshgrid(service_rates, arrival_rates, numbers_of_servers, users,
+                                                    indexing='ij')).reshape(3, 3, 3, len(users))
+
+    for i, service_rate in enumerate(service_rates):
+        for j, arrival_rate in enumerate(arrival_rates):
+            for k, number_of_servers in enumerate(numbers_of_servers):
+                expected = compute_theoretical_metrics(_config(service_rate, arrival_rate, 30, number_of_servers))
+                np.testing.assert_allclose(results[i, j, k]['avg_response_time'],
+                                           [metric.avg_response_time for metric in expected], rtol=1e-10)
+                np.testing.assert_allclose(results[i, j, k]['utilization'],
+                                           [metric.utilization for metric in expected], rtol=1e-10)
+
+
+def test_grid_with_scattered_points():
+    # points of the same configuration asking for different populations, some below k
+    results = compute_theoretical_grid(np.array([10.0, 10.0, 4.0]), np.array([5.0, 5.0, 3.0]),
+                                       np.array([8, 8, 2]), np.array([3, 40, 1]))
+    expected = compute_theoretical_metrics(_config(10.0, 5.0, 40, 8))
+    assert results['avg_response_time'][0] == pytest.approx(expected[2].avg_response_time)
+    assert results['avg_response_time'][1] == pytest.approx(expected[39].avg_response_time)
+    # a single client never waits: its response time is the service time
+    assert results['avg_response_time'][2] == pytest.approx(1 / 4.0)
+
+
+def test_mser_truncates_the_initial_transient():
+    rng = np.random.default_rng(5)
+    stationary = rng.normal(1.0, 0.1, 2000)
+    with_transient = stationary.copy()
+    with_transient[:200] += np.linspace(2.0, 0.0, 200)  # a bias fading out over the first 200 batches
+
+    assert 170 <= compute_mser_truncation(with_transient) <= 200
+    assert compute_mser_truncation(stationary) <= 20
+
+
+def test_batch_means_interval_covers_the_mean_of_an_autocorrelated_series():
+    # AR(1) series x[i] = 0.9 * x[i - 1] + e[i] around a mean of 2
+    series = 2.0 + lfilter([1.0], [1.0, -0.9], np.random.default_rng(6).normal(0.0, 1.0, 100_000))
+    mean, lower_bound, upper_bound = compute_batch_means_interval(series, 20)
+    naive_lower_bound, naive_upper_bound = compute_confidence_intervals(series)
+
+    assert mean == pytest.approx(series.mean())
+    assert lower_bound <= 2.0 <= upper_bound
+    # the i.i.d. interval ignores the autocorrelation, about sqrt((1 + 0.9) / (1 - 0.9)) times too narrow
+    assert upper_bound - lower_bound > 2 * (naive_upper_bound - naive_lower_bound)
+
+
+def test_open_model_matches_the_mm1_closed_form():
+    # N Poisson clients of rate lambda form a single stream of rate N * lambda: R = 1 / (mu - N * lambda)
+    config = replace(_config(10.0, 2.0, 4, 1), load_model="open-poisson")
+    for number_of_clients, metric in zip(config.user_range, compute_open_theoretical_metrics(config)):
+        assert metric.avg_response_time == pytest.approx(1 / (10.0 - 2.0 * number_of_clients))
+        assert metric.utilization == pytest.approx(2.0 * number_of_clients / 10.0)
+
+
+def test_erlang_c_matches_the_closed_form():
+    # k = 2 servers at utilization 0.5 (offered load 1): C = (1^2 / 2!) * 2 / (2 - 1) / (1 + 1 + 1) = 1 / 3
+    assert _erlang_c(1.0, 2) == pytest.approx(1 / 3)
+    assert _erlang_c(0.5, 1) == pytest.approx(0.5)  # M/M/1: the probability of waiting is the utilization
+
+
+def test_open_model_is_unstable_from_k_mu():
+    config = replace(_config(10.0, 5.0, 5, 2), load_model="open-poisson")
+    metrics = compute_open_theoretical_metrics(config)
+    assert math.isfinite(metrics[2].avg_response_time)  # 15 requests per second against a capacity of 20
+    for metric in metrics[3:]:  # 20 and 25 requests per second
+        assert metric.avg_response_time == math.inf
+        assert metric.utilization == 1.0
+
+
+def test_exponential_service_keeps_the_mmk_solution():
+    config = _config(10.0, 2.0, 40, 2)
+    exponential = compute_theoretical_metrics(config)
+    assert compute_general_service_metrics(config, exponential) == exponential
+
+
+@pytest.mark.parametrize("distribution, parameter, scv", [("deterministic", None, 0.0), ("erlang", "4", 0.25)])
+def test_closed_waiting_time_scales_with_the_service_variability(distribution, parameter, scv):
+    config = _config(10.0, 2.0, 10, 2)  # below saturation: utilization under 0.9
+    exponential = compute_theoretical_metrics(config)
+    general = compute_general_service_metrics(
+        replace(config, service_distribution=distribution, distribution_parameter=parameter), exponential)
+
+    for number_of_clients, metric, expected in zip(config.user_range, general, exponential):
+        assert metric.avg_response_time - 0.1 == pytest.approx((expected.avg_response_time - 0.1) * (1 + scv) / 2)
+        # interactive response time law: X = N / (R + 1 / lambda), utilization X / (k * mu)
+        assert metric.utilization == pytest.approx(number_of_clients / (metric.avg_response_time + 0.5) / 20)
+
+
+@pytest.mark.parametrize("distribution, parameter, scv", [("deterministic", None, 0.0), ("erlang", "4", 0.25)])
+def test_open_model_follows_allen_cunneen(distribution, parameter, scv):
+    # a single server: Allen-Cunneen is the exact Pollaczek-Khinchine formula W = (1 + cs^2) / 2 * rho / (mu - lambda)
+    config = replace(_config(10.0, 2.0, 4, 1), load_model="open-poisson", service_distribution=distribution,
+                     distribution_parameter=parameter)
+    for number_of_clients, metric in zip(config.user_range, compute_open_theoretical_metrics(config)):
+        arrival_rate = 2.0 * number_of_clients
+        waiting_time = (1 + scv) / 2 * (arrival_rate / 10.0) / (10.0 - arrival_rate)
+        assert metric.avg_response_time == pytest.approx(0.1 + waiting_time)
+
+    # k servers: W = C(k, a) / (k * mu - lambda) * (1 + cs^2) / 2
+    metric = compute_open_theoretical_metrics(replace(config, number_of_servers=2))[3]
+    assert metric.avg_response_time == pytest.approx(0.1 + _erlang_c(0.8, 2) / (20.0 - 8.0) * (1 + scv) / 2)
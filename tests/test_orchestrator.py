@@ -0,0 +1,31 @@
+"""Tests of the experiment matrix."""
+import numpy as np
+
+from spe.generator.orchestrator import RESULTS_NPZ_NAME, RESULTS_STORE_NAME, Experiment, merge_results
+from spe.utils.argument_parser import Config
+from spe.utils.metric import MeasuredMetric
+from spe.utils.results import METRIC_FIELDS, ResultStore
+
+
+def _experiment(name: str, number_of_servers: int) -> Experiment:
+    return Experiment(name, 10.0, 5.0, number_of_servers, range(1, 3), [])
+
+
+def test_merge_exports_the_latest_run_of_each_experiment(tmp_path):
+    store = ResultStore(str(tmp_path / RESULTS_STORE_NAME))
+    for name, number_of_servers, response_time in (("k1", 1, 0.9), ("k1", 1, 0.1), ("k2", 2, 0.2)):
+        config = Config(service_rate=10.0, arrival_rate=5.0, user_range=range(1, 3), user_request_time=60,
+                        number_of_servers=number_of_servers)
+        run_id = store.start_run(config, label=name)
+        for number_of_users in (1, 2):
+            store.add_metrics(run_id, number_of_users, MeasuredMetric(response_time * number_of_users, 0.0, 0.0, 0.5))
+    store.close()
+
+    merge_results([_experiment("k1", 1), _experiment("k2", 2), _experiment("missing", 4)], str(tmp_path))
+
+    with np.load(tmp_path / RESULTS_NPZ_NAME) as results:
+        assert set(METRIC_FIELDS) <= set(results.files)
+        assert results["label"].tolist() == ["k1", "k1", "k2", "k2"]
+        assert results["servers"].tolist() == [1, 1, 2, 2]
+        assert results["clients"].tolist() == [1, 2, 1, 2]
+        np.testing.assert_allclose(results["avg_response_time"], [0.1, 0.2, 0.2, 0.4])
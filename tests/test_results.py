@@ -0,0 +1,51 @@
+"""Tests of the database of measured runs."""
+import math
+
+import numpy as np
+
+from spe.utils.argument_parser import Config
+from spe.utils.metric import MeasuredMetric
+from spe.utils.results import ResultStore
+
+
+def _config(number_of_servers: int) -> Config:
+    return Config(service_rate=10.0, arrival_rate=5.0, user_range=range(1, 4), user_request_time=60,
+                  number_of_servers=number_of_servers, server_counts=(1, 2))
+
+
+def test_runs_and_metrics_round_trip(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    store = ResultStore(path)
+    run_id = store.start_run(_config(2), label="baseline")
+    metrics = MeasuredMetric(0.12, 0.11, 0.13, 0.5, 0.0, 0.1, 0.2, 0.25, 0.3, 0.4)
+    store.add_metrics(run_id, 1, metrics)
+    store.add_metrics(run_id, 2, MeasuredMetric(math.nan, math.nan, math.nan, math.nan))
+    store.add_server_utilizations(run_id, 1, np.array([0.4, 0.6]))
+    store.close()
+
+    store = ResultStore(path)
+    run, = store.find_runs(number_of_servers=2, label="baseline")
+    assert run.run_id == run_id
+    assert run.system_config == _config(2)
+    stored = store.read_metrics(run_id)
+    assert stored[1] == metrics
+    # SQLite stores NaN as NULL, read back as NaN
+    assert math.isnan(stored[2].avg_response_time) and math.isnan(stored[2].utilization)
+    assert store.read_server_utilizations(run_id) == {1: [0.4, 0.6]}
+    store.close()
+
+
+def test_query_filters_the_runs(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    for number_of_servers in (1, 2):
+        run_id = store.start_run(_config(number_of_servers))
+        for number_of_users in (1, 2, 3):
+            store.add_metrics(run_id, number_of_users, MeasuredMetric(0.1 * number_of_users, 0.0, 0.0, 0.5))
+    store.flush()
+
+    rows = store.query_metrics(number_of_servers=2)
+    assert rows['servers'].tolist() == [2, 2, 2]
+    assert rows['clients'].tolist() == [1, 2, 3]
+    np.testing.assert_allclose(rows['avg_response_time'], [0.1, 0.2, 0.3])
+    assert len(store.query_metrics()) == 6
+    store.close()
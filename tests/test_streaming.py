@@ -0,0 +1,49 @@
+"""Tests of the constant-memory aggregates of response times."""
+import math
+
+import numpy as np
+import pytest
+
+from spe.utils.metric import compute_percentiles
+from spe.utils.streaming import HISTOGRAM_MIN_VALUE, HISTOGRAM_PRECISION, LatencyHistogram, StreamingStatistics
+
+
+def test_streaming_statistics_match_numpy():
+    values = np.random.default_rng(1).exponential(0.1, 10_000)
+    statistics = StreamingStatistics()
+    statistics.add_batch(values[:4000])
+    for value in values[4000:]:
+        statistics.add(value)
+
+    assert statistics.count == len(values)
+    assert statistics.mean == pytest.approx(values.mean())
+    assert statistics.variance == pytest.approx(values.var())
+    assert statistics.maximum == values.max()
+
+
+def test_quantiles_within_bucket_precision():
+    values = np.random.default_rng(2).exponential(0.05, 100_000)
+    histogram = LatencyHistogram()
+    histogram.add_batch(values)
+
+    for q in (0.5, 0.9, 0.99):
+        assert histogram.quantile(q) == pytest.approx(np.quantile(values, q), rel=HISTOGRAM_PRECISION)
+
+
+def test_merged_percentiles_are_ordered_and_bounded_by_the_maximum():
+    # the largest sample sits just above the lower edge of its bucket, far below the bucket's midpoint
+    bucket_edge = HISTOGRAM_MIN_VALUE * (1 + HISTOGRAM_PRECISION) ** 1000
+    rng = np.random.default_rng(3)
+    merged = LatencyHistogram()
+    for _ in range(5):
+        histogram = LatencyHistogram()
+        histogram.add_batch(np.append(rng.uniform(0.5, 1.0, 50) * bucket_edge, bucket_edge * 1.0001))
+        merged.merge(histogram)
+
+    p50, p90, p95, p99, maximum = compute_percentiles(merged)
+    assert p50 <= p90 <= p95 <= p99 <= maximum
+    assert merged.quantile(1.0) == maximum
+
+
+def test_empty_histogram_has_nan_percentiles():
+    assert all(math.isnan(value) for value in compute_percentiles(LatencyHistogram()))
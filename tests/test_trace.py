@@ -0,0 +1,68 @@
+"""Tests of the binary trace of a load test."""
+import numpy as np
+import pytest
+
+from spe.utils.trace import TRACE_VERSION, TraceWriter, compress_trace, compute_trace_metrics, read_trace
+
+ORIGIN = 100.0
+
+
+def _write_trace(path: str, open_loop: bool = False) -> np.ndarray:
+    rng = np.random.default_rng(4)
+    response_times = rng.exponential(0.05, 200)
+    writer = TraceWriter(path, number_of_users=3, open_loop=open_loop, origin=ORIGIN, wall_clock_origin=1.7e9)
+    for index, response_time in enumerate(response_times):
+        intended_time = ORIGIN + 0.1 * index
+        send_time = intended_time + 0.01
+        status = 200 if index % 10 else 0  # every tenth request fails
+        writer.append(index % 3, status, intended_time, send_time, send_time + 0.001,
+                      send_time + response_time - 0.001, send_time + response_time)
+    writer.close()
+    return response_times
+
+
+def test_records_read_back_relative_to_the_origin(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    response_times = _write_trace(path)
+
+    header, records = read_trace(path)
+    assert header['version'] == TRACE_VERSION
+    assert (header['number_of_users'], header['open_loop'], header['origin']) == (3, 0, ORIGIN)
+    assert len(records) == len(response_times)
+    assert records['client'].tolist() == [index % 3 for index in range(len(response_times))]
+    np.testing.assert_allclose(records['intended_time'], 0.1 * np.arange(len(response_times)), atol=1e-9)
+    np.testing.assert_allclose(records['receive_time'] - records['send_time'], response_times, atol=1e-9)
+
+
+def test_compressed_trace_holds_the_same_records(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    _write_trace(path)
+    header, records = read_trace(path)
+    records = np.array(records)
+
+    compressed_header, compressed_records = read_trace(compress_trace(path))
+    assert not (tmp_path / "trace.bin").exists()
+    assert compressed_header == header
+    assert np.array_equal(compressed_records, records)
+
+
+def test_metrics_use_the_successful_requests_and_the_start_of_the_load(tmp_path):
+    closed_path, open_path = str(tmp_path / "closed.bin"), str(tmp_path / "open.bin")
+    response_times = _write_trace(closed_path)
+    _write_trace(open_path, open_loop=True)
+    successful = response_times[np.arange(len(response_times)) % 10 != 0]
+
+    closed = compute_trace_metrics(*read_trace(closed_path))
+    assert closed.avg_response_time == pytest.approx(successful.mean())
+    assert closed.scheduling_lateness == pytest.approx(0.01)
+    # open-loop response times also count the lateness of the send
+    opened = compute_trace_metrics(*read_trace(open_path))
+    assert opened.avg_response_time == pytest.approx(successful.mean() + 0.01)
+    assert opened.max_response_time == pytest.approx(successful.max() + 0.01)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_bytes(b"127.0.0.1 - - GET / 200\n" * 10)
+    with pytest.raises(ValueError):
+        read_trace(str(path))
@@ -0,0 +1,39 @@
+"""Tests of the service-time distributions and workloads of the server."""
+import numpy as np
+import pytest
+
+from spe.server.workload import Workload, create_workload
+from spe.utils.distribution import ServiceTimeDistribution, create_distribution
+
+
+@pytest.mark.parametrize("name, parameter", [("exponential", None), ("deterministic", None), ("erlang", "4"),
+                                             ("hyperexponential", "4"), ("lognormal", "2")])
+def test_distributions_have_the_requested_mean_and_scv(name, parameter):
+    distribution = create_distribution(name, parameter)
+    samples = distribution.sample_block(np.random.default_rng(7), 0.05, 400_000)
+
+    assert samples.mean() == pytest.approx(0.05, rel=0.02)
+    assert samples.var() / samples.mean() ** 2 == pytest.approx(
+        distribution.squared_coefficient_of_variation, rel=0.1, abs=1e-9)
+
+
+def test_incomplete_subclasses_fail_when_created():
+    class NoSample(ServiceTimeDistribution):
+        pass
+
+    class NoRun(Workload):
+        pass
+
+    with pytest.raises(TypeError):
+        NoSample()
+    with pytest.raises(TypeError):
+        NoRun()
+
+
+def test_unknown_names_and_missing_parameters_are_rejected():
+    with pytest.raises(ValueError):
+        create_distribution("pareto")
+    with pytest.raises(ValueError):
+        create_distribution("erlang")
+    with pytest.raises(ValueError):
+        create_workload("mixed")